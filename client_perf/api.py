@@ -4,27 +4,31 @@ FastAPI 路由层 — 精简、轻量。
 
 所有响应统一格式：{"code": 200, "msg": <data>}
 """
-import base64
 import os
 import platform
 import shutil
 import time
 import traceback
-from datetime import datetime
 from pathlib import Path
 
 import asyncio
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
-from openpyxl import Workbook
 from pydantic import BaseModel
 from starlette.requests import Request
-from starlette.responses import JSONResponse, RedirectResponse, FileResponse
+from starlette.responses import JSONResponse, RedirectResponse, FileResponse, Response
 
-from client_perf.db import TaskCollection, ComparisonReportCollection, LabelCollection, create_tables
+from client_perf.db import (
+    TaskCollection, ComparisonReportCollection, JobCollection, LabelCollection,
+    create_tables, run_writer, stop_writer,
+)
+from client_perf.jobs import cancel_job, start_jobs, stop_jobs, submit_job, wait_job
+from client_perf.cache import comparison_cache
 from client_perf.log import log as logger
 from client_perf.task_handle import TaskHandle
-from client_perf.util import DataCollect
+from client_perf.util import TASK_DATA_CACHE_BYTES, DataCollect, task_data_cache
+from client_perf.report import EXPORT_FORMATS, PARQUET_AVAILABLE  # 导入即注册报告作业类型
+from client_perf.retention import RETENTION_INTERVAL_MINUTES, load_policy, run_retention, save_policy
 from client_perf.core.device_manager import (
     DeviceManager,
     get_platform_capabilities,
@@ -65,297 +69,25 @@ async def _error_handler(request: Request, call_next):
         return err(str(e))
 
 
-# ── 报告导出功能 ──────────────────────────────────────────────
-
-# 报告保存目录
-REPORT_DIR = Path(__file__).parent / "test_result" / "excel_reports"
-REPORT_DIR.mkdir(exist_ok=True, parents=True)
-
-COMPARISON_REPORT_DIR = Path(__file__).parent / "test_result" / "comparison_reports"
-COMPARISON_REPORT_DIR.mkdir(exist_ok=True, parents=True)
-
-
-def create_excel_report(task_name: str, data: list[dict], save_dir: str) -> str:
-    """
-    导出单个任务的 Excel 报告
-    """
-    try:
-        # 创建 Workbook
-        wb = Workbook()
-        
-        # 为每个指标创建一个工作表
-        for item in data:
-            sheet_name = item.get("name", "未知")
-            ws = wb.create_sheet(title=sheet_name)
-            
-            # 写入表头和数据
-            values = item.get("value", [])
-            if values:
-                # 收集所有可能的字段
-                all_fields = set()
-                for row in values:
-                    all_fields.update(row.keys())
-                headers = sorted(list(all_fields))
-                
-                # 写入表头
-                ws.append(headers)
-                
-                # 写入数据
-                for row in values:
-                    row_data = [row.get(h) for h in headers]
-                    ws.append(row_data)
-            else:
-                # 无数据时写入提示
-                ws.append(["无数据"])
-        
-        # 删除默认的工作表
-        if "Sheet" in wb.sheetnames:
-            wb.remove(wb["Sheet"])
-        
-        # 生成文件名
-        timestamp = time.strftime("%Y%m%d_%H%M%S")
-        filename = f"{task_name}_{timestamp}.xlsx"
-        file_path = REPORT_DIR / filename
-        
-        # 保存 Excel
-        wb.save(file_path)
-        
-        logger.info(f"Excel 报告导出成功: {file_path}")
-        return str(file_path)
-    except Exception as e:
-        logger.error(f"导出 Excel 报告失败: {e}")
-        raise
-
-
-async def create_comparison_excel(data: dict, report_name: str) -> str:
-    """
-    导出任务对比报告为 Excel
-    """
-    try:
-        # 创建 Workbook
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "对比结果"
-        
-        # 写入表头
-        headers = [
-            "任务名称", "版本", "基准", "CPU 均值(%)", "内存均值(MB)", 
-            "FPS 均值", "GPU 均值(%)", "线程数均值", "句柄数均值", 
-            "磁盘读取均值(MB/s)", "磁盘写入均值(MB/s)", "网络发送均值(MB/s)", "网络接收均值(MB/s)"
-        ]
-        ws.append(headers)
-        
-        # 写入数据
-        for task in data.get("tasks", []):
-            row = [
-                task.get("name", ""),
-                task.get("version", ""),
-                "是" if task.get("id") == data.get("base_task", {}).get("id") else "否",
-                task.get("avg", {}).get("cpu_avg", "—"),
-                task.get("avg", {}).get("memory_avg", "—"),
-                task.get("avg", {}).get("fps_avg", "—"),
-                task.get("avg", {}).get("gpu_avg", "—"),
-                task.get("avg", {}).get("threads_avg", "—"),
-                task.get("avg", {}).get("handles_avg", "—"),
-                task.get("avg", {}).get("disk_read_avg", "—"),
-                task.get("avg", {}).get("disk_write_avg", "—"),
-                task.get("avg", {}).get("net_sent_avg", "—"),
-                task.get("avg", {}).get("net_recv_avg", "—"),
-            ]
-            ws.append(row)
-        
-        # 为每个任务添加原始数据工作表
-        for task in data.get("tasks", []):
-            task_name = task.get("name", "未知任务")
-            task_id = task.get("id", "")
-            sheet_name = f"{task_name}_{task_id}"
-            
-            # 限制工作表名称长度
-            if len(sheet_name) > 31:
-                sheet_name = sheet_name[:31]
-            
-            # 创建新工作表
-            task_ws = wb.create_sheet(title=sheet_name)
-            
-            # 写入原始数据
-            task_data = task.get("data", {})
-            metrics = [
-                ("cpu", "CPU 使用率 (%)"),
-                ("memory", "内存使用量 (MB)"),
-                ("fps", "FPS"),
-                ("gpu", "GPU 使用率 (%)"),
-                ("threads", "线程数"),
-                ("handles", "句柄数"),
-                ("disk_read", "磁盘读取 (MB/s)"),
-                ("disk_write", "磁盘写入 (MB/s)"),
-                ("net_sent", "网络发送 (MB/s)"),
-                ("net_recv", "网络接收 (MB/s)"),
-            ]
-            
-            row_idx = 1
-            for metric_key, metric_name in metrics:
-                metric_data = task_data.get(metric_key, [])
-                if metric_data:
-                    # 写入指标名称
-                    task_ws.cell(row=row_idx, column=1, value=metric_name)
-                    row_idx += 1
-                    
-                    # 写入表头
-                    task_ws.cell(row=row_idx, column=1, value="时间")
-                    task_ws.cell(row=row_idx, column=2, value="值")
-                    row_idx += 1
-                    
-                    # 写入数据
-                    for item in metric_data:
-                        time_val = item.get("time")
-                        value_val = item.get("value")
-                        if time_val:
-                            # 转换时间戳为可读时间
-                            time_str = datetime.fromtimestamp(time_val).strftime("%Y-%m-%d %H:%M:%S")
-                            task_ws.cell(row=row_idx, column=1, value=time_str)
-                            task_ws.cell(row=row_idx, column=2, value=value_val)
-                            row_idx += 1
-                    
-                    # 空行分隔不同指标
-                    row_idx += 1
-        
-        # 生成文件名
-        timestamp = time.strftime("%Y%m%d_%H%M%S")
-        filename = f"{report_name}_{timestamp}.xlsx"
-        file_path = COMPARISON_REPORT_DIR / filename
-        
-        # 保存 Excel
-        wb.save(file_path)
-        
-        logger.info(f"对比报告导出成功: {file_path}")
-        return str(file_path)
-    except Exception as e:
-        logger.error(f"导出对比报告失败: {e}")
-        raise
-
-
-async def export_label_comparison_excel_func(data: dict, report_name: str) -> str:
-    """
-    导出标签对比报告为 Excel
-    """
-    try:
-        # 创建 Workbook
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "标签对比结果"
-        
-        # 写入表头
-        headers = [
-            "任务名称", "版本", "标签名称", "开始时间", "结束时间", 
-            "CPU 均值(%)", "内存均值(MB)", "FPS 均值", "GPU 均值(%)", 
-            "线程数均值", "句柄数均值", "磁盘读取均值(MB/s)", 
-            "磁盘写入均值(MB/s)", "网络发送均值(MB/s)", "网络接收均值(MB/s)"
-        ]
-        ws.append(headers)
-        
-        # 写入数据
-        for task in data.get("tasks", []):
-            row = [
-                task.get("name", ""),
-                task.get("version", ""),
-                task.get("label_name", ""),
-                datetime.fromtimestamp(task.get("start_ts", 0)).strftime("%Y-%m-%d %H:%M:%S"),
-                datetime.fromtimestamp(task.get("end_ts", 0)).strftime("%Y-%m-%d %H:%M:%S"),
-                task.get("avg", {}).get("cpu_avg", "—"),
-                task.get("avg", {}).get("memory_avg", "—"),
-                task.get("avg", {}).get("fps_avg", "—"),
-                task.get("avg", {}).get("gpu_avg", "—"),
-                task.get("avg", {}).get("threads_avg", "—"),
-                task.get("avg", {}).get("handles_avg", "—"),
-                task.get("avg", {}).get("disk_read_avg", "—"),
-                task.get("avg", {}).get("disk_write_avg", "—"),
-                task.get("avg", {}).get("net_sent_avg", "—"),
-                task.get("avg", {}).get("net_recv_avg", "—"),
-            ]
-            ws.append(row)
-        
-        # 为每个标签添加原始数据工作表
-        for task in data.get("tasks", []):
-            task_name = task.get("name", "未知任务")
-            label_name = task.get("label_name", "未知标签")
-            sheet_name = f"{task_name}_{label_name}"
-            
-            # 限制工作表名称长度
-            if len(sheet_name) > 31:
-                sheet_name = sheet_name[:31]
-            
-            # 创建新工作表
-            task_ws = wb.create_sheet(title=sheet_name)
-            
-            # 写入原始数据
-            task_data = task.get("data", {})
-            metrics = [
-                ("cpu", "CPU 使用率 (%)"),
-                ("memory", "内存使用量 (MB)"),
-                ("fps", "FPS"),
-                ("gpu", "GPU 使用率 (%)"),
-                ("threads", "线程数"),
-                ("handles", "句柄数"),
-                ("disk_read", "磁盘读取 (MB/s)"),
-                ("disk_write", "磁盘写入 (MB/s)"),
-                ("net_sent", "网络发送 (MB/s)"),
-                ("net_recv", "网络接收 (MB/s)"),
-            ]
-            
-            row_idx = 1
-            for metric_key, metric_name in metrics:
-                # 标签数据的结构可能与任务数据不同，需要特殊处理
-                if metric_key in task_data:
-                    metric_data = task_data[metric_key]
-                    timestamps = task_data.get("timestamps", [])
-                    
-                    if metric_data and timestamps:
-                        # 写入指标名称
-                        task_ws.cell(row=row_idx, column=1, value=metric_name)
-                        row_idx += 1
-                        
-                        # 写入表头
-                        task_ws.cell(row=row_idx, column=1, value="时间")
-                        task_ws.cell(row=row_idx, column=2, value="值")
-                        row_idx += 1
-                        
-                        # 写入数据
-                        for i, value in enumerate(metric_data):
-                            if i < len(timestamps):
-                                time_val = timestamps[i]
-                                # 转换时间戳为可读时间
-                                time_str = datetime.fromtimestamp(time_val).strftime("%Y-%m-%d %H:%M:%S")
-                                task_ws.cell(row=row_idx, column=1, value=time_str)
-                                task_ws.cell(row=row_idx, column=2, value=value)
-                                row_idx += 1
-                        
-                        # 空行分隔不同指标
-                        row_idx += 1
-        
-        # 生成文件名
-        timestamp = time.strftime("%Y%m%d_%H%M%S")
-        filename = f"{report_name}_{timestamp}.xlsx"
-        file_path = COMPARISON_REPORT_DIR / filename
-        
-        # 保存 Excel
-        wb.save(file_path)
-        
-        logger.info(f"标签对比报告导出成功: {file_path}")
-        return str(file_path)
-    except Exception as e:
-        logger.error(f"导出标签对比报告失败: {e}")
-        raise
-
-
 # ── 生命周期 ──────────────────────────────────────────────────
 
 @app.on_event("startup")
 async def _startup():
     await create_tables()
+    # 采集子进程的写库请求由此唯一写者顺序执行
+    app.state.db_writer = asyncio.create_task(run_writer())
+    # 旧任务没有摘要 / 指标目录行时后台补算，不阻塞启动
+    app.state.catalog_backfill = asyncio.create_task(TaskCollection.backfill_summaries())
+    # 报告 / 导出后台作业：进程池执行，续跑上次未完成的作业
+    await start_jobs()
     # 定期检查僵尸 monitor 进程
     from apscheduler.schedulers.asyncio import AsyncIOScheduler
     scheduler = AsyncIOScheduler()
     scheduler.add_job(_cleanup_zombie_monitors, "interval", seconds=60)
+    # 已停止任务的 CSV 定期归档为压缩列存（.tsc），读取端透明
+    scheduler.add_job(TaskCollection.archive_stopped_tasks, "interval", seconds=60)
+    # 数据保留策略：旧任务降采样、清理截图（每轮处理量有上限）
+    scheduler.add_job(run_retention, "interval", minutes=RETENTION_INTERVAL_MINUTES)
     scheduler.start()
     app.state.scheduler = scheduler
 
@@ -364,6 +96,8 @@ async def _startup():
 async def _shutdown():
     if hasattr(app.state, "scheduler"):
         app.state.scheduler.shutdown(wait=False)
+    stop_writer()
+    stop_jobs()
     try:
         from client_perf.core.ios_tools import TunnelManager
         TunnelManager.stop_all_tunnels()
@@ -421,17 +155,18 @@ async def get_pids(
     is_print_tree: bool = False,
     device_type: str = "pc",
     device_id: str = None,
+    refresh: bool = False,
 ):
     try:
         if device_type == DEVICE_TYPE_ANDROID:
             from client_perf.core.android_tools import android_packages
-            return ok(await android_packages(device_id))
+            return ok(await android_packages(device_id, refresh))
         elif device_type == DEVICE_TYPE_IOS:
             from client_perf.core.ios_tools import ios_apps
             return ok(await ios_apps(device_id))
         elif device_type == DEVICE_TYPE_HARMONY:
             from client_perf.core.harmony_tools import harmony_packages
-            return ok(await harmony_packages(device_id))
+            return ok(await harmony_packages(device_id, refresh))
         else:
             from client_perf.core.pc_tools import process_tree, pids
             return ok(await process_tree() if is_print_tree else await pids())
@@ -440,21 +175,34 @@ async def get_pids(
 
 
 @app.get("/get_device_apps/")
-async def get_device_apps(device_type: str, device_id: str):
+async def get_device_apps(device_type: str, device_id: str, refresh: bool = False):
     try:
-        apps = await DeviceManager.get_device_apps_async(device_type, device_id)
+        apps = await DeviceManager.get_device_apps_async(device_type, device_id, refresh)
         return ok(apps)
     except Exception as e:
         return err(str(e))
 
 
 @app.get("/pid_img/")
-async def pid_img(pid: int = 0, device_type: str = "pc", device_id: str = None):
-    try:
-        img = await DeviceManager.take_screenshot(device_type, device_id or "", pid)
-        if img:
-            return base64.b64encode(img).decode()
-        return ""
+async def pid_img(request: Request, pid: int = 0, device_type: str = "pc", device_id: str = None,
+                  max_width: int = 0, format: str = "png", quality: int = 80):
+    """设备/进程预览截图，直接返回图片二进制，支持缩放、转码和 ETag 协商缓存"""
+    try:
+        from client_perf.core.screenshot import SCREENSHOT_FORMATS, screenshot_mime
+        fmt = format.lower()
+        if fmt not in SCREENSHOT_FORMATS:
+            return err(f"不支持的截图格式: {format}")
+        shot = await DeviceManager.preview_screenshot(
+            device_type, device_id or "", pid, max(0, max_width), fmt, quality
+        )
+        if not shot:
+            return Response(status_code=204)
+        data, etag = shot
+        etag = f'"{etag}"'
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+        return Response(content=data, media_type=screenshot_mime(fmt), headers=headers)
     except Exception as e:
         return err(str(e))
 
@@ -466,6 +214,29 @@ async def get_all_task():
     return ok(await TaskCollection.get_all_task())
 
 
+@app.get("/list_tasks/")
+async def list_tasks(
+    cursor: str = None,
+    limit: int = 50,
+    status: int = None,
+    device_type: str = None,
+    version: str = None,
+    package_name: str = None,
+    start_from: str = None,
+    start_to: str = None,
+    sort: str = "id",
+    order: str = "desc",
+):
+    """分页任务列表；每行带缓存的摘要列（duration / sample_count / data_size / *_avg）"""
+    try:
+        return ok(await TaskCollection.list_tasks(
+            cursor=cursor, limit=limit, status=status, device_type=device_type, version=version,
+            package_name=package_name, start_from=start_from, start_to=start_to, sort=sort, order=order,
+        ))
+    except Exception as e:
+        return err(str(e))
+
+
 @app.get("/run_task/")
 async def run_task(
     pid: int = 0,
@@ -475,11 +246,61 @@ async def run_task(
     device_type: str = "pc",
     device_id: str = None,
     package_name: str = None,
+    screenshot_format: str = "png",
+    screenshot_quality: int = 80,
+    screenshot_max_width: int = 0,
+    on_target_exit: str = "stop",
+    memory_detail_interval: int = 10,
+    thread_cpu: bool = False,
+    thread_top_n: int = 10,
+    cpu_freq: bool = False,
+    host_contention: bool = False,
+    disk_latency: bool = False,
+    task_type: str = "perf",
+    launch_mode: str = "cold",
+    launch_count: int = 5,
+    launch_settle: int = 3,
+    launch_activity: str = None,
+    launch_command: str = None,
+    launch_marker: str = None,
 ):
     try:
+        from client_perf.core.launch import LAUNCH_MODES, TASK_TYPE_LAUNCH, TASK_TYPES
+        from client_perf.core.lifecycle import ON_TARGET_EXIT_MODES
+        if on_target_exit not in ON_TARGET_EXIT_MODES:
+            return err(f"on_target_exit 仅支持: {', '.join(ON_TARGET_EXIT_MODES)}")
+        if task_type not in TASK_TYPES:
+            return err(f"task_type 仅支持: {', '.join(TASK_TYPES)}")
+        if task_type == TASK_TYPE_LAUNCH:
+            if launch_mode not in LAUNCH_MODES:
+                return err(f"launch_mode 仅支持: {', '.join(LAUNCH_MODES)}")
+            if device_type == "ios":
+                return err("iOS 暂不支持启动耗时测量")
+            if device_type == "pc" and (not launch_command or launch_mode != "cold"):
+                return err("PC 启动耗时测量需要 launch_command，且仅支持 cold")
+            if device_type != "pc" and not package_name:
+                return err("启动耗时测量需要 package_name")
+        options = {
+            "screenshot_format": screenshot_format,
+            "screenshot_quality": screenshot_quality,
+            "screenshot_max_width": screenshot_max_width,
+            "on_target_exit": on_target_exit,
+            "memory_detail_interval": memory_detail_interval,
+            "thread_cpu": thread_cpu,
+            "thread_top_n": thread_top_n,
+            "cpu_freq": cpu_freq,
+            "host_contention": host_contention,
+            "disk_latency": disk_latency,
+            "task_type": task_type,
+        }
+        if task_type == TASK_TYPE_LAUNCH:
+            options.update(launch_mode=launch_mode, launch_count=launch_count, launch_settle=launch_settle,
+                           launch_activity=launch_activity, launch_command=launch_command,
+                           launch_marker=launch_marker)
         task_id, file_dir = await TaskCollection.create_task(
             pid, pid_name, str(BASE_DIR), task_name, include_child,
             device_type=device_type, device_id=device_id, package_name=package_name,
+            options=options, task_type=task_type,
         )
         handle = TaskHandle(
             serialno=device_id or platform.node(),
@@ -491,6 +312,7 @@ async def run_task(
             device_type=device_type,
             device_id=device_id,
             package_name=package_name,
+            options=options,
         )
         handle.start()
         return ok()
@@ -501,8 +323,10 @@ async def run_task(
 @app.get("/stop_task/")
 async def stop_task(task_id: int):
     try:
-        task = await TaskCollection.stop_task(task_id)
+        # 先结束采集进程再标记停止，摘要才包含最后一轮数据
+        task = await TaskCollection.get_item_task(task_id)
         TaskHandle.stop_handle(task.get("monitor_pid"))
+        await TaskCollection.stop_task(task_id)
         return ok()
     except Exception as e:
         return err(str(e))
@@ -518,21 +342,69 @@ async def task_status(task_id: int):
 
 
 @app.get("/result/")
-async def task_result(task_id: int):
+async def task_result(task_id: int, start_ts: float = None, end_ts: float = None, metrics: str = None):
+    """任务数据；指定 start_ts / end_ts / metrics（逗号分隔的 CSV 名）时只读取该时间窗口和指标"""
     try:
         task = await TaskCollection.get_item_task(task_id)
-        data = await DataCollect(task["file_dir"]).get_all_data()
+        collect = DataCollect(task["file_dir"])
+        if start_ts is None and end_ts is None and not metrics:
+            return ok(await collect.get_all_data())
+        names = [m.strip() for m in metrics.split(",") if m.strip()] if metrics else None
+        data = await collect.get_range(start_ts, end_ts, names)
         return ok(data)
     except Exception as e:
         return err(str(e))
 
 
+@app.get("/task_events/")
+async def task_events(task_id: int):
+    """任务生命周期事件（目标进程退出、重新附着、数据缺口、自动停止）"""
+    try:
+        from client_perf.core.lifecycle import read_events
+        task = await TaskCollection.get_item_task(task_id)
+        return ok(await asyncio.to_thread(read_events, task["file_dir"]))
+    except Exception as e:
+        return err(str(e))
+
+
+@app.get("/screenshot/")
+async def task_screenshot(task_id: int, ts: int):
+    """按时间戳取任务截图（截图按内容去重存储，文件名不再等于时间戳）"""
+    try:
+        from client_perf.core.screenshot import ScreenshotIndex
+        task = await TaskCollection.get_item_task(task_id)
+        path = await asyncio.to_thread(lambda: ScreenshotIndex(task["file_dir"]).lookup(ts))
+        if not path:
+            return err("该时间点没有截图", 404)
+        return FileResponse(path=str(path))
+    except Exception as e:
+        return err(str(e))
+
+
+@app.get("/screenshot_strip/")
+async def task_screenshot_strip(task_id: int, start_ts: int, end_ts: int, count: int = 30):
+    """时间轴缩略图：[start_ts, end_ts] 区间均匀取 count 帧拼成一张雪碧图"""
+    try:
+        from client_perf.core.screenshot import ScreenshotIndex
+        task = await TaskCollection.get_item_task(task_id)
+        strip = await asyncio.to_thread(
+            lambda: ScreenshotIndex(task["file_dir"]).sprite(start_ts, end_ts, count)
+        )
+        sprite = strip.pop("sprite")
+        strip["sprite_url"] = f"/static/{task_id}/{sprite}" if sprite else None
+        return ok(strip)
+    except Exception as e:
+        return err(str(e))
+
+
 @app.get("/delete_task/")
 async def delete_task(task_id: int):
     try:
         item = await TaskCollection.delete_task(task_id)
-        if item.get("file_dir") and os.path.exists(item["file_dir"]):
-            shutil.rmtree(item["file_dir"], ignore_errors=True)
+        if item.get("file_dir"):
+            task_data_cache.drop(item["file_dir"])
+            if os.path.exists(item["file_dir"]):
+                shutil.rmtree(item["file_dir"], ignore_errors=True)
         return ok()
     except Exception as e:
         return err(str(e))
@@ -565,6 +437,32 @@ async def set_task_baseline(task_id: int, is_baseline: bool = True):
         return err(str(e))
 
 
+@app.get("/pin_task_data/")
+async def pin_task_data(task_id: int, pinned: bool = True):
+    """常驻已停止任务的解码数据（如基线任务），不被缓存淘汰"""
+    try:
+        task = await TaskCollection.get_item_task(task_id)
+        if not pinned:
+            task_data_cache.unpin(task["file_dir"])
+            return ok(task_data_cache.stats())
+        if task["status"] != 2:
+            return err("只能常驻已停止任务的数据", 400)
+        if task_data_cache.pinned_bytes() >= TASK_DATA_CACHE_BYTES // 2:
+            return err("常驻数据已达缓存容量的一半，请先取消其他任务", 400)
+        task_data_cache.pin(task["file_dir"])
+        # 预热：读一遍数据进入缓存
+        await DataCollect(task["file_dir"]).get_all_data(is_format=False)
+        return ok(task_data_cache.stats())
+    except Exception as e:
+        return err(str(e))
+
+
+@app.get("/cache_stats/")
+async def cache_stats():
+    """解码数据缓存与对比结果缓存的占用和命中情况"""
+    return ok({"task_data": task_data_cache.stats(), "comparison": comparison_cache.stats()})
+
+
 @app.get("/get_baseline_task/")
 async def get_baseline_task():
     try:
@@ -576,24 +474,122 @@ async def get_baseline_task():
 
 # ── Excel 导出 ────────────────────────────────────────────────
 
+async def _job_response(job: dict, background: bool):
+    """background=True 时立即返回作业信息；否则等待作业完成后直接下载（等待期间不阻塞其他请求）"""
+    if background:
+        return ok(job)
+    job = await wait_job(job["id"])
+    if job["status"] != "done":
+        return err(job.get("error") or f"作业{job['message'] or job['status']}")
+    return _file_response(job["result_path"])
+
+
+def _file_response(file_path: str):
+    return FileResponse(
+        path=file_path,
+        filename=os.path.basename(file_path),
+        media_type=_MEDIA_TYPES.get(Path(file_path).suffix.lower()),
+    )
+
+
+_MEDIA_TYPES = {
+    ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ".zip": "application/zip",
+}
+
+
 @app.get("/export_excel/")
-async def export_excel(task_id: int):
-    try:
-        task = await TaskCollection.get_item_task(task_id)
-        data = await DataCollect(task["file_dir"]).get_all_data(is_format=False)
-        file_path = create_excel_report(
-            task.get("name") or f"任务{task_id}", data, task["file_dir"]
-        )
-        return FileResponse(
-            path=file_path,
-            filename=os.path.basename(file_path),
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        )
+async def export_excel(task_id: int, background: bool = False, file_format: str = "xlsx"):
+    """导出单个任务：xlsx（默认）/ csv_zip（原始 CSV 打包）/ parquet（每个 CSV 一个 Parquet，打包为 zip）"""
+    try:
+        if file_format not in EXPORT_FORMATS:
+            return err(f"file_format 仅支持 {', '.join(EXPORT_FORMATS)}", 400)
+        if file_format == "parquet" and not PARQUET_AVAILABLE:
+            return err("未安装 pyarrow，无法导出 Parquet", 400)
+        await TaskCollection.get_item_task(task_id)
+        job = await submit_job("task_excel", {"task_id": task_id, "format": file_format})
+        return await _job_response(job, background)
     except Exception as e:
         logger.error(traceback.format_exc())
         return err(str(e))
 
 
+# ── 后台作业 ──────────────────────────────────────────────────
+
+@app.get("/list_jobs/")
+async def list_jobs(status: str = None, kind: str = None, limit: int = 50):
+    try:
+        return ok(await JobCollection.list_jobs(status=status, kind=kind, limit=limit))
+    except Exception as e:
+        return err(str(e))
+
+
+@app.get("/job_status/")
+async def job_status(job_id: str):
+    try:
+        return ok(await JobCollection.get_job(job_id))
+    except Exception as e:
+        return err(str(e), 404)
+
+
+@app.get("/cancel_job/")
+async def cancel_job_route(job_id: str):
+    try:
+        return ok(await cancel_job(job_id))
+    except Exception as e:
+        return err(str(e), 400)
+
+
+@app.get("/job_result/")
+async def job_result(job_id: str):
+    """下载已完成作业的结果文件"""
+    try:
+        job = await JobCollection.get_job(job_id)
+        if job["status"] != "done":
+            return err(f"作业未完成（{job['status']}）", 409)
+        if not job["result_path"] or not os.path.exists(job["result_path"]):
+            return err("结果文件不存在", 404)
+        return _file_response(job["result_path"])
+    except Exception as e:
+        return err(str(e), 404)
+
+
+# ── 数据保留策略 ──────────────────────────────────────────────
+
+class RetentionPolicyBody(BaseModel):
+    enabled: bool | None = None
+    full_resolution_days: int | None = None
+    rollup_seconds: int | None = None
+    screenshot_days: int | None = None
+    tasks_per_run: int | None = None
+    max_mb_per_run: int | None = None
+
+
+@app.get("/retention_policy/")
+async def retention_policy():
+    return ok(load_policy())
+
+
+@app.post("/set_retention_policy/")
+async def set_retention_policy(body: RetentionPolicyBody):
+    """修改保留策略（只需传要修改的项），下一轮定时执行生效"""
+    try:
+        return ok(save_policy(body.model_dump(exclude_none=True)))
+    except ValueError as e:
+        return err(str(e), 400)
+    except Exception as e:
+        return err(str(e))
+
+
+@app.get("/run_retention/")
+async def run_retention_now():
+    """立即执行一轮保留策略（与定时执行互斥，正在执行时直接返回空统计）"""
+    try:
+        return ok(await run_retention())
+    except Exception as e:
+        return err(str(e))
+
+
 # ── 对比分析 ──────────────────────────────────────────────────
 
 @app.get("/compare_tasks/")
@@ -607,34 +603,57 @@ async def compare_tasks(task_ids: str, base_task_id: int = None):
         return err(str(e))
 
 
+@app.get("/trend/")
+async def trend(
+    metric: str,
+    group_by: str = "version",
+    device_type: str = None,
+    device_id: str = None,
+    package_name: str = None,
+    baseline: str = None,
+    alpha: float = 0.05,
+    min_change: float = 5.0,
+):
+    """跨任务指标趋势（读 metric_catalog 聚合表），标记相对基准组的显著回归"""
+    try:
+        from client_perf.comparison import TaskComparison
+        return ok(await TaskComparison.trend(
+            metric, group_by=group_by, device_type=device_type, device_id=device_id,
+            package_name=package_name, baseline=baseline, alpha=alpha, min_change=min_change,
+        ))
+    except ValueError as e:
+        return err(str(e), 400)
+    except Exception as e:
+        return err(str(e))
+
+
+@app.get("/compare_threads/")
+async def compare_threads(task_ids: str, base_task_id: int = None, top: int = 20):
+    """线程级 CPU 对比：列出相对基准任务变化最大的线程（需任务开启 thread_cpu）"""
+    try:
+        from client_perf.comparison import TaskComparison
+        id_list = [int(x.strip()) for x in task_ids.split(",") if x.strip()]
+        return ok(await TaskComparison.compare_threads(id_list, base_task_id, top))
+    except Exception as e:
+        return err(str(e))
+
+
 @app.get("/export_comparison_excel/")
 async def export_comparison_excel(
     task_ids: str,
     base_task_id: int = None,
     report_name: str = None,
+    background: bool = False,
 ):
     try:
-        from client_perf.comparison import TaskComparison
-
         id_list = [int(x.strip()) for x in task_ids.split(",") if x.strip()]
-        data = await TaskComparison.create_comparison(id_list, base_task_id)
+        if not id_list:
+            return err("task_ids 不能为空", 400)
         name = report_name or f"性能对比_{time.strftime('%Y%m%d_%H%M%S')}"
-        file_path = await create_comparison_excel(data, name)
-
-        report = await ComparisonReportCollection.create_report(
-            name=name,
-            task_ids=id_list,
-            base_task_id=base_task_id or id_list[0],
-            description=f"对比任务: {task_ids}",
-        )
-        await ComparisonReportCollection.update_report(
-            report["id"], report_path=file_path
-        )
-        return FileResponse(
-            path=file_path,
-            filename=os.path.basename(file_path),
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        )
+        job = await submit_job("comparison_excel", {
+            "task_ids": id_list, "base_task_id": base_task_id, "report_name": name,
+        })
+        return await _job_response(job, background)
     except Exception as e:
         logger.error(traceback.format_exc())
         return err(str(e))
@@ -648,6 +667,15 @@ async def get_comparison_reports():
         return err(str(e))
 
 
+@app.get("/get_comparison_report/")
+async def get_comparison_report(report_id: int):
+    """已保存对比报告的完整结果（导出时保存，无需重新计算）"""
+    try:
+        return ok(await ComparisonReportCollection.get_report_result(report_id))
+    except Exception as e:
+        return err(str(e))
+
+
 @app.get("/delete_comparison_report/")
 async def delete_comparison_report(report_id: int):
     try:
@@ -661,7 +689,7 @@ async def delete_comparison_report(report_id: int):
 
 
 @app.get("/export_label_comparison_excel/")
-async def export_label_comparison_excel(label_ids: str, report_name: str = None):
+async def export_label_comparison_excel(label_ids: str, report_name: str = None, background: bool = False):
     """
     导出标签对比报告为 Excel
     """
@@ -669,119 +697,9 @@ async def export_label_comparison_excel(label_ids: str, report_name: str = None)
         ids = [int(x.strip()) for x in label_ids.split(",") if x.strip()]
         if len(ids) < 2:
             return err("至少需要两个标签", 400)
-        
-        labels = [await LabelCollection.get_label(lid) for lid in ids]
-        
-        async def _load_sliced(label: dict):
-            info = await TaskCollection.get_item_task(label["task_id"])
-            raw  = await DataCollect(info["file_dir"]).get_all_data(is_format=False)
-            sliced = [
-                {
-                    "name": item["name"],
-                    "value": [
-                        v for v in item.get("value", [])
-                        if label["start_ts"] <= v.get("time", 0) <= label["end_ts"]
-                    ],
-                }
-                for item in raw
-            ]
-            return info, sliced, label
-        
-        results = await asyncio.gather(*[_load_sliced(lb) for lb in labels])
-        
-        # 指标映射：metric_key -> (csv_stem, csv_column_prefix)
-        metric_map = {
-            "cpu":        ("cpu",          "cpu_usage"),
-            "memory":     ("memory",       "process_memory_usage"),
-            "fps":        ("fps",          "fps"),
-            "gpu":        ("gpu",          "gpu"),
-            "threads":    ("process_info", "num_threads"),
-            "handles":    ("process_info", "num_handles"),
-            "disk_read":  ("disk_io",      "disk_read_rate"),
-            "disk_write": ("disk_io",      "disk_write_rate"),
-            "net_sent":   ("network_io",   "net_sent_rate"),
-            "net_recv":   ("network_io",   "net_recv_rate"),
-        }
-        
-        def _extract_values(data: list[dict], stem: str, col_prefix: str) -> list[float]:
-            """从 get_all_data() 结果中提取指定指标的数值列表。"""
-            for item in data:
-                if item.get("name") != stem:
-                    continue
-                vals: list[float] = []
-                for row in item.get("value", []):
-                    for k, v in row.items():
-                        if k.startswith(col_prefix) and isinstance(v, (int, float)):
-                            vals.append(float(v))
-                            break
-                return vals
-            return []
-        
-        def _calc_avg(vals: list[float]) -> float | None:
-            return round(sum(vals) / len(vals), 4) if vals else None
-        
-        def _build_task_avg(data: list[dict]) -> dict[str, float | None]:
-            """返回 {metric_avg_key: value} 形如 {"cpu_avg": 12.3, ...}"""
-            result: dict[str, float | None] = {}
-            for metric, (stem, col) in metric_map.items():
-                vals = _extract_values(data, stem, col)
-                result[f"{metric}_avg"] = _calc_avg(vals)
-            return result
-        
-        tasks_result = []
-        for info, sliced_data, label in results:
-            tasks_result.append({
-                "id":          info["id"],
-                "name":        info.get("name", ""),
-                "version":     info.get("version", ""),
-                "label_id":    label["id"],
-                "label_name":  label["name"],
-                "label_color": label["color"],
-                "start_ts":    label["start_ts"],
-                "end_ts":      label["end_ts"],
-                "avg":         _build_task_avg(sliced_data),
-            })
-        
-        base = tasks_result[0]
-        for t in tasks_result:
-            diff, pct = {}, {}
-            for k, v in t["avg"].items():
-                bv = base["avg"].get(k)
-                if v is not None and bv is not None:
-                    d = round(v - bv, 4)
-                    diff[k] = d
-                    pct[k]  = round(d / bv * 100, 2) if bv != 0 else None
-                else:
-                    diff[k] = pct[k] = None
-            t["diff"] = diff
-            t["pct"]  = pct
-        
-        data = {
-            "base_task": {
-                "id":         base["id"],
-                "name":       base["name"],
-                "label_name": base["label_name"],
-            },
-            "tasks": tasks_result,
-        }
-        
         name = report_name or f"标签对比_{time.strftime('%Y%m%d_%H%M%S')}"
-        file_path = await export_label_comparison_excel_func(data, name)
-        
-        report = await ComparisonReportCollection.create_report(
-            name=name,
-            task_ids=[t["id"] for t in tasks_result],
-            base_task_id=base["id"],
-            description=f"对比标签: {label_ids}",
-        )
-        await ComparisonReportCollection.update_report(
-            report["id"], report_path=file_path
-        )
-        return FileResponse(
-            path=file_path,
-            filename=os.path.basename(file_path),
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        )
+        job = await submit_job("label_comparison_excel", {"label_ids": ids, "report_name": name})
+        return await _job_response(job, background)
     except Exception as e:
         logger.error(traceback.format_exc())
         return err(str(e))
@@ -792,121 +710,12 @@ async def export_label_comparison_excel(label_ids: str, report_name: str = None)
 @app.get("/advanced_compare_tasks/")
 async def advanced_compare_tasks(task_ids: str, base_task_id: int = None):
     """统计显著性 + 异常值检测 + 瓶颈分析"""
-    import math
     try:
+        from client_perf.comparison import TaskComparison
         id_list = [int(x.strip()) for x in task_ids.split(",") if x.strip()]
         if len(id_list) < 2:
             return err("高级分析需要至少两个任务", 400)
-
-        base_id = base_task_id or id_list[0]
-        cmp_id  = id_list[1] if id_list[0] == base_id else id_list[0]
-
-        base_info = await TaskCollection.get_item_task(base_id)
-        cmp_info  = await TaskCollection.get_item_task(cmp_id)
-        base_data = await DataCollect(base_info["file_dir"]).get_all_data()
-        cmp_data  = await DataCollect(cmp_info["file_dir"]).get_all_data()
-
-        metric_map = {
-            "cpu":        ("cpu",          "cpu_usage"),
-            "memory":     ("memory",       "process_memory_usage"),
-            "fps":        ("fps",          "fps"),
-            "gpu":        ("gpu",          "gpu"),
-            "threads":    ("process_info", "num_threads"),
-            "disk_read":  ("disk_io",      "disk_read_rate"),
-            "disk_write": ("disk_io",      "disk_write_rate"),
-            "net_sent":   ("network_io",   "net_sent_rate"),
-            "net_recv":   ("network_io",   "net_recv_rate"),
-        }
-        better_smaller = {"cpu", "memory", "disk_read", "disk_write", "net_sent", "net_recv"}
-
-        def extract(data, dk, vk):
-            vals = []
-            for item in data:
-                if item.get("name") == dk:
-                    for v in item.get("value", []):
-                        raw = v.get(vk)
-                        if raw not in (None, "", "-"):
-                            try:
-                                vals.append(float(raw))
-                            except (ValueError, TypeError):
-                                pass
-            return vals
-
-        def stats(arr):
-            n = len(arr)
-            if n == 0:
-                return 0.0, 0.0, 0.0
-            mean = sum(arr) / n
-            var  = sum((x - mean) ** 2 for x in arr) / max(n - 1, 1)
-            return mean, var, n
-
-        significance = {}
-        outliers_result = {}
-        bottlenecks = []
-
-        for metric, (dk, vk) in metric_map.items():
-            bv = extract(base_data, dk, vk)
-            cv = extract(cmp_data,  dk, vk)
-            if not bv or not cv:
-                continue
-
-            bm, bvar, bn = stats(bv)
-            cm, cvar, cn = stats(cv)
-            diff = cm - bm
-            pct  = (diff / bm * 100) if bm != 0 else 0
-
-            se = ((bvar / bn) + (cvar / cn)) ** 0.5 if (bvar / bn + cvar / cn) > 0 else 1e-9
-            t  = abs(diff / se) if se > 0 else 0
-            p  = 2 * (1 - min(0.9999, 0.5 * (1 + math.erf(t / math.sqrt(2)))))
-            significant = p < 0.05
-
-            significance[metric] = {
-                "base_mean": round(bm, 4),
-                "compare_mean": round(cm, 4),
-                "diff": round(diff, 4),
-                "percent_change": round(pct, 2),
-                "p_value": round(p, 4),
-                "confidence": round((1 - p) * 100, 2),
-                "is_significant": significant,
-            }
-
-            # 异常值（Z-score > 2.5）
-            combined = bv + cv
-            mc = sum(combined) / len(combined)
-            sc = (sum((x - mc) ** 2 for x in combined) / max(len(combined) - 1, 1)) ** 0.5
-            outlier_list = [
-                {"value": round(v, 4), "z_score": round(abs((v - mc) / sc) if sc else 0, 2), "is_high": v > mc}
-                for v in cv if sc and abs((v - mc) / sc) > 2.5
-            ]
-            if outlier_list:
-                outliers_result[metric] = {
-                    "outliers": outlier_list[:20],
-                    "summary": f"检测到 {len(outlier_list)} 个异常值",
-                }
-
-            # 瓶颈
-            if significant and abs(pct) > 20:
-                is_worse = (pct > 0) if metric in better_smaller else (pct < 0)
-                bottlenecks.append({
-                    "metric": metric,
-                    "percent_change": round(pct, 2),
-                    "is_worse": is_worse,
-                })
-
-        bottlenecks.sort(key=lambda x: abs(x["percent_change"]), reverse=True)
-
-        return ok({
-            "base_task":    {"id": base_id, "name": base_info.get("name", "")},
-            "compare_task": {"id": cmp_id,  "name": cmp_info.get("name", "")},
-            "advanced_analysis": {
-                "statistical_significance": significance,
-                "outliers": outliers_result,
-                "bottleneck_analysis": {
-                    "potential_bottlenecks": bottlenecks,
-                    "summary": f"共发现 {len(bottlenecks)} 个潜在性能瓶颈",
-                },
-            },
-        })
+        return ok(await TaskComparison.advanced_compare(id_list, base_task_id))
     except Exception as e:
         logger.error(traceback.format_exc())
         return err(str(e))
@@ -987,113 +796,12 @@ async def compare_labels(label_ids: str):
     label_ids: 逗号分隔的 label id，每个 label 对应一个任务的一段区间。
     """
     try:
-        from client_perf.comparison import _build_task_avg
-        import asyncio
+        from client_perf.comparison import TaskComparison
 
         ids = [int(x.strip()) for x in label_ids.split(",") if x.strip()]
         if len(ids) < 2:
             return err("至少需要两个标签", 400)
-
-        labels = [await LabelCollection.get_label(lid) for lid in ids]
-
-        async def _load_sliced(label: dict):
-            info = await TaskCollection.get_item_task(label["task_id"])
-            raw  = await DataCollect(info["file_dir"]).get_all_data(is_format=False)
-            sliced = [
-                {
-                    "name": item["name"],
-                    "value": [
-                        v for v in item.get("value", [])
-                        if label["start_ts"] <= v.get("time", 0) <= label["end_ts"]
-                    ],
-                }
-                for item in raw
-            ]
-            return info, sliced, label
-
-        results = await asyncio.gather(*[_load_sliced(lb) for lb in labels])
-
-        # 指标映射：metric_key -> (csv_stem, csv_column_prefix)
-        metric_map = {
-            "cpu":        ("cpu",          "cpu_usage"),
-            "memory":     ("memory",       "process_memory_usage"),
-            "fps":        ("fps",          "fps"),
-            "gpu":        ("gpu",          "gpu"),
-            "threads":    ("process_info", "num_threads"),
-            "handles":    ("process_info", "num_handles"),
-            "disk_read":  ("disk_io",      "disk_read_rate"),
-            "disk_write": ("disk_io",      "disk_write_rate"),
-            "net_sent":   ("network_io",   "net_sent_rate"),
-            "net_recv":   ("network_io",   "net_recv_rate"),
-        }
-
-        def extract_detailed_data(sliced_data):
-            """提取标签区间内的详细数据"""
-            data = {"timestamps": []}
-            # 初始化各指标的数据数组
-            for metric in metric_map:
-                data[metric] = []
-            
-            # 先获取时间戳
-            for item in sliced_data:
-                if item.get("name") == "cpu":  # 任意选择一个指标获取时间戳
-                    for v in item.get("value", []):
-                        data["timestamps"].append(v.get("time", 0))
-                    break
-            
-            # 提取各指标的数据
-            for metric, (stem, col_prefix) in metric_map.items():
-                for item in sliced_data:
-                    if item.get("name") != stem:
-                        continue
-                    for v in item.get("value", []):
-                        for k, val in v.items():
-                            if k.startswith(col_prefix) and isinstance(val, (int, float)):
-                                data[metric].append(float(val))
-                                break
-                        else:
-                            data[metric].append(None)
-                    break
-            
-            return data
-
-        tasks_result = []
-        for info, sliced_data, label in results:
-            tasks_result.append({
-                "id":          info["id"],
-                "name":        info.get("name", ""),
-                "version":     info.get("version", ""),
-                "label_id":    label["id"],
-                "label_name":  label["name"],
-                "label_color": label["color"],
-                "start_ts":    label["start_ts"],
-                "end_ts":      label["end_ts"],
-                "avg":         _build_task_avg(sliced_data),
-                "data":        extract_detailed_data(sliced_data),
-            })
-
-        base = tasks_result[0]
-        for t in tasks_result:
-            diff, pct = {}, {}
-            for k, v in t["avg"].items():
-                bv = base["avg"].get(k)
-                if v is not None and bv is not None:
-                    d = round(v - bv, 4)
-                    diff[k] = d
-                    pct[k]  = round(d / bv * 100, 2) if bv != 0 else None
-                else:
-                    diff[k] = pct[k] = None
-            t["diff"] = diff
-            t["pct"]  = pct
-
-        return ok({
-            "base_task": {
-                "id":         base["id"],
-                "name":       base["name"],
-                "label_name": base["label_name"],
-            },
-            "tasks": tasks_result,
-        })
+        return ok(await TaskComparison.compare_labels(ids))
     except Exception as e:
         logger.error(traceback.format_exc())
         return err(str(e))
@@ -0,0 +1,465 @@
+# coding: utf-8
+"""
+任务数据归档 — 已停止任务的 CSV 转存为按列编码的压缩文件 <stem>.tsc，读取端透明。
+
+文件结构：
+  MAGIC | 块 0 | 块 1 | ... | 尾部 JSON | 尾部长度(u32 LE) | MAGIC
+  尾部 JSON：{"version", "codec", "header", "rows", "source_size",
+             "blocks": [[t_first, t_last, offset, length, rows], ...]}
+
+* 每块 ARCHIVE_BLOCK_ROWS 行，按列编码后整块压缩（zstd，未安装 zstandard 时用 zlib）；
+  尾部记录每块的时间范围，区间读取只解压与窗口相交的块
+* 每列每块按内容选择编码：
+  NUM  整数 / 定点小数：按最大小数位数放大为整数，time 列存二阶差分（delta-of-delta），
+       其余列存一阶差分，zigzag + varint
+  XOR  其余可精确往返的浮点：与上一个值的 IEEE754 位做异或（Gorilla 思路，零字节交给压缩器）
+  STR  文本（JSON 列等），原样保存
+  空单元格单独记在位图里，不参与编码
+* 无损：解码结果与按 CSV 读取（parse_value）完全一致，还原出的 CSV 文本也与原文件逐格一致；
+  归档后逐行校验通过才删除 CSV 与时间索引，校验失败保留 CSV
+"""
+import csv
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from client_perf.log import log as logger
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ARCHIVE_SUFFIX = ".tsc"
+ARCHIVE_BLOCK_ROWS = 4096
+ARCHIVE_CODEC = "zstd" if zstandard is not None else "zlib"
+ARCHIVE_ZSTD_LEVEL = 10
+# CSV 最后一次写入后至少静默这么久才归档，避免与采集进程最后一轮写入竞争
+ARCHIVE_QUIET_SECONDS = 60
+# 定时归档每轮最多处理的任务数（限制单轮 IO）
+ARCHIVE_TASKS_PER_RUN = 5
+
+_MAGIC = b"TSC1"
+_VERSION = 1
+_NUM, _XOR, _STR = 0, 1, 2
+_MAX_DECIMALS = 9
+_MAX_SCALED = 1 << 62
+
+# 改写任务数据文件（归档、保留策略降采样）时持有，同一时刻只有一方改写
+DATA_REWRITE_LOCK = threading.Lock()
+
+# 归档失败或归档后并不更小而保留的 CSV：路径 -> (mtime_ns, 大小)，文件不变时不再重试
+_kept: dict[str, tuple[int, int]] = {}
+
+
+def parse_value(v: str | None) -> Any:
+    """CSV 单元格 → None / int / float / 原字符串"""
+    if v == "" or v is None:
+        return None
+    try:
+        return float(v) if "." in v else int(v)
+    except (ValueError, TypeError):
+        return v
+
+
+def _to_text(v: Any) -> str:
+    """解码值 → CSV 单元格文本（NUM / XOR 编码前已确认与原文本一致）"""
+    if v is None:
+        return ""
+    if isinstance(v, float):
+        return repr(v)
+    return str(v)
+
+
+def archive_path(csv_path: Path) -> Path:
+    return Path(csv_path).with_suffix(ARCHIVE_SUFFIX)
+
+
+# ── 压缩 ──────────────────────────────────────────────────────
+
+def _compress(data: bytes) -> bytes:
+    if ARCHIVE_CODEC == "zstd":
+        return zstandard.ZstdCompressor(level=ARCHIVE_ZSTD_LEVEL).compress(data)
+    return zlib.compress(data, 9)
+
+
+def _decompress(codec: str, data: bytes) -> bytes:
+    if codec == "zlib":
+        return zlib.decompress(data)
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("归档使用 zstd 压缩，需要安装 zstandard")
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f"不支持的归档压缩格式: {codec}")
+
+
+# ── varint / 位图 ─────────────────────────────────────────────
+
+def _put_varint(out: bytearray, n: int) -> None:
+    """有符号整数 → zigzag → varint"""
+    n = n * 2 if n >= 0 else -n * 2 - 1
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _get_varint(buf: bytes, pos: int) -> tuple[int, int]:
+    n = shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        n |= (b & 0x7F) << shift
+        if b < 0x80:
+            break
+        shift += 7
+    return (n >> 1) if not n & 1 else -((n + 1) >> 1), pos
+
+
+def _put_bitmap(out: bytearray, flags: list[bool]) -> None:
+    bits = bytearray((len(flags) + 7) // 8)
+    for i, f in enumerate(flags):
+        if f:
+            bits[i >> 3] |= 1 << (i & 7)
+    out += bits
+
+
+def _get_bitmap(buf: bytes, pos: int, n: int) -> tuple[list[bool], int]:
+    size = (n + 7) // 8
+    bits = buf[pos:pos + size]
+    return [bool(bits[i >> 3] & (1 << (i & 7))) for i in range(n)], pos + size
+
+
+# ── 列编码 ────────────────────────────────────────────────────
+
+def _scaled(texts: list[str]) -> Optional[tuple[int, list[bool], list[int]]]:
+    """整数 / 定点小数列 → (小数位数, 是否浮点, 放大后的整数)；不能无损表示时返回 None"""
+    decimals = 0
+    parsed = []
+    for t in texts:
+        v = parse_value(t)
+        if isinstance(v, int):
+            if str(v) != t:
+                return None
+            parsed.append((False, t, 0))
+        elif isinstance(v, float):
+            if repr(v) != t or "e" in t or "E" in t:
+                return None
+            d = len(t) - t.index(".") - 1
+            decimals = max(decimals, d)
+            parsed.append((True, t, d))
+        else:
+            return None
+    if decimals > _MAX_DECIMALS:
+        return None
+    flags, ints = [], []
+    scale = 10 ** decimals
+    for is_float, t, d in parsed:
+        s = int(t.replace(".", "") + "0" * (decimals - d)) if is_float else int(t) * scale
+        # -0.0 放大后丢失符号，交给其他编码
+        if abs(s) >= _MAX_SCALED or (is_float and (s / scale != float(t) or (s == 0 and t.startswith("-")))):
+            return None
+        flags.append(is_float)
+        ints.append(s)
+    return decimals, flags, ints
+
+
+def _encode_column(out: bytearray, cells: list[str], second_order: bool) -> None:
+    present = [c != "" for c in cells]
+    _put_bitmap(out, present)
+    texts = [c for c in cells if c != ""]
+    num = _scaled(texts)
+    if num is not None:
+        decimals, flags, ints = num
+        out.append(_NUM)
+        out.append(decimals)
+        _put_bitmap(out, flags)
+        prev = prev_delta = 0
+        for s in ints:
+            delta = s - prev
+            _put_varint(out, delta - prev_delta if second_order else delta)
+            prev, prev_delta = s, delta
+        return
+    floats = [parse_value(t) for t in texts]
+    if all(isinstance(v, float) and repr(v) == t for v, t in zip(floats, texts)):
+        out.append(_XOR)
+        prev = 0
+        for v in floats:
+            bits = struct.unpack("<Q", struct.pack("<d", v))[0]
+            out += struct.pack(">Q", bits ^ prev)
+            prev = bits
+        return
+    out.append(_STR)
+    for t in texts:
+        raw = t.encode("utf-8")
+        _put_varint(out, len(raw))
+        out += raw
+
+
+def _decode_column(buf: bytes, pos: int, rows: int, second_order: bool, as_text: bool) -> tuple[list[Any], int]:
+    """as_text=True 时返回原 CSV 单元格文本（空单元格为 ""），否则返回解析后的值"""
+    present, pos = _get_bitmap(buf, pos, rows)
+    n = sum(present)
+    kind = buf[pos]
+    pos += 1
+    values: list[Any] = []
+    if kind == _NUM:
+        decimals = buf[pos]
+        pos += 1
+        flags, pos = _get_bitmap(buf, pos, n)
+        scale = 10 ** decimals
+        prev = prev_delta = 0
+        for is_float in flags:
+            d, pos = _get_varint(buf, pos)
+            delta = prev_delta + d if second_order else d
+            prev, prev_delta = prev + delta, delta
+            values.append(prev / scale if is_float else prev // scale)
+    elif kind == _XOR:
+        prev = 0
+        for _ in range(n):
+            bits = struct.unpack_from(">Q", buf, pos)[0] ^ prev
+            pos += 8
+            values.append(struct.unpack("<d", struct.pack("<Q", bits))[0])
+            prev = bits
+    elif kind == _STR:
+        for _ in range(n):
+            length, pos = _get_varint(buf, pos)
+            text = buf[pos:pos + length].decode("utf-8")
+            values.append(text if as_text else parse_value(text))
+            pos += length
+    else:
+        raise ValueError(f"未知的列编码: {kind}")
+    if as_text and kind != _STR:
+        values = [_to_text(v) for v in values]
+    it = iter(values)
+    empty = "" if as_text else None
+    return [next(it) if p else empty for p in present], pos
+
+
+def _encode_block(rows: list[list[str]], width: int, time_col: Optional[int]) -> bytes:
+    out = bytearray()
+    _put_varint(out, len(rows))
+    for c in range(width):
+        _encode_column(out, [r[c] for r in rows], c == time_col)
+    return _compress(bytes(out))
+
+
+def _decode_block(codec: str, data: bytes, width: int, time_col: Optional[int], as_text: bool = False) -> list[list[Any]]:
+    buf = _decompress(codec, data)
+    rows, pos = _get_varint(buf, 0)
+    columns = []
+    for c in range(width):
+        col, pos = _decode_column(buf, pos, rows, c == time_col, as_text)
+        columns.append(col)
+    return [list(r) for r in zip(*columns)] if columns else [[] for _ in range(rows)]
+
+
+# ── 写入 ──────────────────────────────────────────────────────
+
+def _csv_rows(csv_path: Path) -> Iterator[list[str]]:
+    """CSV 文本行（首行为表头）；跳过空行，数据行按表头宽度补齐 / 截断"""
+    with open(csv_path, encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        yield header
+        width = len(header)
+        for row in reader:
+            if not row:
+                continue
+            yield (row + [""] * (width - len(row)))[:width]
+
+
+def _time_span(block: list[list[str]], time_col: Optional[int]) -> tuple[Optional[float], Optional[float]]:
+    if time_col is None:
+        return None, None
+    times = [v for v in (parse_value(r[time_col]) for r in block) if isinstance(v, (int, float))]
+    return (min(times), max(times)) if times else (None, None)
+
+
+def write_archive(csv_path: Path, out_path: Path) -> dict[str, Any]:
+    """把 CSV 编码为归档文件（同步），返回尾部信息"""
+    rows = _csv_rows(csv_path)
+    header = next(rows, [])
+    width = len(header)
+    time_col = header.index("time") if "time" in header else None
+    footer: dict[str, Any] = {
+        "version": _VERSION,
+        "codec": ARCHIVE_CODEC,
+        "header": header,
+        "rows": 0,
+        "source_size": Path(csv_path).stat().st_size,
+        "blocks": [],
+    }
+    with open(out_path, "wb") as f:
+        f.write(_MAGIC)
+
+        def flush(block: list[list[str]]) -> None:
+            data = _encode_block(block, width, time_col)
+            footer["blocks"].append([*_time_span(block, time_col), f.tell(), len(data), len(block)])
+            footer["rows"] += len(block)
+            f.write(data)
+
+        block: list[list[str]] = []
+        for row in rows:
+            block.append(row)
+            if len(block) >= ARCHIVE_BLOCK_ROWS:
+                flush(block)
+                block = []
+        if block:
+            flush(block)
+        raw = json.dumps(footer).encode("utf-8")
+        f.write(raw)
+        f.write(struct.pack("<I", len(raw)))
+        f.write(_MAGIC)
+    return footer
+
+
+# ── 读取 ──────────────────────────────────────────────────────
+
+def read_footer(path: Path) -> dict[str, Any]:
+    with open(path, "rb") as f:
+        f.seek(-8, os.SEEK_END)
+        length, magic = struct.unpack("<I4s", f.read(8))
+        if magic != _MAGIC:
+            raise ValueError(f"不是有效的归档文件: {path}")
+        f.seek(-8 - length, os.SEEK_END)
+        footer = json.loads(f.read(length).decode("utf-8"))
+    if footer.get("version") != _VERSION:
+        raise ValueError(f"不支持的归档版本: {footer.get('version')}")
+    return footer
+
+
+def iter_blocks(
+    path: Path,
+    start_ts: Optional[float] = None,
+    end_ts: Optional[float] = None,
+    as_text: bool = False,
+) -> Iterator[list[list[Any]]]:
+    """
+    逐块解码，每块为若干行、每行是按表头顺序解析后的值列表（与 CSV 按 parse_value 解析一致，
+    as_text=True 时为原单元格文本）；给出时间窗口时跳过时间范围与窗口不相交的块（块内仍需调用方逐行过滤）
+    """
+    footer = read_footer(path)
+    header = footer["header"]
+    time_col = header.index("time") if "time" in header else None
+    with open(path, "rb") as f:
+        for t_first, t_last, offset, length, _rows in footer["blocks"]:
+            if t_first is not None and ((start_ts is not None and t_last < start_ts)
+                                        or (end_ts is not None and t_first > end_ts)):
+                continue
+            f.seek(offset)
+            yield _decode_block(footer["codec"], f.read(length), len(header), time_col, as_text)
+
+
+def iter_text_rows(path: Path) -> Iterator[list[str]]:
+    """还原 CSV 文本行（首行为表头）"""
+    yield list(read_footer(path)["header"])
+    for block in iter_blocks(path, as_text=True):
+        yield from block
+
+
+def read_records(
+    path: Path,
+    start_ts: Optional[float] = None,
+    end_ts: Optional[float] = None,
+) -> list[dict[str, Any]]:
+    """
+    解码为 list[dict]，格式同按 CSV 读取；
+    给出时间窗口时只返回 time 在 [start_ts, end_ts] 内的行
+    """
+    header = read_footer(path)["header"]
+    ranged = start_ts is not None or end_ts is not None
+    records = []
+    for block in iter_blocks(path, start_ts, end_ts):
+        for row in block:
+            rec = dict(zip(header, row))
+            if ranged:
+                t = rec.get("time")
+                if not isinstance(t, (int, float)) or (start_ts is not None and t < start_ts) \
+                        or (end_ts is not None and t > end_ts):
+                    continue
+            records.append(rec)
+    return records
+
+
+# ── 归档 ──────────────────────────────────────────────────────
+
+def archive_csv(csv_path: Path) -> Optional[Path]:
+    """
+    归档单个 CSV（同步）：写临时文件 → 逐行校验 → 替换为 .tsc → 删除 CSV 与时间索引。
+    校验失败、写入出错或归档后并不更小时保留 CSV，返回 None（CSV 本身不存在时抛 OSError）
+    """
+    csv_path = Path(csv_path)
+    out = archive_path(csv_path)
+    tmp = out.with_suffix(ARCHIVE_SUFFIX + ".tmp")
+    st = csv_path.stat()
+    try:
+        write_archive(csv_path, tmp)
+        expected = _csv_rows(csv_path)
+        for got in iter_text_rows(tmp):
+            if got != next(expected, None):
+                raise ValueError("归档校验不一致")
+        if next(expected, None) is not None:
+            raise ValueError("归档校验行数不一致")
+        if tmp.stat().st_size >= st.st_size:
+            # 很小的 CSV 加上尾部信息反而更大，保留原文件
+            _kept[str(csv_path)] = (st.st_mtime_ns, st.st_size)
+            tmp.unlink(missing_ok=True)
+            return None
+        os.replace(tmp, out)
+    except (OSError, ValueError) as e:
+        logger.error(f"[archive] 归档 {csv_path} 失败，保留 CSV: {e}")
+        _kept[str(csv_path)] = (st.st_mtime_ns, st.st_size)
+        tmp.unlink(missing_ok=True)
+        return None
+    csv_path.unlink(missing_ok=True)
+    csv_path.with_suffix(".idx").unlink(missing_ok=True)
+    return out
+
+
+def pending_csv(save_dir: str, quiet_seconds: float = ARCHIVE_QUIET_SECONDS) -> list[Path]:
+    """
+    任务目录下待归档的 CSV：最近 quiet_seconds 秒内仍有写入的，
+    以及上次被保留（归档失败 / 不划算）且之后没有变化的不算
+    """
+    root = Path(save_dir)
+    if not root.is_dir():
+        return []
+    now = time.time()
+    files = []
+    for f in sorted(root.glob("*.csv")):
+        try:
+            st = f.stat()
+        except OSError:
+            continue
+        if now - st.st_mtime >= quiet_seconds and _kept.get(str(f)) != (st.st_mtime_ns, st.st_size):
+            files.append(f)
+    return files
+
+
+def archive_task(save_dir: str, quiet_seconds: float = ARCHIVE_QUIET_SECONDS) -> int:
+    """归档任务目录下待归档的 CSV（同步），返回节省的字节数"""
+    saved = 0
+    for f in pending_csv(save_dir, quiet_seconds):
+        idx = f.with_suffix(".idx")
+        try:
+            size = f.stat().st_size
+            before = size + (idx.stat().st_size if idx.exists() else 0)
+            with DATA_REWRITE_LOCK:
+                if not f.exists():
+                    continue
+                out = archive_csv(f)
+        except OSError:
+            continue
+        if out is not None:
+            after = out.stat().st_size
+            saved += before - after
+            logger.info(f"[archive] {f} → {out.name}: {size} → {after} 字节")
+    return saved
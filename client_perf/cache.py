@@ -0,0 +1,140 @@
+# coding: utf-8
+"""
+API 进程内缓存 — 按字节数限制容量的 LRU。
+
+对比结果（/compare_tasks/、/advanced_compare_tasks/、/compare_labels/、对比导出）计算一次后缓存，
+键由作业类型、任务 ID、基准 ID、标签区间以及各任务数据文件指纹（CSV / 归档的 mtime + 大小）组成：
+* 任务数据有任何变化，指纹随之变化，旧条目不再命中，随 LRU 自然淘汰
+* 包含运行中任务的对比不缓存（数据每秒都在追加，缓存没有意义）
+* 任务改名 / 改版本、标签改名 / 改区间同样进入键，不会返回过期的名称
+
+缓存的对象是共享引用，调用方不得原地修改（需要修改时先复制）。
+"""
+import asyncio
+import json
+import os
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from client_perf.archive import ARCHIVE_SUFFIX
+from client_perf.log import log as logger
+
+# 对比结果缓存容量（字节，按 JSON 序列化长度估算）
+COMPARISON_CACHE_BYTES = 256 * 1024 * 1024
+
+
+def json_size(value: Any) -> int:
+    """以 JSON 序列化长度估算对象大小"""
+    return len(json.dumps(value, ensure_ascii=False, default=str))
+
+
+def data_fingerprint(file_dir: Optional[str]) -> tuple:
+    """任务目录下各 CSV / 归档的 (文件名, mtime_ns, 大小)，任一文件变化即指纹变化"""
+    if not file_dir:
+        return ()
+    try:
+        entries = [e for e in os.scandir(file_dir) if e.is_file() and e.name.endswith((".csv", ARCHIVE_SUFFIX))]
+    except OSError:
+        return ()
+    items = []
+    for e in entries:
+        try:
+            st = e.stat()
+        except OSError:
+            continue    # 归档 / 降采样替换文件的间隙
+        items.append((e.name, st.st_mtime_ns, st.st_size))
+    return tuple(sorted(items))
+
+
+class LruCache:
+    """
+    按字节数限制容量的 LRU；超过容量 1/4 的单个条目不缓存。
+    is_pinned(key) 为 True 的条目不参与淘汰（全部条目都被 pin 时允许暂时超出容量）
+    """
+
+    def __init__(self, max_bytes: int, is_pinned: Optional[Callable[[Hashable], bool]] = None) -> None:
+        self.max_bytes = max_bytes
+        self.is_pinned = is_pinned or (lambda key: False)
+        self._items: OrderedDict[Hashable, tuple[Any, int]] = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Any:
+        item = self._items.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return item[0]
+
+    def put(self, key: Hashable, value: Any, size: int) -> None:
+        if size > self.max_bytes // 4:
+            return
+        self.pop(key)
+        self._items[key] = (value, size)
+        self.size += size
+        while self.size > self.max_bytes:
+            victim = next((k for k in self._items if k != key and not self.is_pinned(k)), None)
+            if victim is None:
+                break
+            self.pop(victim)
+
+    def pop(self, key: Hashable) -> None:
+        item = self._items.pop(key, None)
+        if item is not None:
+            self.size -= item[1]
+
+    def keys(self) -> list[Hashable]:
+        return list(self._items)
+
+    def size_of(self, key: Hashable) -> int:
+        item = self._items.get(key)
+        return item[1] if item else 0
+
+    def clear(self) -> None:
+        self._items.clear()
+        self.size = 0
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "entries": len(self._items),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+comparison_cache = LruCache(COMPARISON_CACHE_BYTES)
+
+
+def _task_keys(task_infos: list[dict[str, Any]]) -> tuple:
+    return tuple((info["id"], info.get("name"), info.get("version"), data_fingerprint(info.get("file_dir")))
+                 for info in task_infos)
+
+
+async def cached_comparison(
+    kind: str,
+    task_infos: list[dict[str, Any]],
+    extra: Hashable,
+    compute: Callable[[], Awaitable[Any]],
+) -> Any:
+    """
+    按 (kind, 各任务 ID / 名称 / 版本 / 数据指纹, extra) 缓存 compute() 的结果；
+    extra 放基准 ID、标签区间等其他影响结果的参数
+    """
+    if any(info.get("status") == 1 for info in task_infos):
+        return await compute()
+    # 指纹需要遍历目录并 stat 每个文件，放到线程中，不阻塞事件循环
+    key = (kind, await asyncio.to_thread(_task_keys, task_infos), extra)
+    result = comparison_cache.get(key)
+    if result is not None:
+        return result
+    result = await compute()
+    try:
+        comparison_cache.put(key, result, json_size(result))
+    except (TypeError, ValueError) as e:
+        logger.warning(f"[cache] {kind} 结果无法缓存: {e}")
+    return result
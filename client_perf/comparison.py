@@ -7,13 +7,21 @@ TaskComparison — 多任务性能指标对比。
   2. 按指标提取均值（avg）、最大值（max）、最小值（min）
   3. 以 base_task 为基准，计算其他任务各指标的变化率
   4. 返回结构化对比结果，供前端图表和表格使用
+
+trend() 只读 metric_catalog 表（每任务每指标一行聚合），按版本 / 设备 / 包名分组跨任务查看趋势。
 """
 from __future__ import annotations
 
+import asyncio
+import math
 from typing import Any
 
-from client_perf.db import TaskCollection
-from client_perf.util import DataCollect
+from client_perf.cache import cached_comparison
+from client_perf.core.host_contention import contention_summary
+from client_perf.core.launch import launch_summary
+from client_perf.core.thread_cpu import thread_averages
+from client_perf.db import LabelCollection, MetricCatalogCollection, TaskCollection
+from client_perf.util import CATALOG_METRICS, DataCollect
 
 # ── 指标映射：metric_key -> (csv_stem, csv_column_prefix) ──────
 # csv_column_prefix 是 CSV 表头中数值列的前缀（不含单位括号部分）
@@ -28,6 +36,9 @@ _METRIC_MAP: dict[str, tuple[str, str]] = {
     "disk_write": ("disk_io",      "disk_write_rate"),
     "net_sent":   ("network_io",   "net_sent_rate"),
     "net_recv":   ("network_io",   "net_recv_rate"),
+    # 启动耗时测量任务（task_type=launch）每轮一行
+    "launch_total":     ("launch", "total"),
+    "launch_displayed": ("launch", "displayed"),
 }
 
 
@@ -46,6 +57,111 @@ def _extract_values(data: list[dict], stem: str, col_prefix: str) -> list[float]
     return []
 
 
+def _thread_changes(
+    task_ids: list[int],
+    thread_avgs: list[dict[str, float]],
+    base_idx: int,
+    top: int = 20,
+) -> list[dict[str, Any]]:
+    """
+    线程级 CPU 变化：按线程名对齐各任务的平均 CPU，
+    以相对基准任务的最大绝对变化量排序，取前 top 个。
+    """
+    base = thread_avgs[base_idx]
+    names = set().union(*thread_avgs) if thread_avgs else set()
+    rows = []
+    for name in names:
+        avg = {tid: a.get(name, 0.0) for tid, a in zip(task_ids, thread_avgs)}
+        diff = {tid: round(v - base.get(name, 0.0), 4) for tid, v in avg.items()}
+        rows.append({"name": name, "avg": avg, "diff": diff,
+                     "max_abs_diff": max(abs(d) for d in diff.values())})
+    rows.sort(key=lambda r: (-r["max_abs_diff"], r["name"]))
+    return rows[:top]
+
+
+def _stem_rows(data: list[dict], stem: str) -> list[dict]:
+    for item in data:
+        if item.get("name") == stem:
+            return item.get("value", [])
+    return []
+
+
+# 趋势分组字段；越大越好的指标（其余越小越好）
+TREND_GROUPS = ("version", "device_id", "package_name", "device_type")
+_HIGHER_BETTER = {"fps"}
+
+
+def _pool_group(rows: list[dict]) -> dict[str, Any]:
+    """
+    合并同组多个任务的目录行：样本数加权均值、合并方差（组内 + 组间）；
+    p95 无法由聚合精确合并，取样本数加权平均作近似。
+    另给出任务级统计（tasks / task_means）：逐秒样本强自相关，显著性检验以任务均值为观测值
+    """
+    rows = [r for r in rows if r.get("count")]
+    n = sum(r["count"] for r in rows)
+    if not n:
+        return {"count": 0, "tasks": 0, "mean": None, "stdev": None, "p95": None, "min": None, "max": None,
+                "task_means": []}
+    mean = sum(r["count"] * r["mean"] for r in rows) / n
+    ss = sum((r["count"] - 1) * (r["stdev"] or 0) ** 2 + r["count"] * (r["mean"] - mean) ** 2 for r in rows)
+    return {
+        "count": n,
+        "tasks": len(rows),
+        "mean": round(mean, 4),
+        "stdev": round(math.sqrt(ss / (n - 1)), 4) if n > 1 else 0.0,
+        "p95": round(sum(r["count"] * (r["p95"] or 0) for r in rows) / n, 4),
+        "min": min(r["min"] for r in rows),
+        "max": max(r["max"] for r in rows),
+        "task_means": [r["mean"] for r in rows],
+    }
+
+
+def _betainc(a: float, b: float, x: float) -> float:
+    """正则化不完全 Beta 函数 I_x(a, b)（连分式展开）"""
+    if x <= 0:
+        return 0.0
+    if x >= 1:
+        return 1.0
+    if x > (a + 1) / (a + b + 2):
+        return 1.0 - _betainc(b, a, 1.0 - x)
+    front = math.exp(math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b)
+                     + a * math.log(x) + b * math.log(1.0 - x)) / a
+    tiny = 1e-300
+    c, d = 1.0, 1.0 - (a + b) * x / (a + 1)
+    d = 1.0 / (d if abs(d) > tiny else tiny)
+    f = d
+    for m in range(1, 200):
+        for num in (m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+                    -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1))):
+            d = 1.0 + num * d
+            d = 1.0 / (d if abs(d) > tiny else tiny)
+            c = 1.0 + num / c
+            c = c if abs(c) > tiny else tiny
+            f *= c * d
+        if abs(c * d - 1.0) < 1e-12:
+            break
+    return front * f
+
+
+def _welch_p(a: list[float], b: list[float]) -> float | None:
+    """
+    以任务均值为观测值的 Welch t 检验（双侧，t 分布、Welch–Satterthwaite 自由度）；
+    任一组少于 2 个任务时无法估计组内方差，返回 None
+    """
+    na, nb = len(a), len(b)
+    if na < 2 or nb < 2:
+        return None
+    ma, mb = sum(a) / na, sum(b) / nb
+    va = sum((x - ma) ** 2 for x in a) / (na - 1) / na
+    vb = sum((x - mb) ** 2 for x in b) / (nb - 1) / nb
+    diff = mb - ma
+    if va + vb == 0:
+        return 0.0 if diff else 1.0
+    t = diff / math.sqrt(va + vb)
+    df = (va + vb) ** 2 / (va ** 2 / (na - 1) + vb ** 2 / (nb - 1))
+    return _betainc(df / 2, 0.5, df / (df + t * t))
+
+
 def _calc_avg(vals: list[float]) -> float | None:
     return round(sum(vals) / len(vals), 4) if vals else None
 
@@ -69,6 +185,47 @@ def _build_task_avg(data: list[dict]) -> dict[str, float | None]:
     return result
 
 
+def diff_to_base(tasks: list[dict[str, Any]], base_avg: dict[str, float | None]) -> None:
+    """为每个任务补上相对基准均值的绝对差（diff）与百分比变化（pct）"""
+    for t in tasks:
+        diff, pct = {}, {}
+        for k, v in t["avg"].items():
+            bv = base_avg.get(k)
+            if v is not None and bv is not None:
+                d = round(v - bv, 4)
+                diff[k] = d
+                pct[k] = round(d / bv * 100, 2) if bv != 0 else None
+            else:
+                diff[k] = pct[k] = None
+        t["diff"] = diff
+        t["pct"] = pct
+
+
+def _label_series(sliced_data: list[dict]) -> dict[str, list]:
+    """标签区间内各指标的逐点数值（按 cpu 的时间戳对齐，缺失为 None），启动耗时不是时间序列，不提取"""
+    data: dict[str, list] = {"timestamps": []}
+    for item in sliced_data:
+        if item.get("name") == "cpu":
+            data["timestamps"] = [v.get("time", 0) for v in item.get("value", [])]
+            break
+    for metric, (stem, col_prefix) in _METRIC_MAP.items():
+        if stem == "launch":
+            continue
+        data[metric] = []
+        for item in sliced_data:
+            if item.get("name") != stem:
+                continue
+            for v in item.get("value", []):
+                for k, val in v.items():
+                    if k.startswith(col_prefix) and isinstance(val, (int, float)):
+                        data[metric].append(float(val))
+                        break
+                else:
+                    data[metric].append(None)
+            break
+    return data
+
+
 class TaskComparison:
 
     @classmethod
@@ -97,19 +254,72 @@ class TaskComparison:
             raise ValueError("task_ids 不能为空")
 
         base_id = base_task_id if base_task_id in task_ids else task_ids[0]
+        infos = list(await asyncio.gather(*[TaskCollection.get_item_task(tid) for tid in task_ids]))
+        return await cached_comparison(
+            "compare_tasks", infos, base_id, lambda: cls._compute_comparison(infos, base_id),
+        )
 
+    @classmethod
+    async def compare_labels(cls, label_ids: list[int]) -> dict[str, Any]:
+        """
+        基于区间标签对比（每个标签对应一个任务的一段区间，首个标签为基准），返回：
+        {"base_task": {"id", "name", "label_name"},
+         "tasks": [{"id", "name", "version", "label_id", "label_name", "label_color", "start_ts", "end_ts",
+                    "avg", "diff", "pct", "data": {"timestamps": [...], "cpu": [...], ...}}]}
+        """
+        if len(label_ids) < 2:
+            raise ValueError("至少需要两个标签")
+        labels = [await LabelCollection.get_label(lid) for lid in label_ids]
+        infos = [await TaskCollection.get_item_task(lb["task_id"]) for lb in labels]
+        label_key = tuple((lb["id"], lb["name"], lb["color"], lb["start_ts"], lb["end_ts"]) for lb in labels)
+        return await cached_comparison(
+            "compare_labels", infos, label_key, lambda: cls._compute_labels(labels, infos),
+        )
+
+    @classmethod
+    async def _compute_labels(cls, labels: list[dict], infos: list[dict]) -> dict[str, Any]:
+        # 时间索引定位，只读标签区间附近的数据
+        sliced = await asyncio.gather(*[
+            DataCollect(info["file_dir"]).get_range(label["start_ts"], label["end_ts"], is_format=False)
+            for label, info in zip(labels, infos)
+        ])
+        tasks_result = []
+        for info, sliced_data, label in zip(infos, sliced, labels):
+            tasks_result.append({
+                "id":          info["id"],
+                "name":        info.get("name", ""),
+                "version":     info.get("version", ""),
+                "label_id":    label["id"],
+                "label_name":  label["name"],
+                "label_color": label["color"],
+                "start_ts":    label["start_ts"],
+                "end_ts":      label["end_ts"],
+                "avg":         _build_task_avg(sliced_data),
+                "data":        _label_series(sliced_data),
+            })
+        base = tasks_result[0]
+        diff_to_base(tasks_result, base["avg"])
+        return {
+            "base_task": {
+                "id":         base["id"],
+                "name":       base["name"],
+                "label_name": base["label_name"],
+            },
+            "tasks": tasks_result,
+        }
+
+    @classmethod
+    async def _compute_comparison(cls, infos: list[dict], base_id: int) -> dict[str, Any]:
         # 并发读取所有任务数据
-        import asyncio
         task_infos: list[dict] = []
         task_data_list: list[list[dict]] = []
 
-        async def _load(tid: int):
-            info = await TaskCollection.get_item_task(tid)
+        async def _load(info: dict):
             # 使用 is_format=False 获取原始数据，不补全时间点
             data = await DataCollect(info["file_dir"]).get_all_data(is_format=False)
             return info, data
 
-        results = await asyncio.gather(*[_load(tid) for tid in task_ids])
+        results = await asyncio.gather(*[_load(info) for info in infos])
         for info, data in results:
             task_infos.append(info)
             task_data_list.append(data)
@@ -208,6 +418,15 @@ class TaskComparison:
                                         net_recv_data.append({"time": row.get("time"), "value": float(v)})
                                         break
                             raw_data[front_key] = net_recv_data
+                    elif stem == "launch":
+                        # 启动耗时：按列前缀提取每轮的值（列名带单位，如 total(ms)）
+                        launch_data = []
+                        for row in stem_data[stem]:
+                            for k, v in row.items():
+                                if k.startswith(col_prefix) and isinstance(v, (int, float)):
+                                    launch_data.append({"time": row.get("time"), "value": float(v)})
+                                    break
+                        raw_data[front_key] = launch_data
                     else:
                         # 对于 cpu、memory、fps、gpu 等单个指标的情况
                         # 直接使用原始数据，但需要确保每个数据点包含 time 和 value 字段
@@ -236,8 +455,14 @@ class TaskComparison:
                 "diff": diff,
                 "pct":  pct,
                 "data": raw_data,  # 添加原始时间序列数据
+                # 宿主机争用汇总（任务开启 host_contention 时才有），contaminated 为 True 表示结果可能不可信
+                "contention": contention_summary(stem_data.get("host_contention", [])),
+                # 启动耗时分布（启动测量任务才有）
+                "launch": launch_summary(stem_data.get("launch", [])),
             })
 
+        thread_avgs = [thread_averages(_stem_rows(d, "thread_cpu")) for d in task_data_list]
+
         return {
             "base_task": {
                 "id":   base_info["id"],
@@ -245,4 +470,204 @@ class TaskComparison:
                 "version": base_info.get("version", ""),
             },
             "tasks": tasks_result,
+            "contaminated_task_ids": [t["id"] for t in tasks_result
+                                      if t["contention"] and t["contention"]["contaminated"]],
+            # 线程级 CPU 变化最大的线程（任务开启 thread_cpu 时才有数据）
+            "threads": _thread_changes([info["id"] for info in task_infos], thread_avgs, base_idx)
+                       if any(thread_avgs) else [],
         }
+
+    @classmethod
+    async def compare_threads(
+        cls,
+        task_ids: list[int],
+        base_task_id: int | None = None,
+        top: int = 20,
+    ) -> dict[str, Any]:
+        """
+        只对比线程级 CPU：
+        {"base_task_id": 1, "threads": [{"name": "RenderThread", "avg": {id: x}, "diff": {id: d}, "max_abs_diff": m}]}
+        """
+        if not task_ids:
+            raise ValueError("task_ids 不能为空")
+        base_id = base_task_id if base_task_id in task_ids else task_ids[0]
+
+        async def _load(tid: int) -> dict[str, float]:
+            info = await TaskCollection.get_item_task(tid)
+            path = DataCollect.data_file(info["file_dir"], "thread_cpu")
+            if path is None:
+                return {}
+            rows = await DataCollect._csv_to_records(path)
+            return thread_averages(rows)
+
+        thread_avgs = list(await asyncio.gather(*[_load(tid) for tid in task_ids]))
+        return {
+            "base_task_id": base_id,
+            "threads": _thread_changes(task_ids, thread_avgs, task_ids.index(base_id), top),
+        }
+
+    @classmethod
+    async def advanced_compare(cls, task_ids: list[int], base_task_id: int | None = None) -> dict[str, Any]:
+        """两个任务的统计显著性 + 异常值检测 + 瓶颈分析；task_ids 中除基准外取第一个作为对比任务"""
+        base_id = base_task_id or task_ids[0]
+        cmp_id  = task_ids[1] if task_ids[0] == base_id else task_ids[0]
+
+        base_info = await TaskCollection.get_item_task(base_id)
+        cmp_info  = await TaskCollection.get_item_task(cmp_id)
+        return await cached_comparison(
+            "advanced_compare", [base_info, cmp_info], None,
+            lambda: cls._compute_advanced(base_info, cmp_info),
+        )
+
+    @classmethod
+    async def _compute_advanced(cls, base_info: dict, cmp_info: dict) -> dict[str, Any]:
+        base_id, cmp_id = base_info["id"], cmp_info["id"]
+        base_data = await DataCollect(base_info["file_dir"]).get_all_data()
+        cmp_data  = await DataCollect(cmp_info["file_dir"]).get_all_data()
+
+        better_smaller = {"cpu", "memory", "disk_read", "disk_write", "net_sent", "net_recv",
+                          "launch_total", "launch_displayed"}
+
+        def stats(arr):
+            n = len(arr)
+            if n == 0:
+                return 0.0, 0.0, 0.0
+            mean = sum(arr) / n
+            var  = sum((x - mean) ** 2 for x in arr) / max(n - 1, 1)
+            return mean, var, n
+
+        significance = {}
+        outliers_result = {}
+        bottlenecks = []
+
+        for metric, (stem, col_prefix) in _METRIC_MAP.items():
+            bv = _extract_values(base_data, stem, col_prefix)
+            cv = _extract_values(cmp_data,  stem, col_prefix)
+            if not bv or not cv:
+                continue
+
+            bm, bvar, bn = stats(bv)
+            cm, cvar, cn = stats(cv)
+            diff = cm - bm
+            pct  = (diff / bm * 100) if bm != 0 else 0
+
+            se = ((bvar / bn) + (cvar / cn)) ** 0.5 if (bvar / bn + cvar / cn) > 0 else 1e-9
+            t  = abs(diff / se) if se > 0 else 0
+            p  = 2 * (1 - min(0.9999, 0.5 * (1 + math.erf(t / math.sqrt(2)))))
+            significant = p < 0.05
+
+            significance[metric] = {
+                "base_mean": round(bm, 4),
+                "compare_mean": round(cm, 4),
+                "diff": round(diff, 4),
+                "percent_change": round(pct, 2),
+                "p_value": round(p, 4),
+                "confidence": round((1 - p) * 100, 2),
+                "is_significant": significant,
+            }
+
+            # 异常值（Z-score > 2.5）
+            combined = bv + cv
+            mc = sum(combined) / len(combined)
+            sc = (sum((x - mc) ** 2 for x in combined) / max(len(combined) - 1, 1)) ** 0.5
+            outlier_list = [
+                {"value": round(v, 4), "z_score": round(abs((v - mc) / sc) if sc else 0, 2), "is_high": v > mc}
+                for v in cv if sc and abs((v - mc) / sc) > 2.5
+            ]
+            if outlier_list:
+                outliers_result[metric] = {
+                    "outliers": outlier_list[:20],
+                    "summary": f"检测到 {len(outlier_list)} 个异常值",
+                }
+
+            # 瓶颈
+            if significant and abs(pct) > 20:
+                is_worse = (pct > 0) if metric in better_smaller else (pct < 0)
+                bottlenecks.append({
+                    "metric": metric,
+                    "percent_change": round(pct, 2),
+                    "is_worse": is_worse,
+                })
+
+        bottlenecks.sort(key=lambda x: abs(x["percent_change"]), reverse=True)
+
+        return {
+            "base_task":    {"id": base_id, "name": base_info.get("name", "")},
+            "compare_task": {"id": cmp_id,  "name": cmp_info.get("name", "")},
+            "advanced_analysis": {
+                "statistical_significance": significance,
+                "outliers": outliers_result,
+                "bottleneck_analysis": {
+                    "potential_bottlenecks": bottlenecks,
+                    "summary": f"共发现 {len(bottlenecks)} 个潜在性能瓶颈",
+                },
+            },
+        }
+
+    @classmethod
+    async def trend(
+        cls,
+        metric: str,
+        group_by: str = "version",
+        device_type: str | None = None,
+        device_id: str | None = None,
+        package_name: str | None = None,
+        baseline: str | None = None,
+        alpha: float = 0.05,
+        min_change: float = 5.0,
+    ) -> dict[str, Any]:
+        """
+        指标跨分组趋势（默认按版本），数据全部来自 metric_catalog：
+        {"metric": "cpu", "group_by": "version", "baseline": "1.2.0",
+         "groups": [{"key": "1.2.0", "task_ids": [..], "mean": m, "p95": p, "stdev": s, "count": n, "tasks": k,
+                     "percent_change": d, "p_value": p, "regression": bool, "improvement": bool}]}
+        基准组：参数 baseline > 含基准任务（is_baseline）的组 > 最早的组。
+        p_value 以每个任务的均值为一个观测值（n = 组内任务数），任一组少于 2 个任务时为 None、不做标记；
+        变化率超过 min_change(%) 且 p < alpha 时按指标方向标记 regression / improvement。
+        """
+        if metric not in CATALOG_METRICS:
+            raise ValueError(f"不支持的指标: {metric}")
+        if group_by not in TREND_GROUPS:
+            raise ValueError(f"group_by 仅支持 {', '.join(TREND_GROUPS)}")
+        rows = await MetricCatalogCollection.query(
+            metric, device_type=device_type, device_id=device_id, package_name=package_name,
+        )
+        # 行已按任务开始时间升序，分组顺序即首次出现的时间顺序
+        grouped: dict[str, list[dict]] = {}
+        for row in rows:
+            grouped.setdefault(row.get(group_by) or "", []).append(row)
+        if not grouped:
+            return {"metric": metric, "group_by": group_by, "baseline": None, "groups": []}
+
+        if baseline not in grouped:
+            baseline = next((key for key, items in grouped.items() if any(r["is_baseline"] for r in items)),
+                            next(iter(grouped)))
+        pooled = {key: _pool_group(items) for key, items in grouped.items()}
+        base = pooled[baseline]
+        higher_better = metric in _HIGHER_BETTER
+
+        groups = []
+        for key, items in grouped.items():
+            stats = {k: v for k, v in pooled[key].items() if k != "task_means"}
+            entry = {
+                "key": key,
+                "task_ids": [r["task_id"] for r in items],
+                "first_start_time": items[0]["start_time"],
+                **stats,
+                "percent_change": None,
+                "p_value": None,
+                "regression": False,
+                "improvement": False,
+            }
+            if key != baseline and stats["count"] and base["count"]:
+                if base["mean"]:
+                    entry["percent_change"] = round((stats["mean"] - base["mean"]) / base["mean"] * 100, 2)
+                p = _welch_p(base["task_means"], pooled[key]["task_means"])
+                entry["p_value"] = round(p, 4) if p is not None else None
+                pct = entry["percent_change"]
+                if p is not None and p < alpha and pct is not None and abs(pct) >= min_change:
+                    worse = pct < 0 if higher_better else pct > 0
+                    entry["regression"] = worse
+                    entry["improvement"] = not worse
+            groups.append(entry)
+        return {"metric": metric, "group_by": group_by, "baseline": baseline, "groups": groups}
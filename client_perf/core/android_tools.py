@@ -10,7 +10,19 @@ import re
 import time
 from typing import Optional, Dict, List
 from client_perf.log import log as logger
+from client_perf.core.cpu_freq import CPU_FREQ_KEYS, CpuFreqSampler, device_cpu_freq
 from client_perf.core.monitor import Monitor
+from client_perf.core.thread_cpu import THREAD_CPU_KEYS, ThreadCpuSampler, device_thread_cpu, thread_options
+from client_perf.core.proc_memory import (
+    MEMORY_DETAIL_KEYS, fast_memory_command, memory_detail_interval, parse_dumpsys_meminfo, parse_fast_memory,
+)
+from client_perf.core.package_sampler import PackageSampler, package_monitors
+from client_perf.core.package_cache import (
+    PackageCache, PS_COMMAND, join_packages, parse_ps, split_ps, with_ps,
+)
+from client_perf.core.launch import AndroidLaunchDriver, launch_options, run_launch
+from client_perf.core.lifecycle import ProcessTarget, device_watcher, run_monitors
+from client_perf.core.screenshot import save_screenshot, screenshot_busy
 import adbutils
 ADB_AVAILABLE = True
 
@@ -135,31 +147,38 @@ async def android_pids(serial: str) -> List[Dict]:
     return await asyncio.wait_for(asyncio.to_thread(real_func), timeout=15)
 
 
-async def android_packages(serial: str) -> List[Dict]:
-    """获取 Android 设备上已安装的应用包名列表（更实用的选择方式）"""
+_package_cache = PackageCache()
+
+
+def _parse_pm_packages(output: str) -> List[str]:
+    packages = []
+    for line in output.strip().split('\n'):
+        line = line.strip()
+        if line.startswith("package:"):
+            pkg = line.replace("package:", "").strip()
+            if pkg:
+                packages.append(pkg)
+    return packages
+
+
+async def android_packages(serial: str, refresh: bool = False) -> List[Dict]:
+    """
+    获取 Android 设备上已安装的应用包名列表（更实用的选择方式）
+    运行状态由一次 ps 快照 join 得到；包列表按设备缓存，refresh=True 强制重新获取
+    """
     def real_func():
         d = _get_device(serial)
-        # 获取第三方应用
-        output = d.shell("pm list packages -3")
-        packages = []
-        for line in output.strip().split('\n'):
-            line = line.strip()
-            if line.startswith("package:"):
-                pkg = line.replace("package:", "").strip()
-                if pkg:
-                    # 获取该包的 PID
-                    pid_output = d.shell(f"pidof {pkg}").strip()
-                    pid = int(pid_output.split()[0]) if pid_output and pid_output.split()[0].isdigit() else 0
-                    packages.append({
-                        "package_name": pkg,
-                        "pid": pid,
-                        "name": pkg,
-                        "running": pid > 0,
-                        # 兼容 iOS 字段
-                        "bundle_id": pkg,
-                    })
-        packages.sort(key=lambda x: (-int(x['running']), x['name']))
-        return packages
+        if not refresh:
+            running = parse_ps(d.shell(PS_COMMAND))
+            packages = _package_cache.get(serial, running)
+            if packages is not None:
+                return join_packages(packages, running)
+        # 获取第三方应用，与 ps 快照合并为一次 adb 往返
+        pm_output, ps_output = split_ps(d.shell(with_ps("pm list packages -3")))
+        running = parse_ps(ps_output)
+        packages = _parse_pm_packages(pm_output)
+        _package_cache.put(serial, packages, running)
+        return join_packages(packages, running)
 
     return await asyncio.wait_for(asyncio.to_thread(real_func), timeout=15)
 
@@ -277,54 +296,55 @@ async def android_cpu(serial: str, pid: int = 0, package_name: str = "", **kwarg
 
 async def android_memory(serial: str, pid: int = 0, package_name: str = "", **kwargs) -> Dict:
     """
-    采集 Android 进程内存使用
-    优先使用 dumpsys meminfo 获取 PSS 内存，失败则用 /proc/<pid>/status
+    采集 Android 进程内存使用（快层，每轮一次 shell）
+    /proc/<pid>/smaps_rollup 给出 PSS/Swap，不可读时 PSS 改由 dumpsys meminfo 取得；
+    process_memory_usage 始终是 PSS，RSS 单独写 rss 列；
+    完整的 dumpsys meminfo 分类见 android_memory_detail（慢层）
     """
     def real_func():
         d = _get_device(serial)
-        target = package_name if package_name else str(pid)
-        if not target or target == "0":
+        target_pid = pid
+        if not target_pid and package_name:
+            pid_output = d.shell(f"pidof {package_name}").strip()
+            if pid_output:
+                parts = pid_output.split()
+                target_pid = int(parts[0]) if parts[0].isdigit() else 0
+        if not target_pid:
             return {"process_memory_usage": 0, "time": int(time.time())}
 
-        memory_mb = 0.0
+        mem = parse_fast_memory(d.shell(fast_memory_command(target_pid)))
+        pss = mem.get("pss")
+        if pss is None:
+            # smaps_rollup 不可读（非 debuggable 应用 / 非 root）：PSS 改由 dumpsys meminfo 取得，不混入 RSS
+            pss = parse_dumpsys_meminfo(d.shell(f"dumpsys meminfo {target_pid} 2>/dev/null"))["total_pss"]
+        res = {
+            "process_memory_usage": pss,
+            "pss": mem.get("pss"),
+            "rss": mem.get("rss"),
+            "swap": mem.get("swap"),
+            "time": int(time.time()),
+        }
+        print_json(res)
+        return res
 
-        # 方法1: dumpsys meminfo（最准确，获取 PSS）
-        try:
-            output = d.shell(f"dumpsys meminfo {target} 2>/dev/null")
-            if output.strip():
-                # 尝试多种格式
-                # 格式1: "TOTAL PSS:    xxxxx"
-                match = re.search(r'TOTAL\s+PSS:\s+(\d+)', output)
-                if match:
-                    memory_mb = int(match.group(1)) / 1024.0
-                else:
-                    # 格式2: "TOTAL    xxxxx    xxxxx    xxxxx"
-                    match = re.search(r'TOTAL\s+(\d+)', output)
-                    if match:
-                        memory_mb = int(match.group(1)) / 1024.0
-                    else:
-                        # 格式3: "    TOTAL:   xxxxx kB"
-                        match = re.search(r'TOTAL:\s+(\d+)\s+kB', output, re.IGNORECASE)
-                        if match:
-                            memory_mb = int(match.group(1)) / 1024.0
-        except Exception as e:
-            logger.warning(f"dumpsys meminfo 失败: {e}")
+    return await asyncio.wait_for(asyncio.to_thread(real_func), timeout=20)
 
-        # 方法2: /proc/<pid>/status（备用）
-        if memory_mb == 0 and pid:
-            try:
-                status_output = d.shell(f"cat /proc/{pid}/status 2>/dev/null")
-                match = re.search(r'VmRSS:\s+(\d+)\s+kB', status_output)
-                if match:
-                    memory_mb = int(match.group(1)) / 1024.0
-            except Exception as e:
-                logger.warning(f"/proc/pid/status 读取失败: {e}")
 
-        res = {"process_memory_usage": round(memory_mb, 2), "time": int(time.time())}
+async def android_memory_detail(serial: str, pid: int = 0, package_name: str = "", **kwargs) -> Dict:
+    """采集 Android 内存分类明细（慢层）：dumpsys meminfo 的 App Summary"""
+    def real_func():
+        d = _get_device(serial)
+        target = package_name if package_name else str(pid)
+        if not target or target == "0":
+            return None
+        res = parse_dumpsys_meminfo(d.shell(f"dumpsys meminfo {target} 2>/dev/null"))
+        if res["total_pss"] is None:
+            return None
+        res["time"] = int(time.time())
         print_json(res)
         return res
 
-    return await asyncio.wait_for(asyncio.to_thread(real_func), timeout=20)
+    return await asyncio.wait_for(asyncio.to_thread(real_func), timeout=30)
 
 
 # ─────────────────────────── FPS 采集 ───────────────────────────
@@ -708,21 +728,21 @@ async def android_network_io(serial: str, pid: int = 0, package_name: str = "",
 
 # ─────────────────────────── 截图 ───────────────────────────
 
-async def android_screenshot(serial: str, save_dir: str = None, pid: int = 0, **kwargs):
-    """Android 设备截图"""
+async def android_screenshot(serial: str, save_dir: str = None, pid: int = 0,
+                             options: Optional[Dict] = None, **kwargs):
+    """Android 设备截图（落盘时交给截图编码管线异步编码）"""
     def real_func():
-        d = _get_device(serial)
-        from pathlib import Path
         from io import BytesIO
 
+        # 编码管线繁忙时跳过本次抓图
+        if save_dir and screenshot_busy():
+            return None
+        d = _get_device(serial)
         # 使用 adbutils 的截图功能
         try:
             img = d.screenshot()
             if save_dir:
-                dir_instance = Path(save_dir)
-                screenshot_dir = dir_instance.joinpath("screenshot")
-                screenshot_dir.mkdir(exist_ok=True)
-                img.save(screenshot_dir.joinpath(str(int(time.time() + 0.5)) + ".png"), format="PNG")
+                save_screenshot(img, save_dir, options)
             else:
                 output_buffer = BytesIO()
                 img.save(output_buffer, format='PNG')
@@ -773,7 +793,8 @@ async def android_battery(serial: str, **kwargs) -> Dict:
 
 # ─────────────────────────── 性能采集入口 ───────────────────────────
 
-async def android_perf(serial: str, package_name: str, pid: int, save_dir: str, include_child: bool = False):
+async def android_perf(serial: str, package_name: str, pid: int, save_dir: str, include_child: bool = False,
+                       options: Optional[Dict] = None, task_id: Optional[int] = None):
     """
     Android 性能采集入口，与 PC 端 perf() 保持一致的 Monitor 结构
     """
@@ -788,40 +809,47 @@ async def android_perf(serial: str, package_name: str, pid: int, save_dir: str,
         except Exception:
             pid = 0
 
+    # 有 pid 时由生命周期跟踪统一探测，采集函数不再各自 pidof
+    target = ProcessTarget(pid)
+    watcher = None
+    if pid:
+        d = _get_device(serial)
+        watcher = device_watcher(target, save_dir, d.shell, package_name, options, task_id)
+
     monitors = {
         "cpu": Monitor(android_cpu,
-                       serial=serial, pid=pid, package_name=package_name,
+                       serial=serial, pid=pid, package_name=package_name, target=target,
                        monitor_name="cpu",
                        key_value=["time", "cpu_usage(%)", "cpu_usage_all(%)", "cpu_core_num(个)"],
                        save_dir=save_dir),
         "memory": Monitor(android_memory,
-                          serial=serial, pid=pid, package_name=package_name,
+                          serial=serial, pid=pid, package_name=package_name, target=target,
                           monitor_name="memory",
-                          key_value=["time", "process_memory_usage(M)"],
+                          key_value=["time", "process_memory_usage(M)", "pss(M)", "rss(M)", "swap(M)"],
                           save_dir=save_dir),
         "process_info": Monitor(android_process_info,
-                                serial=serial, pid=pid, package_name=package_name,
+                                serial=serial, pid=pid, package_name=package_name, target=target,
                                 monitor_name="process_info",
                                 key_value=["time", "num_threads(个)", "num_handles(个)"],
                                 save_dir=save_dir),
         "fps": Monitor(android_fps,
-                       serial=serial, pid=pid, package_name=package_name,
+                       serial=serial, pid=pid, package_name=package_name, target=target,
                        monitor_name="fps",
                        key_value=["time", "fps(帧)", "frames"],
                        save_dir=save_dir),
         "gpu": Monitor(android_gpu,
-                       serial=serial, pid=pid, package_name=package_name,
+                       serial=serial, pid=pid, package_name=package_name, target=target,
                        monitor_name="gpu",
                        key_value=["time", "gpu(%)"],
                        save_dir=save_dir),
         "disk_io": Monitor(android_disk_io,
-                           serial=serial, pid=pid, package_name=package_name,
+                           serial=serial, pid=pid, package_name=package_name, target=target,
                            monitor_name="disk_io",
                            key_value=["time", "disk_read_rate(MB/s)", "disk_write_rate(MB/s)",
                                       "disk_read(字节)", "disk_write(字节)"],
                            save_dir=save_dir),
         "network_io": Monitor(android_network_io,
-                              serial=serial, pid=pid, package_name=package_name,
+                              serial=serial, pid=pid, package_name=package_name, target=target,
                               monitor_name="network_io",
                               key_value=["time", "net_sent_rate(MB/s)", "net_recv_rate(MB/s)",
                                          "net_sent(字节)", "net_recv(字节)"],
@@ -833,8 +861,43 @@ async def android_perf(serial: str, package_name: str, pid: int, save_dir: str,
                                       "battery_current(mA)"],
                            save_dir=save_dir),
         "screenshot": Monitor(android_screenshot,
-                              serial=serial,
+                              serial=serial, options=options,
                               save_dir=save_dir, is_out=False)
     }
-    run_monitors = [monitor.run() for name, monitor in monitors.items()]
-    await asyncio.gather(*run_monitors)
+    detail_interval = memory_detail_interval(options)
+    if detail_interval:
+        monitors["memory_detail"] = Monitor(android_memory_detail,
+                                            serial=serial, pid=pid, package_name=package_name, target=target,
+                                            monitor_name="memory_detail", interval=detail_interval,
+                                            key_value=MEMORY_DETAIL_KEYS,
+                                            save_dir=save_dir)
+    thread_on, thread_top_n = thread_options(options)
+    if thread_on:
+        monitors["thread_cpu"] = Monitor(device_thread_cpu,
+                                         sampler=ThreadCpuSampler(thread_top_n),
+                                         shell=_get_device(serial).shell,
+                                         pid=pid, target=target,
+                                         monitor_name="thread_cpu",
+                                         key_value=THREAD_CPU_KEYS,
+                                         save_dir=save_dir)
+    if (options or {}).get("cpu_freq"):
+        monitors["cpu_freq"] = Monitor(device_cpu_freq,
+                                       sampler=CpuFreqSampler(save_dir),
+                                       shell=_get_device(serial).shell,
+                                       monitor_name="cpu_freq",
+                                       key_value=CPU_FREQ_KEYS,
+                                       save_dir=save_dir)
+    # include_child：按包聚合该应用的全部进程，替换单进程的 cpu / memory / process_info / disk_io
+    if include_child and package_name:
+        sampler = PackageSampler(_get_device(serial).shell, package_name)
+        monitors.update(package_monitors(sampler, Monitor, save_dir, pid=pid, target=target))
+    await run_monitors(monitors, watcher)
+
+
+async def android_launch(serial: str, package_name: str, save_dir: str,
+                         options: Optional[Dict] = None, task_id: Optional[int] = None):
+    """Android 启动耗时测量入口（task_type=launch）"""
+    opts = launch_options(options)
+    d = _get_device(serial)
+    driver = await asyncio.to_thread(AndroidLaunchDriver, d.shell, package_name, opts["activity"])
+    await run_launch(driver, save_dir, options, task_id)
@@ -0,0 +1,124 @@
+# coding: utf-8
+"""
+Linux 块设备延迟 / 队列深度 — PC 可选指标（任务选项 disk_latency）。
+
+disk_io 只有进程读写字节速率，无法区分"读写量变大"与"存储变慢"。
+开启后在 disk_io 的同一个 1 秒窗口前后各读一次 /proc/diskstats，
+只统计目标进程工作目录所在的块设备，派生（同 iostat -x 口径）：
+    disk_iops(次/s)      (Δreads + Δwrites) / 秒
+    disk_await(ms)       (Δms_reading + Δms_writing) / (Δreads + Δwrites)
+    disk_queue_depth     Δweighted_ms_io / 窗口毫秒数（aqu-sz）
+    disk_util(%)         Δms_io / 窗口毫秒数
+与 disk_read_rate / disk_write_rate 写在 disk_io.csv 的同一行。
+
+root 参数用于在伪造的 procfs/sysfs 目录树上测试；所有 /proc、/sys、/dev 路径都经由 root 读取。
+"""
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+BLOCK_IO_KEYS = ["disk_iops(次/s)", "disk_await(ms)", "disk_queue_depth", "disk_util(%)"]
+
+# /proc/diskstats 中 name 之后的字段下标
+_READS, _MS_READ, _WRITES, _MS_WRITE, _MS_IO, _WEIGHTED_MS = 0, 3, 4, 7, 9, 10
+
+
+def parse_diskstats(text: str, devices: Optional[set[str]] = None) -> Dict[str, list[int]]:
+    """返回 {设备名: [字段...]}，devices 为空时返回全部"""
+    stats: Dict[str, list[int]] = {}
+    for line in (text or "").split("\n"):
+        parts = line.split()
+        if len(parts) < 14 or (devices is not None and parts[2] not in devices):
+            continue
+        try:
+            stats[parts[2]] = [int(v) for v in parts[3:14]]
+        except ValueError:
+            continue
+    return stats
+
+
+def _mount_device(root: Path, pid: int, path: str) -> Optional[str]:
+    """major 为 0（overlay、btrfs 子卷等）时按最长挂载点匹配目标进程 /proc/<pid>/mounts 的设备"""
+    try:
+        mounts = (root / "proc" / str(pid) / "mounts").read_text().split("\n")
+    except OSError:
+        return None
+    best, best_len = None, -1
+    for line in mounts:
+        parts = line.split()
+        if len(parts) < 2 or not parts[0].startswith("/dev/"):
+            continue
+        mount_point = parts[1]
+        if (path == mount_point or path.startswith(mount_point.rstrip("/") + "/")) and len(mount_point) > best_len:
+            best, best_len = os.path.basename(os.path.realpath(root / parts[0].lstrip("/"))), len(mount_point)
+    return best
+
+
+class BlockIoSampler:
+    """缓存目标进程对应的块设备，按窗口前后两次快照计算设备指标"""
+
+    def __init__(self, root: str = "/") -> None:
+        self.root = Path(root)
+        self._pid: Optional[int] = None
+        self._devices: set[str] = set()
+
+    def devices_for(self, pid: int) -> set[str]:
+        """目标进程工作目录所在的块设备（pid 不变时复用）"""
+        if pid == self._pid:
+            return self._devices
+        self._pid = pid
+        self._devices = set()
+        cwd_link = self.root / "proc" / str(pid) / "cwd"
+        try:
+            cwd = os.readlink(cwd_link)
+            # 经 /proc/<pid>/cwd 取 stat，目标进程在其他挂载命名空间（容器）时同样指向它看到的目录
+            dev = os.stat(cwd_link).st_dev
+        except OSError:
+            return self._devices
+        name = None
+        if os.major(dev):
+            sys_dev = self.root / "sys/dev/block" / f"{os.major(dev)}:{os.minor(dev)}"
+            try:
+                name = os.path.basename(os.path.realpath(sys_dev))
+            except OSError:
+                name = None
+        else:
+            name = _mount_device(self.root, pid, cwd)
+        if name:
+            self._devices.add(name)
+        return self._devices
+
+    def snapshot(self, pid: int) -> Optional[Dict[str, list[int]]]:
+        devices = self.devices_for(int(pid))
+        if not devices:
+            return None
+        try:
+            text = (self.root / "proc/diskstats").read_text()
+        except OSError:
+            return None
+        return parse_diskstats(text, devices)
+
+    @staticmethod
+    def derive(before: Optional[Dict[str, list[int]]], after: Optional[Dict[str, list[int]]],
+               elapsed: float) -> Dict[str, Any]:
+        """由窗口前后两次快照派生设备指标；多个设备时 IOPS / 队列深度求和，利用率取最大"""
+        if not before or not after:
+            return {}
+        elapsed_ms = max(elapsed * 1000, 1.0)
+        ios = busy_ms = queue = 0.0
+        util = 0.0
+        for name, cur in after.items():
+            old = before.get(name)
+            if old is None:
+                continue
+            d = [max(0, c - o) for c, o in zip(cur, old)]
+            ios += d[_READS] + d[_WRITES]
+            busy_ms += d[_MS_READ] + d[_MS_WRITE]
+            queue += d[_WEIGHTED_MS] / elapsed_ms
+            util = max(util, min(d[_MS_IO] / elapsed_ms * 100, 100.0))
+        return {
+            "disk_iops": round(ios / (elapsed_ms / 1000), 2),
+            "disk_await": round(busy_ms / ios, 2) if ios else 0.0,
+            "disk_queue_depth": round(queue, 2),
+            "disk_util": round(util, 2),
+        }
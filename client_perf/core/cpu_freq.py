@@ -0,0 +1,153 @@
+# coding: utf-8
+"""
+CPU 频率 / 分核负载 / 温度采集 — Android / HarmonyOS 可选指标（任务选项 cpu_freq）。
+
+CPU 占用率回归往往其实是降频或温控限频。每轮一次 shell 往返读取：
+    * /proc/stat 的 cpuN 行                          -> 分核负载
+    * /sys/devices/system/cpu/cpufreq/policy*/       -> 按簇（policy）的当前频率、限频上限、硬件上限
+    * /sys/class/thermal/thermal_zone*/{type,temp}   -> 最高温度
+`grep -H .` 一次输出 "路径:值"，离线核心、缺失节点不会打乱对应关系。
+
+写入 cpu_freq.csv：
+    time, max_temp(℃), throttled, clusters(JSON), core_load(JSON)
+    clusters  : [{"policy": "policy0", "cpus": "0-3", "cur_mhz": 1800, "cap_mhz": 1800, "max_mhz": 2000}]
+    core_load : [12.5, 3.0, ...]（按核心编号，离线核心为 null）
+限频（某簇 scaling_max_freq < cpuinfo_max_freq）开始/结束时写入任务事件
+throttle_start / throttle_end，由 /task_events/ 在时间轴上标出。
+"""
+import asyncio
+import json
+import re
+import time
+from collections.abc import Callable
+from typing import Any, Dict, Optional
+
+from client_perf.core.lifecycle import record_event
+
+CPU_FREQ_KEYS = ["time", "max_temp(℃)", "throttled", "clusters", "core_load"]
+
+_CPU_FREQ_COMMAND = (
+    "grep '^cpu[0-9]' /proc/stat; "
+    "grep -H . /sys/devices/system/cpu/cpufreq/policy*/scaling_cur_freq "
+    "/sys/devices/system/cpu/cpufreq/policy*/scaling_max_freq "
+    "/sys/devices/system/cpu/cpufreq/policy*/cpuinfo_max_freq "
+    "/sys/devices/system/cpu/cpufreq/policy*/related_cpus "
+    "/sys/class/thermal/thermal_zone*/type "
+    "/sys/class/thermal/thermal_zone*/temp 2>/dev/null"
+)
+
+_POLICY_RE = re.compile(r"/cpufreq/(policy\d+)/(\w+):(.*)$")
+_ZONE_RE = re.compile(r"/thermal/(thermal_zone\d+)/(type|temp):(.*)$")
+
+
+def parse_cpu_freq(output: str) -> tuple[Dict[int, tuple[int, int]], Dict[str, Dict[str, str]], Dict[str, Dict[str, str]]]:
+    """返回 ({核心号: (busy, total)}, {policy: {字段: 值}}, {zone: {type, temp}})"""
+    cores: Dict[int, tuple[int, int]] = {}
+    policies: Dict[str, Dict[str, str]] = {}
+    zones: Dict[str, Dict[str, str]] = {}
+    for line in (output or "").split("\n"):
+        line = line.strip()
+        if line.startswith("cpu"):
+            parts = line.split()
+            if parts[0][3:].isdigit() and len(parts) >= 8:
+                vals = [int(v) for v in parts[1:8] if v.isdigit()]
+                total = sum(vals)
+                # idle + iowait 视为空闲
+                idle = vals[3] + (vals[4] if len(vals) > 4 else 0)
+                cores[int(parts[0][3:])] = (total - idle, total)
+            continue
+        match = _POLICY_RE.search(line)
+        if match:
+            policies.setdefault(match.group(1), {})[match.group(2)] = match.group(3).strip()
+            continue
+        match = _ZONE_RE.search(line)
+        if match:
+            zones.setdefault(match.group(1), {})[match.group(2)] = match.group(3).strip()
+    return cores, policies, zones
+
+
+def _max_temp(zones: Dict[str, Dict[str, str]]) -> Optional[float]:
+    """最高温度（℃）；有 CPU 相关温区时只看这些温区，过滤明显无效的读数"""
+    readings = []
+    for zone in zones.values():
+        raw = zone.get("temp", "")
+        if not raw.lstrip("-").isdigit():
+            continue
+        temp = int(raw)
+        temp = temp / 1000.0 if abs(temp) >= 1000 else float(temp)
+        if 0 < temp < 150:
+            readings.append((zone.get("type", "").lower(), temp))
+    cpu_readings = [t for name, t in readings if "cpu" in name or "soc" in name or "tsens" in name]
+    values = cpu_readings or [t for _, t in readings]
+    return round(max(values), 1) if values else None
+
+
+def _khz_to_mhz(value: Optional[str]) -> Optional[int]:
+    return int(value) // 1000 if value and value.isdigit() else None
+
+
+class CpuFreqSampler:
+    """保存上一轮分核计数和限频状态"""
+
+    def __init__(self, save_dir: Optional[str] = None) -> None:
+        self.save_dir = save_dir
+        self._prev_cores: Dict[int, tuple[int, int]] = {}
+        self._throttled: list[str] = []
+
+    def update(self, output: str) -> Optional[Dict[str, Any]]:
+        cores, policies, zones = parse_cpu_freq(output)
+        prev, self._prev_cores = self._prev_cores, cores
+
+        core_load: list[Optional[float]] = []
+        for cpu in range(max(cores) + 1 if cores else 0):
+            if cpu not in cores or cpu not in prev:
+                core_load.append(None)
+                continue
+            busy = cores[cpu][0] - prev[cpu][0]
+            total = cores[cpu][1] - prev[cpu][1]
+            core_load.append(round(max(0, busy) / total * 100, 2) if total > 0 else 0.0)
+
+        clusters = []
+        throttled = []
+        for name in sorted(policies, key=lambda p: int(p[6:])):
+            policy = policies[name]
+            cap, hw_max = _khz_to_mhz(policy.get("scaling_max_freq")), _khz_to_mhz(policy.get("cpuinfo_max_freq"))
+            clusters.append({
+                "policy": name,
+                "cpus": policy.get("related_cpus", ""),
+                "cur_mhz": _khz_to_mhz(policy.get("scaling_cur_freq")),
+                "cap_mhz": cap,
+                "max_mhz": hw_max,
+            })
+            if cap and hw_max and cap < hw_max:
+                throttled.append(name)
+
+        self._record_throttle(throttled, clusters)
+        if not prev:
+            return None
+        return {
+            "max_temp": _max_temp(zones),
+            "throttled": 1 if throttled else 0,
+            "clusters": json.dumps(clusters, separators=(",", ":")),
+            "core_load": json.dumps(core_load, separators=(",", ":")),
+            "time": int(time.time()),
+        }
+
+    def _record_throttle(self, throttled: list[str], clusters: list[dict]) -> None:
+        """限频状态变化时写任务事件，形成时间轴上的限频区间"""
+        was = self._throttled
+        self._throttled = throttled
+        if not self.save_dir or bool(was) == bool(throttled):
+            return
+        if throttled:
+            caps = {c["policy"]: c["cap_mhz"] for c in clusters if c["policy"] in throttled}
+            record_event(self.save_dir, "throttle_start", clusters=caps)
+        else:
+            record_event(self.save_dir, "throttle_end")
+
+
+async def device_cpu_freq(sampler: CpuFreqSampler, shell: Callable[[str], str]) -> Optional[Dict]:
+    def real_func():
+        return sampler.update(shell(_CPU_FREQ_COMMAND))
+
+    return await asyncio.wait_for(asyncio.to_thread(real_func), timeout=15)
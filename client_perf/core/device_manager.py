@@ -3,9 +3,11 @@
 设备管理模块
 统一管理 PC / Android / iOS / HarmonyOS 四种平台的设备发现、信息获取和性能采集入口。
 """
+import asyncio
+import hashlib
 import platform
 import time
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 
 from client_perf.log import log as logger
 
@@ -19,6 +21,9 @@ DEVICE_TYPE_HARMONY = "harmony"
 
 ALL_DEVICE_TYPES = [DEVICE_TYPE_PC, DEVICE_TYPE_ANDROID, DEVICE_TYPE_IOS, DEVICE_TYPE_HARMONY]
 
+# 预览截图缓存有效期（秒）：多个页面同时预览同一设备时共用一次截图
+PREVIEW_CACHE_TTL = 1.5
+
 
 # ─────────────────────────── 统一设备管理 ───────────────────────────
 
@@ -147,12 +152,13 @@ class DeviceManager:
         return []
 
     @classmethod
-    async def get_device_apps_async(cls, device_type: str, device_id: str) -> List[Dict]:
-        """异步获取设备上的应用/进程列表"""
+    async def get_device_apps_async(cls, device_type: str, device_id: str,
+                                    refresh: bool = False) -> List[Dict]:
+        """异步获取设备上的应用/进程列表；refresh=True 时忽略包列表缓存"""
         if device_type == DEVICE_TYPE_ANDROID:
             try:
                 from client_perf.core.android_tools import android_packages
-                return await android_packages(device_id)
+                return await android_packages(device_id, refresh)
             except Exception as e:
                 logger.error(f"获取 Android 应用列表失败: {e}")
                 return []
@@ -168,7 +174,7 @@ class DeviceManager:
         elif device_type == DEVICE_TYPE_HARMONY:
             try:
                 from client_perf.core.harmony_tools import harmony_packages
-                return await harmony_packages(device_id)
+                return await harmony_packages(device_id, refresh)
             except Exception as e:
                 logger.error(f"获取 HarmonyOS 应用列表失败: {e}")
                 return []
@@ -242,6 +248,64 @@ class DeviceManager:
 
         return None
 
+    # 预览截图缓存：(device_type, device_id, pid) -> (截图时间, 原始截图, {编码参数: (字节, etag)})
+    _preview_cache: Dict[tuple, Tuple[float, bytes, Dict[tuple, Tuple[bytes, str]]]] = {}
+    # 正在进行中的截图，后到的请求直接等待同一个 Future
+    _preview_inflight: Dict[tuple, "asyncio.Future"] = {}
+
+    @classmethod
+    async def _capture_preview(cls, key: tuple) -> Optional[Tuple[float, bytes, dict]]:
+        cached = cls._preview_cache.get(key)
+        if cached and cached[0] + PREVIEW_CACHE_TTL > time.time():
+            return cached
+        inflight = cls._preview_inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        fut = asyncio.get_running_loop().create_future()
+        cls._preview_inflight[key] = fut
+        try:
+            device_type, device_id, pid = key
+            raw = await cls.take_screenshot(device_type, device_id, pid)
+            entry = (time.time(), raw, {}) if raw else None
+            if entry:
+                cls._preview_cache[key] = entry
+            else:
+                cls._preview_cache.pop(key, None)
+            fut.set_result(entry)
+            return entry
+        except Exception as e:
+            fut.set_exception(e)
+            # 没有其他等待者时避免 "exception was never retrieved" 警告
+            fut.exception()
+            raise
+        finally:
+            cls._preview_inflight.pop(key, None)
+
+    @classmethod
+    async def preview_screenshot(cls, device_type: str, device_id: str, pid: int = 0,
+                                 max_width: int = 0, fmt: str = "png",
+                                 quality: int = 80) -> Optional[Tuple[bytes, str]]:
+        """
+        设备预览截图（不落盘）：返回 (图片字节, etag)，无截图时返回 None。
+        原始截图按设备短时缓存、并发请求共享同一次截图；
+        同一参数的编码结果随截图一起缓存，缩放/转码交给截图编码池。
+        """
+        from client_perf.core.screenshot import get_pipeline
+
+        entry = await cls._capture_preview((device_type, device_id or "", int(pid or 0)))
+        if not entry:
+            return None
+        _, raw, variants = entry
+        variant_key = (fmt, quality, max_width)
+        if variant_key not in variants:
+            if fmt == "png" and not max_width:
+                data = raw
+            else:
+                data = await asyncio.wrap_future(get_pipeline().encode(raw, fmt, quality, max_width))
+            variants[variant_key] = (data, hashlib.sha1(data).hexdigest()[:16])
+        return variants[variant_key]
+
 
 # ─────────────────────────── 平台能力检测 ───────────────────────────
 
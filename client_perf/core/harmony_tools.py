@@ -8,7 +8,7 @@ HarmonyOS 性能测试模块
 
 支持的指标：
   - CPU 使用率（/proc/stat + /proc/<pid>/stat）
-  - 内存使用（hidumper --mem 或 /proc/<pid>/status）
+  - 内存使用（每轮 smaps_rollup/status；hidumper --mem 分类按 memory_detail_interval 慢速采集）
   - 网络 IO（/proc/net/dev 两次采样差值）
   - 磁盘 IO（/proc/<pid>/io 两次采样差值）
   - 电池信息（hidumper -s BatteryService）
@@ -22,13 +22,25 @@ import os
 import re
 import shutil
 import subprocess
+import tempfile
 import time
 import threading
-from pathlib import Path
 from typing import Optional, Dict, List
 
 from client_perf.log import log as logger
+from client_perf.core.cpu_freq import CPU_FREQ_KEYS, CpuFreqSampler, device_cpu_freq
 from client_perf.core.monitor import Monitor
+from client_perf.core.thread_cpu import THREAD_CPU_KEYS, ThreadCpuSampler, device_thread_cpu, thread_options
+from client_perf.core.proc_memory import (
+    MEMORY_DETAIL_KEYS, fast_memory_command, memory_detail_interval, parse_fast_memory, parse_hidumper_mem,
+)
+from client_perf.core.package_sampler import PackageSampler, package_monitors
+from client_perf.core.package_cache import (
+    PackageCache, PS_COMMAND, join_packages, parse_ps, split_ps, with_ps,
+)
+from client_perf.core.launch import HarmonyLaunchDriver, launch_options, run_launch
+from client_perf.core.lifecycle import ProcessTarget, device_watcher, run_monitors
+from client_perf.core.screenshot import save_screenshot, screenshot_busy
 
 # ─────────────────────────── hdc 路径 ───────────────────────────
 
@@ -161,47 +173,51 @@ async def harmony_sys_info(serial: str) -> Dict:
 
 # ─────────────────────────── 进程/应用列表 ───────────────────────────
 
-async def harmony_packages(serial: str) -> List[Dict]:
-    """获取 HarmonyOS 设备上已安装的应用包名列表"""
+_package_cache = PackageCache()
+
+
+def _parse_bm_packages(output: str) -> List[str]:
+    packages = []
+    for line in (output or "").strip().split("\n"):
+        line = line.strip()
+        # 过滤掉非包名行
+        if not line or line.startswith("ID") or ":" in line[:3]:
+            continue
+        packages.append(line)
+    return packages
+
+
+def _parse_pm_packages(output: str) -> List[str]:
+    packages = []
+    for line in (output or "").strip().split("\n"):
+        line = line.strip()
+        if line.startswith("package:"):
+            pkg = line.replace("package:", "").strip()
+            if pkg:
+                packages.append(pkg)
+    return packages
+
+
+async def harmony_packages(serial: str, refresh: bool = False) -> List[Dict]:
+    """
+    获取 HarmonyOS 设备上已安装的应用包名列表
+    运行状态由一次 ps 快照 join 得到；包列表按设备缓存，refresh=True 强制重新获取
+    """
     def real_func():
-        # 使用 bm dump 获取已安装包列表
-        output = _shell(serial, "bm dump -a 2>/dev/null")
-        packages = []
-        if output:
-            for line in output.strip().split("\n"):
-                line = line.strip()
-                # 过滤掉非包名行
-                if not line or line.startswith("ID") or ":" in line[:3]:
-                    continue
-                # 尝试获取该包的 PID
-                pid_output = _shell(serial, f"pidof {line} 2>/dev/null").strip()
-                pid = int(pid_output.split()[0]) if pid_output and pid_output.split()[0].isdigit() else 0
-                packages.append({
-                    "package_name": line,
-                    "pid": pid,
-                    "name": line,
-                    "running": pid > 0,
-                    "bundle_id": line,
-                })
+        if not refresh:
+            running = parse_ps(_shell(serial, PS_COMMAND))
+            packages = _package_cache.get(serial, running)
+            if packages is not None:
+                return join_packages(packages, running)
+        # 使用 bm dump 获取已安装包列表，与 ps 快照合并为一次 hdc 往返
+        bm_output, ps_output = split_ps(_shell(serial, with_ps("bm dump -a 2>/dev/null")))
+        running = parse_ps(ps_output)
+        packages = _parse_bm_packages(bm_output)
         # 如果 bm dump 没有输出，尝试 pm list packages
         if not packages:
-            output2 = _shell(serial, "pm list packages -3 2>/dev/null")
-            for line in output2.strip().split("\n"):
-                line = line.strip()
-                if line.startswith("package:"):
-                    pkg = line.replace("package:", "").strip()
-                    if pkg:
-                        pid_output = _shell(serial, f"pidof {pkg} 2>/dev/null").strip()
-                        pid = int(pid_output.split()[0]) if pid_output and pid_output.split()[0].isdigit() else 0
-                        packages.append({
-                            "package_name": pkg,
-                            "pid": pid,
-                            "name": pkg,
-                            "running": pid > 0,
-                            "bundle_id": pkg,
-                        })
-        packages.sort(key=lambda x: (-int(x['running']), x['name']))
-        return packages
+            packages = _parse_pm_packages(_shell(serial, "pm list packages -3 2>/dev/null"))
+        _package_cache.put(serial, packages, running)
+        return join_packages(packages, running)
 
     return await asyncio.wait_for(asyncio.to_thread(real_func), timeout=20)
 
@@ -309,55 +325,54 @@ async def harmony_cpu(serial: str, pid: int = 0, package_name: str = "", **kwarg
 
 async def harmony_memory(serial: str, pid: int = 0, package_name: str = "", **kwargs) -> Dict:
     """
-    采集 HarmonyOS 进程内存使用
-    优先使用 hidumper --mem <bundle> 获取 PSS，失败则用 /proc/<pid>/status
+    采集 HarmonyOS 进程内存使用（快层，每轮一次 shell）
+    /proc/<pid>/smaps_rollup 给出 PSS/Swap，不可读时 PSS 改由 hidumper --mem 取得；
+    process_memory_usage 始终是 PSS，RSS 单独写 rss 列；
+    完整的 hidumper --mem 分类见 harmony_memory_detail（慢层）
     """
     def real_func():
-        target = package_name if package_name else str(pid)
-        if not target or target == "0":
+        target_pid = pid
+        if not target_pid and package_name:
+            pid_output = _shell(serial, f"pidof {package_name} 2>/dev/null").strip()
+            if pid_output:
+                parts = pid_output.split()
+                target_pid = int(parts[0]) if parts[0].isdigit() else 0
+        if not target_pid:
             return {"process_memory_usage": 0, "time": int(time.time())}
 
-        memory_mb = 0.0
+        mem = parse_fast_memory(_shell(serial, fast_memory_command(target_pid)))
+        pss = mem.get("pss")
+        if pss is None:
+            # smaps_rollup 不可读（非 debuggable 应用 / 非 root）：PSS 改由 hidumper --mem 取得，不混入 RSS
+            output = _shell(serial, f"hidumper --mem {target_pid} 2>/dev/null", timeout=20)
+            pss = parse_hidumper_mem(output)["total_pss"]
+        res = {
+            "process_memory_usage": pss,
+            "pss": mem.get("pss"),
+            "rss": mem.get("rss"),
+            "swap": mem.get("swap"),
+            "time": int(time.time()),
+        }
+        print_json(res)
+        return res
+
+    return await asyncio.wait_for(asyncio.to_thread(real_func), timeout=20)
 
-        # 方法1: hidumper --mem（鸿蒙专用，获取 PSS）
-        if package_name:
-            try:
-                output = _shell(serial, f"hidumper --mem {package_name} 2>/dev/null", timeout=10)
-                if output:
-                    # 查找 Total PSS 行
-                    match = re.search(r'Total\s+PSS[:\s]+(\d+)', output, re.IGNORECASE)
-                    if match:
-                        memory_mb = int(match.group(1)) / 1024.0
-                    else:
-                        # 查找 Pss Total 行
-                        match = re.search(r'Pss\s+Total[:\s]+(\d+)', output, re.IGNORECASE)
-                        if match:
-                            memory_mb = int(match.group(1)) / 1024.0
-            except Exception as e:
-                logger.warning(f"hidumper --mem 失败: {e}")
-
-        # 方法2: /proc/<pid>/status（备用）
-        target_pid = pid
-        if memory_mb == 0:
-            if not target_pid and package_name:
-                pid_output = _shell(serial, f"pidof {package_name} 2>/dev/null").strip()
-                if pid_output:
-                    parts = pid_output.split()
-                    target_pid = int(parts[0]) if parts[0].isdigit() else 0
-            if target_pid:
-                try:
-                    status_output = _shell(serial, f"cat /proc/{target_pid}/status 2>/dev/null")
-                    match = re.search(r'VmRSS:\s+(\d+)\s+kB', status_output)
-                    if match:
-                        memory_mb = int(match.group(1)) / 1024.0
-                except Exception as e:
-                    logger.warning(f"/proc/pid/status 读取失败: {e}")
 
-        res = {"process_memory_usage": round(memory_mb, 2), "time": int(time.time())}
+async def harmony_memory_detail(serial: str, pid: int = 0, package_name: str = "", **kwargs) -> Dict:
+    """采集 HarmonyOS 内存分类明细（慢层）：hidumper --mem"""
+    def real_func():
+        target = str(pid) if pid else package_name
+        if not target:
+            return None
+        res = parse_hidumper_mem(_shell(serial, f"hidumper --mem {target} 2>/dev/null", timeout=20))
+        if res["total_pss"] is None:
+            return None
+        res["time"] = int(time.time())
         print_json(res)
         return res
 
-    return await asyncio.wait_for(asyncio.to_thread(real_func), timeout=20)
+    return await asyncio.wait_for(asyncio.to_thread(real_func), timeout=30)
 
 
 # ─────────────────────────── FPS 采集 ───────────────────────────
@@ -674,27 +689,29 @@ async def harmony_battery(serial: str, **kwargs) -> Dict:
 
 # ─────────────────────────── 截图 ───────────────────────────
 
-async def harmony_screenshot(serial: str, save_dir: str = None, **kwargs):
-    """HarmonyOS 设备截图（hdc shell snapshot_display）"""
+async def harmony_screenshot(serial: str, save_dir: str = None, options: Optional[Dict] = None, **kwargs):
+    """
+    HarmonyOS 设备截图（hdc shell snapshot_display）
+    落盘时原图先拉到临时文件，再交给截图编码管线按任务配置重新编码。
+    """
     def real_func():
         if not HDC_PATH:
             return None
+        # 编码管线繁忙时跳过本次抓图
+        if save_dir and screenshot_busy():
+            return None
 
-        remote_path = f"/data/local/tmp/hm_shot_{int(time.time())}.png"
+        ts = int(time.time())
+        remote_path = f"/data/local/tmp/hm_shot_{ts}.png"
         # 在设备上截图
         _shell(serial, f"snapshot_display -f {remote_path} 2>/dev/null")
         time.sleep(0.5)
 
-        if save_dir:
-            screenshot_dir = Path(save_dir) / "screenshot"
-            screenshot_dir.mkdir(parents=True, exist_ok=True)
-            local_path = str(screenshot_dir / f"{int(time.time())}.png")
-        else:
-            local_path = f"/tmp/hm_screenshot_{int(time.time())}.png"
+        local_path = os.path.join(tempfile.gettempdir(), f"hm_screenshot_{serial}_{ts}.png")
 
         # 拉取截图到本地
         try:
-            result = subprocess.run(
+            subprocess.run(
                 [HDC_PATH, "-t", serial, "file", "recv", remote_path, local_path],
                 capture_output=True, timeout=15
             )
@@ -702,12 +719,12 @@ async def harmony_screenshot(serial: str, save_dir: str = None, **kwargs):
             _shell(serial, f"rm -f {remote_path} 2>/dev/null")
 
             if os.path.isfile(local_path) and os.path.getsize(local_path) > 0:
-                if not save_dir:
-                    with open(local_path, "rb") as f:
-                        data = f.read()
-                    os.remove(local_path)
-                    return data
-                return True
+                with open(local_path, "rb") as f:
+                    data = f.read()
+                os.remove(local_path)
+                if save_dir:
+                    return save_screenshot(data, save_dir, options, ts=ts)
+                return data
         except Exception as e:
             logger.error(f"HarmonyOS 截图失败: {e}")
         return None
@@ -717,13 +734,14 @@ async def harmony_screenshot(serial: str, save_dir: str = None, **kwargs):
 
 # ─────────────────────────── 性能采集入口 ───────────────────────────
 
-async def harmony_perf(serial: str, package_name: str, pid: int, save_dir: str, include_child: bool = False):
+async def harmony_perf(serial: str, package_name: str, pid: int, save_dir: str, include_child: bool = False,
+                       options: Optional[Dict] = None, task_id: Optional[int] = None):
     """
     HarmonyOS 性能采集入口，与 Android/iOS 端保持一致的 Monitor 结构。
 
     支持的指标：
     - CPU 使用率（/proc/stat 两次采样）
-    - 内存使用（hidumper --mem 或 /proc/<pid>/status）
+    - 内存使用（每轮 smaps_rollup/status；hidumper --mem 分类按 memory_detail_interval 慢速采集）
     - FPS（hidumper -s RenderService）
     - GPU（/sys 节点）
     - 网络 IO（/proc/net/dev 缓存差值）
@@ -744,24 +762,31 @@ async def harmony_perf(serial: str, package_name: str, pid: int, save_dir: str,
 
     logger.info(f"HarmonyOS 性能采集: serial={serial}, package={package_name}, pid={pid}")
 
+    # 有 pid 时由生命周期跟踪统一探测，采集函数不再各自 pidof
+    target = ProcessTarget(pid)
+    watcher = None
+    if pid:
+        watcher = device_watcher(target, save_dir, lambda cmd: _shell(serial, cmd),
+                                 package_name, options, task_id)
+
     monitors = {
         "cpu": Monitor(harmony_cpu,
-                       serial=serial, pid=pid, package_name=package_name,
+                       serial=serial, pid=pid, package_name=package_name, target=target,
                        monitor_name="cpu",
                        key_value=["time", "cpu_usage(%)", "cpu_usage_all(%)", "cpu_core_num(个)"],
                        save_dir=save_dir),
         "memory": Monitor(harmony_memory,
-                          serial=serial, pid=pid, package_name=package_name,
+                          serial=serial, pid=pid, package_name=package_name, target=target,
                           monitor_name="memory",
-                          key_value=["time", "process_memory_usage(M)"],
+                          key_value=["time", "process_memory_usage(M)", "pss(M)", "rss(M)", "swap(M)"],
                           save_dir=save_dir),
         "process_info": Monitor(harmony_process_info,
-                                serial=serial, pid=pid, package_name=package_name,
+                                serial=serial, pid=pid, package_name=package_name, target=target,
                                 monitor_name="process_info",
                                 key_value=["time", "num_threads(个)", "num_handles(个)"],
                                 save_dir=save_dir),
         "fps": Monitor(harmony_fps,
-                       serial=serial, pid=pid, package_name=package_name,
+                       serial=serial, pid=pid, package_name=package_name, target=target,
                        monitor_name="fps",
                        key_value=["time", "fps(帧)", "frames"],
                        save_dir=save_dir),
@@ -771,13 +796,13 @@ async def harmony_perf(serial: str, package_name: str, pid: int, save_dir: str,
                        key_value=["time", "gpu(%)"],
                        save_dir=save_dir),
         "disk_io": Monitor(harmony_disk_io,
-                           serial=serial, pid=pid, package_name=package_name,
+                           serial=serial, pid=pid, package_name=package_name, target=target,
                            monitor_name="disk_io",
                            key_value=["time", "disk_read_rate(MB/s)", "disk_write_rate(MB/s)",
                                       "disk_read(字节)", "disk_write(字节)"],
                            save_dir=save_dir),
         "network_io": Monitor(harmony_network_io,
-                              serial=serial, pid=pid, package_name=package_name,
+                              serial=serial, pid=pid, package_name=package_name, target=target,
                               monitor_name="network_io",
                               key_value=["time", "net_sent_rate(MB/s)", "net_recv_rate(MB/s)",
                                          "net_sent(字节)", "net_recv(字节)"],
@@ -789,8 +814,43 @@ async def harmony_perf(serial: str, package_name: str, pid: int, save_dir: str,
                                       "battery_current(mA)"],
                            save_dir=save_dir),
         "screenshot": Monitor(harmony_screenshot,
-                              serial=serial,
+                              serial=serial, options=options,
                               save_dir=save_dir, is_out=False)
     }
-    run_monitors = [monitor.run() for name, monitor in monitors.items()]
-    await asyncio.gather(*run_monitors)
+    detail_interval = memory_detail_interval(options)
+    if detail_interval:
+        monitors["memory_detail"] = Monitor(harmony_memory_detail,
+                                            serial=serial, pid=pid, package_name=package_name, target=target,
+                                            monitor_name="memory_detail", interval=detail_interval,
+                                            key_value=MEMORY_DETAIL_KEYS,
+                                            save_dir=save_dir)
+    thread_on, thread_top_n = thread_options(options)
+    if thread_on:
+        monitors["thread_cpu"] = Monitor(device_thread_cpu,
+                                         sampler=ThreadCpuSampler(thread_top_n),
+                                         shell=lambda cmd: _shell(serial, cmd),
+                                         pid=pid, target=target,
+                                         monitor_name="thread_cpu",
+                                         key_value=THREAD_CPU_KEYS,
+                                         save_dir=save_dir)
+    if (options or {}).get("cpu_freq"):
+        monitors["cpu_freq"] = Monitor(device_cpu_freq,
+                                       sampler=CpuFreqSampler(save_dir),
+                                       shell=lambda cmd: _shell(serial, cmd),
+                                       monitor_name="cpu_freq",
+                                       key_value=CPU_FREQ_KEYS,
+                                       save_dir=save_dir)
+    # include_child：按包聚合该应用的全部进程，替换单进程的 cpu / memory / process_info / disk_io
+    if include_child and package_name:
+        sampler = PackageSampler(lambda cmd: _shell(serial, cmd), package_name)
+        monitors.update(package_monitors(sampler, Monitor, save_dir, pid=pid, target=target))
+    await run_monitors(monitors, watcher)
+
+
+async def harmony_launch(serial: str, package_name: str, save_dir: str,
+                         options: Optional[Dict] = None, task_id: Optional[int] = None):
+    """HarmonyOS 启动耗时测量入口（task_type=launch）"""
+    opts = launch_options(options)
+    driver = await asyncio.to_thread(HarmonyLaunchDriver, lambda cmd: _shell(serial, cmd, timeout=60),
+                                     package_name, opts["activity"], opts["marker"])
+    await run_launch(driver, save_dir, options, task_id)
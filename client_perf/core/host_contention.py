@@ -0,0 +1,198 @@
+# coding: utf-8
+"""
+Linux PC 宿主机争用指标 — 可选采集（任务选项 host_contention）。
+
+CI 机器上被测进程与其他作业共享宿主机，cpu.csv 无法区分"应用变慢"与"机器被抢占"。
+每轮读取：
+    * /proc/pressure/{cpu,memory,io}  PSI：按 total（累计停顿微秒）差值算出本轮停顿占比
+    * 目标进程所在 cgroup（v2 优先，兼容 v1）：
+        cpu.stat      nr_periods / nr_throttled / throttled_usec -> 本轮被限流时间占比
+        memory.current、memory.events（high / max / oom_kill 增量）
+写入 host_contention.csv；对比时用 contention_summary() 标记受宿主机争用污染的任务。
+
+proc_root / cgroup_root 参数仅用于在伪造的目录树上测试。
+"""
+import asyncio
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+HOST_CONTENTION_KEYS = [
+    "time", "cpu_some(%)", "memory_some(%)", "memory_full(%)", "io_some(%)", "io_full(%)",
+    "cgroup_throttled(%)", "cgroup_throttled_periods(个)", "memory_current(M)",
+    "memory_high_events(个)", "memory_max_events(个)", "oom_kill(个)",
+]
+
+# 对比时判定"结果被宿主机争用污染"的阈值（任务期间均值，%）
+CONTENTION_THRESHOLDS = {
+    "cpu_some": 10.0,
+    "memory_full": 5.0,
+    "io_full": 10.0,
+    "cgroup_throttled": 5.0,
+}
+
+
+def _read(path: Path) -> Optional[str]:
+    try:
+        return path.read_text()
+    except OSError:
+        return None
+
+
+def _kv(text: Optional[str]) -> Dict[str, int]:
+    """解析 "key value" 每行一项的 cgroup 统计文件"""
+    res: Dict[str, int] = {}
+    for line in (text or "").split("\n"):
+        parts = line.split()
+        if len(parts) == 2 and parts[1].isdigit():
+            res[parts[0]] = int(parts[1])
+    return res
+
+
+def _psi_totals(text: Optional[str]) -> Dict[str, int]:
+    """解析 PSI 文件，返回 {"some": total_us, "full": total_us}"""
+    res: Dict[str, int] = {}
+    for line in (text or "").split("\n"):
+        parts = line.split()
+        if not parts:
+            continue
+        for item in parts[1:]:
+            key, _, value = item.partition("=")
+            if key == "total" and value.isdigit():
+                res[parts[0]] = int(value)
+    return res
+
+
+def _cgroup_dirs(pid: int, proc_root: Path, cgroup_root: Path) -> tuple[Optional[Path], Optional[Path]]:
+    """返回 (cpu 控制器目录, memory 控制器目录)；v2 下两者相同"""
+    text = _read(proc_root / str(pid) / "cgroup")
+    if not text:
+        return None, None
+    cpu_dir = mem_dir = None
+    for line in text.strip().split("\n"):
+        parts = line.split(":", 2)
+        if len(parts) != 3:
+            continue
+        _, controllers, rel = parts
+        rel = rel.lstrip("/")
+        if controllers == "":
+            # cgroup v2（unified）
+            unified = cgroup_root / rel
+            if (unified / "cpu.stat").exists():
+                return unified, unified
+            continue
+        names = controllers.split(",")
+        if "cpu" in names and cpu_dir is None:
+            cpu_dir = cgroup_root / controllers / rel
+        if "memory" in names and mem_dir is None:
+            mem_dir = cgroup_root / "memory" / rel
+    return cpu_dir, mem_dir
+
+
+class HostContentionSampler:
+    """保存上一轮累计计数，输出本轮增量"""
+
+    def __init__(self, proc_root: str = "/proc", cgroup_root: str = "/sys/fs/cgroup") -> None:
+        self.proc_root = Path(proc_root)
+        self.cgroup_root = Path(cgroup_root)
+        self._prev: Optional[tuple[float, Dict[str, int]]] = None
+        self._pid: Optional[int] = None
+        self._dirs: tuple[Optional[Path], Optional[Path]] = (None, None)
+
+    def _counters(self, pid: int) -> tuple[Dict[str, int], Dict[str, Any]]:
+        counters: Dict[str, int] = {}
+        gauges: Dict[str, Any] = {}
+        for res in ("cpu", "memory", "io"):
+            for kind, total in _psi_totals(_read(self.proc_root / "pressure" / res)).items():
+                counters[f"{res}_{kind}"] = total
+
+        if pid != self._pid:
+            self._pid = pid
+            self._dirs = _cgroup_dirs(pid, self.proc_root, self.cgroup_root)
+        cpu_dir, mem_dir = self._dirs
+        if cpu_dir is not None:
+            stat = _kv(_read(cpu_dir / "cpu.stat"))
+            if "throttled_usec" in stat:
+                counters["throttled_us"] = stat["throttled_usec"]
+            elif "throttled_time" in stat:          # v1，纳秒
+                counters["throttled_us"] = stat["throttled_time"] // 1000
+            for key in ("nr_periods", "nr_throttled"):
+                if key in stat:
+                    counters[key] = stat[key]
+        if mem_dir is not None:
+            current = _read(mem_dir / "memory.current") or _read(mem_dir / "memory.usage_in_bytes")
+            if current and current.strip().isdigit():
+                gauges["memory_current"] = round(int(current) / 1024 / 1024, 2)
+            events = _kv(_read(mem_dir / "memory.events"))
+            for key in ("high", "max", "oom_kill"):
+                if key in events:
+                    counters[f"mem_{key}"] = events[key]
+        return counters, gauges
+
+    def update(self, pid: int) -> Optional[Dict[str, Any]]:
+        now = time.monotonic()
+        counters, gauges = self._counters(int(pid))
+        prev, self._prev = self._prev, (now, counters)
+        if prev is None:
+            return None
+        elapsed_us = max((now - prev[0]) * 1_000_000, 1.0)
+
+        def delta(key: str) -> Optional[int]:
+            if key not in counters or key not in prev[1]:
+                return None
+            return max(0, counters[key] - prev[1][key])
+
+        def pct(key: str) -> Optional[float]:
+            d = delta(key)
+            return round(min(d / elapsed_us * 100, 100.0), 2) if d is not None else None
+
+        res: Dict[str, Any] = {
+            "cpu_some": pct("cpu_some"),
+            "memory_some": pct("memory_some"),
+            "memory_full": pct("memory_full"),
+            "io_some": pct("io_some"),
+            "io_full": pct("io_full"),
+            "cgroup_throttled": pct("throttled_us"),
+            "cgroup_throttled_periods": delta("nr_throttled"),
+            "memory_current": gauges.get("memory_current"),
+            "memory_high_events": delta("mem_high"),
+            "memory_max_events": delta("mem_max"),
+            "oom_kill": delta("mem_oom_kill"),
+            "time": int(time.time()),
+        }
+        return res
+
+
+async def host_contention(sampler: HostContentionSampler, pid: int) -> Optional[Dict]:
+    return await asyncio.wait_for(asyncio.to_thread(sampler.update, pid), timeout=10)
+
+
+# ── 对比 ──────────────────────────────────────────────────────
+
+def contention_summary(rows: list[dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    由 host_contention.csv 记录汇总任务期间的争用情况：
+    {"avg": {...}, "oom_kill": n, "contaminated": bool, "reasons": [...]}
+    没有该 CSV（未开启采集）时返回 None
+    """
+    if not rows:
+        return None
+    sums: Dict[str, float] = {}
+    counts: Dict[str, int] = {}
+    oom_kill = 0
+    for row in rows:
+        for k, v in row.items():
+            if not isinstance(v, (int, float)) or k == "time":
+                continue
+            name = k.split("(")[0]
+            if name == "oom_kill":
+                oom_kill += int(v)
+                continue
+            sums[name] = sums.get(name, 0.0) + v
+            counts[name] = counts.get(name, 0) + 1
+    avg = {k: round(sums[k] / counts[k], 4) for k in sums}
+    reasons = [f"{k} 均值 {avg[k]}% > {limit}%"
+               for k, limit in CONTENTION_THRESHOLDS.items() if avg.get(k) is not None and avg[k] > limit]
+    if oom_kill:
+        reasons.append(f"cgroup 内发生 {oom_kill} 次 OOM kill")
+    return {"avg": avg, "oom_kill": oom_kill, "contaminated": bool(reasons), "reasons": reasons}
@@ -24,13 +24,18 @@ import platform
 import shutil
 import subprocess
 import sys
+import tempfile
 import time
 import threading
 from pathlib import Path
 from typing import Optional, Dict, List
 
 from client_perf.log import log as logger
+from client_perf.core.lifecycle import (
+    LifecycleWatcher, ProcessTarget, run_monitors, DEFAULT_ON_TARGET_EXIT,
+)
 from client_perf.core.monitor import Monitor
+from client_perf.core.screenshot import save_screenshot, screenshot_busy
 
 # ── py-ios-device (Instruments DTX 协议) ──────────────────────────────────
 from ios_device.remote.remote_lockdown import RemoteLockdownClient
@@ -764,6 +769,15 @@ class _InstrumentsSession:
             self._cache = {"sys": {}, "procs": {}, "ts": 0.0}
             self._graphics_cache = {"fps": 0, "gpu": 0.0, "gpu_renderer": 0.0, "gpu_tiler": 0.0, "ts": 0.0}
 
+    def has_pid(self, pid: int) -> Optional[bool]:
+        """sysmontap 最新一轮进程列表中是否包含 pid；缓存为空或已过期时返回 None"""
+        with self._lock:
+            procs = self._cache.get("procs") or {}
+            fresh = self._cache["ts"] > 0 and time.time() - self._cache["ts"] <= 5
+        if not procs or not fresh:
+            return None
+        return pid in procs
+
     def get_latest(self, pid: int = 0) -> Dict:
         """
         读取最新缓存数据。
@@ -1114,17 +1128,16 @@ async def ios_battery(udid: str, **kwargs) -> Dict:
 
 # ─────────────────────────── 截图 ───────────────────────────
 
-async def ios_screenshot(udid: str, save_dir: str = None, **kwargs):
-    """设备截图"""
+async def ios_screenshot(udid: str, save_dir: str = None, options: Optional[Dict] = None, **kwargs):
+    """设备截图（落盘时交给截图编码管线按任务配置重新编码）"""
     def real_func():
         if not GO_IOS_PATH:
             return None
-        if save_dir:
-            screenshot_dir = Path(save_dir) / "screenshot"
-            screenshot_dir.mkdir(parents=True, exist_ok=True)
-            out_path = str(screenshot_dir / f"{int(time.time())}.png")
-        else:
-            out_path = f"/tmp/ios_screenshot_{int(time.time())}.png"
+        # 编码管线繁忙时跳过本次抓图
+        if save_dir and screenshot_busy():
+            return None
+        ts = int(time.time())
+        out_path = os.path.join(tempfile.gettempdir(), f"ios_screenshot_{udid}_{ts}.png")
 
         # go-ios screenshot 成功信息输出到 stderr，直接执行并检查文件
         try:
@@ -1137,12 +1150,12 @@ async def ios_screenshot(udid: str, save_dir: str = None, **kwargs):
             return None
 
         if os.path.isfile(out_path) and os.path.getsize(out_path) > 0:
-            if not save_dir:
-                with open(out_path, "rb") as f:
-                    data = f.read()
-                os.remove(out_path)
-                return data
-            return True  # save_dir 模式下文件已保存
+            with open(out_path, "rb") as f:
+                data = f.read()
+            os.remove(out_path)
+            if save_dir:
+                return save_screenshot(data, save_dir, options, ts=ts)
+            return data
         return None
 
     return await asyncio.wait_for(asyncio.to_thread(real_func), timeout=20)
@@ -1150,7 +1163,8 @@ async def ios_screenshot(udid: str, save_dir: str = None, **kwargs):
 
 # ─────────────────────────── 性能采集入口 ───────────────────────────
 
-async def ios_perf(udid: str, bundle_id: str, pid: int, save_dir: str, include_child: bool = False):
+async def ios_perf(udid: str, bundle_id: str, pid: int, save_dir: str, include_child: bool = False,
+                   options: Optional[Dict] = None, task_id: Optional[int] = None):
     """
     iOS 性能采集入口
     udid/bundle_id/pid 由上层传入，bundle_id 和 pid 可以自动获取
@@ -1190,40 +1204,65 @@ async def ios_perf(udid: str, bundle_id: str, pid: int, save_dir: str, include_c
         await asyncio.to_thread(session.start_graphics)
         logger.info(f"[ios_perf] Instruments 预热完成，开始采集")
 
+    # 生命周期跟踪：优先复用 sysmontap 已缓存的进程列表，不额外发起设备请求
+    target = ProcessTarget(pid)
+    watcher = None
+    if pid:
+        session = _get_instruments_session(udid)
+
+        def probe(p: int) -> bool:
+            alive = session.has_pid(p) if session else None
+            if alive is None:
+                return not bundle_id or _find_pid_by_bundle(udid, bundle_id) == p
+            return alive
+
+        def on_reattach(p: int) -> None:
+            if session:
+                session._watched_pids.add(p)
+
+        watcher = LifecycleWatcher(
+            target, save_dir, probe,
+            resolver=(lambda: _find_pid_by_bundle(udid, bundle_id)) if bundle_id else None,
+            mode=(options or {}).get("on_target_exit", DEFAULT_ON_TARGET_EXIT),
+            task_id=task_id,
+            interval=1.0 if session else 5.0,
+            on_reattach=on_reattach,
+        )
+
     monitors = {
         "cpu": Monitor(ios_cpu,
-                       udid=udid, pid=pid,
+                       udid=udid, pid=pid, target=target,
                        monitor_name="cpu",
                        key_value=["time", "cpu_usage(%)", "cpu_usage_all(%)", "cpu_core_num(个)"],
                        save_dir=save_dir),
         "memory": Monitor(ios_memory,
-                          udid=udid, pid=pid,
+                          udid=udid, pid=pid, target=target,
                           monitor_name="memory",
                           key_value=["time", "process_memory_usage(M)", "memory_total(M)"],
                           save_dir=save_dir),
         "process_info": Monitor(ios_process_info,
-                                udid=udid, bundle_id=bundle_id, pid=pid,
+                                udid=udid, bundle_id=bundle_id, pid=pid, target=target,
                                 monitor_name="process_info",
                                 key_value=["time", "num_threads(个)", "num_handles(个)"],
                                 save_dir=save_dir),
         "fps": Monitor(ios_fps,
-                       udid=udid, pid=pid,
+                       udid=udid, pid=pid, target=target,
                        monitor_name="fps",
                        key_value=["time", "fps(帧)", "frames"],
                        save_dir=save_dir),
         "gpu": Monitor(ios_gpu,
-                       udid=udid, pid=pid,
+                       udid=udid, pid=pid, target=target,
                        monitor_name="gpu",
                        key_value=["time", "gpu(%)", "gpu_renderer(%)", "gpu_tiler(%)"],
                        save_dir=save_dir),
         "disk_io": Monitor(ios_disk_io,
-                           udid=udid, pid=pid,
+                           udid=udid, pid=pid, target=target,
                            monitor_name="disk_io",
                            key_value=["time", "disk_read_rate(MB/s)", "disk_write_rate(MB/s)",
                                       "disk_read(字节)", "disk_write(字节)"],
                            save_dir=save_dir),
         "network_io": Monitor(ios_network_io,
-                              udid=udid, pid=pid,
+                              udid=udid, pid=pid, target=target,
                               monitor_name="network_io",
                               key_value=["time", "net_sent_rate(MB/s)", "net_recv_rate(MB/s)",
                                          "net_sent(字节)", "net_recv(字节)"],
@@ -1235,8 +1274,7 @@ async def ios_perf(udid: str, bundle_id: str, pid: int, save_dir: str, include_c
                                       "battery_current(mA)"],
                            save_dir=save_dir),
         "screenshot": Monitor(ios_screenshot,
-                              udid=udid,
+                              udid=udid, options=options,
                               save_dir=save_dir, is_out=False)
     }
-    run_monitors = [monitor.run() for name, monitor in monitors.items()]
-    await asyncio.gather(*run_monitors)
+    await run_monitors(monitors, watcher)
@@ -0,0 +1,416 @@
+# coding: utf-8
+"""
+启动耗时测量 — 任务类型 task_type=launch（Android / HarmonyOS / PC）。
+
+按 launch_mode 重复 launch_count 次"准备 -> 启动 -> 观察"：
+    cold : 先结束进程再启动（PC 只支持 cold：结束上一轮拉起的进程树后重新执行 launch_command）
+    warm : 进程保留、页面退出（Android BACK 键 / HarmonyOS 返回键）后再启动
+    hot  : 回到桌面（HOME 键）后再启动
+每轮结果写入 launch.csv 一行：
+    time, iteration, total(ms), displayed(ms), launch_state, peak_cpu(%), peak_memory(M)
+口径：
+    Android  : am start -W 的 WaitTime / TotalTime（即 logcat 的 Displayed），launch_state 取系统报告值
+    HarmonyOS: aa start 前后的设备时间与 hilog 首帧日志（launch_marker 正则）；
+               displayed 为首帧日志时刻，total 为 aa start 返回与首帧两者较晚者
+    PC       : displayed 为进程树出现第一个可见窗口，total 为启动后 CPU 回落到空闲
+启动后 launch_settle 秒内采样目标进程 CPU / 内存峰值。
+每轮写 launch_iteration / launch_failed 任务事件，全部结束后自动停止任务。
+"""
+import asyncio
+import csv
+import math
+import os
+import platform
+import re
+import shlex
+import shutil
+import subprocess
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from client_perf.core.lifecycle import record_event
+from client_perf.log import log as logger
+
+TASK_TYPE_PERF = "perf"
+TASK_TYPE_LAUNCH = "launch"
+TASK_TYPES = (TASK_TYPE_PERF, TASK_TYPE_LAUNCH)
+
+LAUNCH_MODES = ("cold", "warm", "hot")
+DEFAULT_LAUNCH_COUNT = 5
+DEFAULT_LAUNCH_SETTLE = 3
+# 两轮之间的间隔（秒），让设备从上一轮启动中恢复
+LAUNCH_INTERVAL = 2
+LAUNCH_TIMEOUT = 30
+# PC：启动后 CPU 连续低于该值视为启动完成
+LAUNCH_IDLE_CPU = 5.0
+# HarmonyOS 首帧日志的默认匹配规则
+DEFAULT_HARMONY_MARKER = r"(?i)first ?frame|OnFirstFrame|FirstFrameCallback"
+
+LAUNCH_KEYS = ["time", "iteration(次)", "total(ms)", "displayed(ms)", "launch_state",
+               "peak_cpu(%)", "peak_memory(M)"]
+
+
+def launch_options(options: Optional[dict]) -> Dict[str, Any]:
+    """从任务选项中取出启动测量参数并补默认值"""
+    options = options or {}
+
+    def as_int(key: str, default: int, low: int) -> int:
+        try:
+            return max(low, int(options.get(key, default)))
+        except (TypeError, ValueError):
+            return default
+
+    mode = options.get("launch_mode") or "cold"
+    return {
+        "mode": mode if mode in LAUNCH_MODES else "cold",
+        "count": as_int("launch_count", DEFAULT_LAUNCH_COUNT, 1),
+        "settle": as_int("launch_settle", DEFAULT_LAUNCH_SETTLE, 0),
+        "activity": options.get("launch_activity") or "",
+        "command": options.get("launch_command") or "",
+        "marker": options.get("launch_marker") or DEFAULT_HARMONY_MARKER,
+    }
+
+
+# ── 设备端 CPU / 内存峰值 ─────────────────────────────────────
+
+_USAGE_COMMAND = ("head -1 /proc/stat; cat /proc/{pid}/stat 2>/dev/null; "
+                  "grep VmRSS /proc/{pid}/status 2>/dev/null")
+
+
+def _parse_usage(output: str, pid: int) -> tuple[Optional[int], Optional[int], Optional[float]]:
+    """返回 (系统总 ticks, 进程 ticks, RSS MB)"""
+    total = proc = rss = None
+    for line in (output or "").split("\n"):
+        if line.startswith("cpu "):
+            total = sum(int(v) for v in line.split()[1:8] if v.isdigit())
+        elif line.startswith(f"{pid} ("):
+            fields = line[line.rfind(")") + 2:].split()
+            if len(fields) > 12:
+                proc = int(fields[11]) + int(fields[12])
+        elif line.startswith("VmRSS:"):
+            parts = line.split()
+            rss = round(int(parts[1]) / 1024, 2) if len(parts) > 1 and parts[1].isdigit() else None
+    return total, proc, rss
+
+
+def device_peak_usage(shell: Callable[[str], str], pid: int, seconds: float, cores: int) -> tuple[Optional[float], Optional[float]]:
+    """启动后 seconds 秒内每 0.5 秒采样一次，返回 (CPU 峰值 %, 内存峰值 MB)"""
+    if not pid or seconds <= 0:
+        return None, None
+    peak_cpu = peak_mem = None
+    prev = None
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        total, proc, rss = _parse_usage(shell(_USAGE_COMMAND.format(pid=pid)), pid)
+        if rss is not None:
+            peak_mem = max(peak_mem or 0.0, rss)
+        if prev and total is not None and proc is not None and total > prev[0]:
+            cpu = round(max(0, proc - prev[1]) / (total - prev[0]) * 100 * cores, 2)
+            peak_cpu = max(peak_cpu or 0.0, cpu)
+        if total is not None and proc is not None:
+            prev = (total, proc)
+        time.sleep(0.5)
+    return peak_cpu, peak_mem
+
+
+def _pidof(shell: Callable[[str], str], name: str) -> int:
+    parts = (shell(f"pidof {name}") or "").split()
+    return int(parts[0]) if parts and parts[0].isdigit() else 0
+
+
+def _cores(shell: Callable[[str], str]) -> int:
+    out = (shell("grep -c ^processor /proc/cpuinfo") or "").strip()
+    return int(out) if out.isdigit() and int(out) > 0 else 1
+
+
+# ── 平台驱动 ──────────────────────────────────────────────────
+
+class AndroidLaunchDriver:
+    """am start -W 测量"""
+
+    def __init__(self, shell: Callable[[str], str], package_name: str, activity: str = "") -> None:
+        self.shell = shell
+        self.package_name = package_name
+        self.component = activity or self._resolve_activity()
+        if "/" not in self.component:
+            self.component = f"{package_name}/{self.component}"
+        self.cores = _cores(shell)
+
+    def _resolve_activity(self) -> str:
+        out = self.shell(f"cmd package resolve-activity --brief {self.package_name}") or ""
+        for line in reversed(out.strip().split("\n")):
+            if "/" in line:
+                return line.strip()
+        raise RuntimeError(f"无法解析 {self.package_name} 的启动 Activity，请通过 launch_activity 指定")
+
+    def prepare(self, mode: str) -> None:
+        if mode == "cold":
+            self.shell(f"am force-stop {self.package_name}")
+            return
+        # warm / hot 需要进程存活，首轮前先拉起一次（不计入结果）
+        if not _pidof(self.shell, self.package_name):
+            self.shell(f"am start -W -n {self.component}")
+            time.sleep(LAUNCH_INTERVAL)
+        self.shell("input keyevent KEYCODE_BACK" if mode == "warm" else "input keyevent KEYCODE_HOME")
+
+    def launch(self, settle: float) -> Dict[str, Any]:
+        out = self.shell(f"am start -W -n {self.component}") or ""
+        if "Error" in out and "TotalTime" not in out:
+            raise RuntimeError(out.strip())
+
+        def find(key: str) -> Optional[int]:
+            match = re.search(rf"^\s*{key}:\s*(\d+)", out, re.MULTILINE)
+            return int(match.group(1)) if match else None
+
+        state = re.search(r"^\s*LaunchState:\s*(\w+)", out, re.MULTILINE)
+        pid = _pidof(self.shell, self.package_name)
+        peak_cpu, peak_mem = device_peak_usage(self.shell, pid, settle, self.cores)
+        return {
+            "total": find("WaitTime") or find("TotalTime"),
+            "displayed": find("TotalTime"),
+            "launch_state": state.group(1).lower() if state else "",
+            "peak_cpu": peak_cpu,
+            "peak_memory": peak_mem,
+        }
+
+
+class HarmonyLaunchDriver:
+    """aa start + hilog 首帧日志测量"""
+
+    def __init__(self, shell: Callable[[str], str], bundle_name: str, ability: str = "",
+                 marker: str = DEFAULT_HARMONY_MARKER) -> None:
+        self.shell = shell
+        self.bundle_name = bundle_name
+        self.ability = ability or "EntryAbility"
+        self.marker = re.compile(marker)
+        self.cores = _cores(shell)
+
+    def prepare(self, mode: str) -> None:
+        if mode == "cold":
+            self.shell(f"aa force-stop {self.bundle_name}")
+            return
+        if not _pidof(self.shell, self.bundle_name):
+            self.shell(f"aa start -a {self.ability} -b {self.bundle_name}")
+            time.sleep(LAUNCH_INTERVAL)
+        # uinput 键码：1 = HOME，2 = BACK
+        self.shell("uinput -K -d 2 -u 2" if mode == "warm" else "uinput -K -d 1 -u 1")
+
+    def _first_marker(self, begin_ms: int, timeout: float) -> Optional[int]:
+        """轮询 hilog，返回 begin_ms 之后第一条首帧日志的设备时间（毫秒）"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            for line in (self.shell("hilog -x -v epoch") or "").split("\n"):
+                head = line.split(None, 1)
+                if not head or not self.marker.search(line):
+                    continue
+                try:
+                    ts = int(float(head[0]) * 1000)
+                except ValueError:
+                    continue
+                if ts >= begin_ms:
+                    return ts
+            time.sleep(0.3)
+        return None
+
+    def launch(self, settle: float) -> Dict[str, Any]:
+        out = self.shell(f"hilog -r; B=$(date +%s%3N); aa start -a {self.ability} -b {self.bundle_name}; "
+                         f"E=$(date +%s%3N); echo \"@@ $B $E\"") or ""
+        match = re.search(r"@@ (\d+) (\d+)", out)
+        if not match or "fail" in out.lower() or "error" in out.lower():
+            raise RuntimeError(out.strip() or "aa start 无输出")
+        begin, end = int(match.group(1)), int(match.group(2))
+        frame = self._first_marker(begin, LAUNCH_TIMEOUT / 2)
+        displayed = frame - begin if frame else None
+        pid = _pidof(self.shell, self.bundle_name)
+        peak_cpu, peak_mem = device_peak_usage(self.shell, pid, settle, self.cores)
+        return {
+            "total": max(end, frame or 0) - begin,
+            "displayed": displayed,
+            "launch_state": "",
+            "peak_cpu": peak_cpu,
+            "peak_memory": peak_mem,
+        }
+
+
+def _pc_has_window(pids: set[int]) -> bool:
+    """进程树是否已有可见的顶层窗口"""
+    system = platform.system()
+    if system == "Windows":
+        import ctypes
+        from ctypes import wintypes
+
+        user32 = ctypes.windll.user32
+        found = []
+
+        @ctypes.WINFUNCTYPE(wintypes.BOOL, wintypes.HWND, wintypes.LPARAM)
+        def callback(hwnd, _):
+            if user32.IsWindowVisible(hwnd):
+                owner = wintypes.DWORD()
+                user32.GetWindowThreadProcessId(hwnd, ctypes.byref(owner))
+                if owner.value in pids:
+                    found.append(hwnd)
+                    return False
+            return True
+
+        user32.EnumWindows(callback, 0)
+        return bool(found)
+    if system == "Linux" and shutil.which("xdotool"):
+        for pid in pids:
+            res = subprocess.run(["xdotool", "search", "--onlyvisible", "--pid", str(pid)],
+                                 capture_output=True, text=True)
+            if res.stdout.strip():
+                return True
+    return False
+
+
+class PcLaunchDriver:
+    """执行 launch_command 拉起进程，测量首个可见窗口与 CPU 回落"""
+
+    def __init__(self, command: str) -> None:
+        if not command:
+            raise RuntimeError("PC 启动测量需要 launch_command")
+        self.args = shlex.split(command, posix=os.name != "nt")
+        self.proc: Optional[subprocess.Popen] = None
+
+    def _tree(self) -> list:
+        import psutil
+
+        try:
+            root = psutil.Process(self.proc.pid)
+            return [root] + root.children(recursive=True)
+        except psutil.NoSuchProcess:
+            return []
+
+    def prepare(self, mode: str) -> None:
+        self.cleanup()
+
+    def launch(self, settle: float) -> Dict[str, Any]:
+        import psutil
+
+        start = time.monotonic()
+        self.proc = subprocess.Popen(self.args)
+        displayed = total = None
+        peak_cpu = peak_mem = 0.0
+        idle_ticks = 0
+        # 无法检测窗口（如 Linux 未安装 xdotool）时只按 CPU 回落判断
+        can_detect = platform.system() == "Windows" or bool(shutil.which("xdotool"))
+        deadline = start + LAUNCH_TIMEOUT
+        while time.monotonic() < deadline:
+            tree = self._tree()
+            if not tree:
+                break
+            if displayed is None and can_detect and _pc_has_window({p.pid for p in tree}):
+                displayed = round((time.monotonic() - start) * 1000)
+            cpu = mem = 0.0
+            for p in tree:
+                try:
+                    cpu += p.cpu_percent(interval=None)
+                    mem += p.memory_info().rss / 1024 / 1024
+                except psutil.Error:
+                    continue
+            peak_cpu, peak_mem = max(peak_cpu, cpu), max(peak_mem, mem)
+            # 首个窗口出现后 CPU 连续两次低于阈值视为启动完成
+            idle_ticks = idle_ticks + 1 if cpu < LAUNCH_IDLE_CPU and (displayed is not None or not can_detect) else 0
+            if idle_ticks >= 2 and total is None:
+                total = round((time.monotonic() - start) * 1000)
+            if total is not None and time.monotonic() - start >= total / 1000 + settle:
+                break
+            time.sleep(0.25)
+        return {
+            "total": total,
+            "displayed": displayed,
+            "launch_state": "cold",
+            "peak_cpu": round(peak_cpu, 2),
+            "peak_memory": round(peak_mem, 2),
+        }
+
+    def cleanup(self) -> None:
+        if self.proc is None:
+            return
+        import psutil
+
+        for p in reversed(self._tree()):
+            try:
+                p.kill()
+            except psutil.Error:
+                pass
+        self.proc = None
+
+
+# ── 执行 ──────────────────────────────────────────────────────
+
+async def run_launch(driver, save_dir: str, options: Optional[dict], task_id: Optional[int] = None) -> None:
+    """按选项重复测量并写 launch.csv，结束后把任务标记为已停止"""
+    opts = launch_options(options)
+    path = Path(save_dir) / "launch.csv"
+    keys = [k.split("(")[0] for k in LAUNCH_KEYS]
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        csv.writer(f).writerow(LAUNCH_KEYS)
+
+    try:
+        for i in range(1, opts["count"] + 1):
+            try:
+                await asyncio.to_thread(driver.prepare, opts["mode"])
+                await asyncio.sleep(LAUNCH_INTERVAL)
+                res = await asyncio.wait_for(asyncio.to_thread(driver.launch, opts["settle"]),
+                                             timeout=LAUNCH_TIMEOUT + opts["settle"])
+            except Exception as e:
+                logger.error(f"[launch] 第 {i} 次启动失败: {e}")
+                record_event(save_dir, "launch_failed", iteration=i, error=str(e))
+                continue
+            res.update(time=int(time.time()), iteration=i)
+            with open(path, "a", encoding="utf-8", newline="") as f:
+                csv.writer(f).writerow([res.get(k, "") if res.get(k) is not None else "" for k in keys])
+            record_event(save_dir, "launch_iteration", iteration=i, mode=opts["mode"],
+                         total=res.get("total"), displayed=res.get("displayed"))
+    finally:
+        if hasattr(driver, "cleanup"):
+            await asyncio.to_thread(driver.cleanup)
+        if task_id:
+            try:
+                from client_perf.db import submit_write
+                await submit_write("stop_task", task_id)
+            except Exception as e:
+                logger.error(f"[launch] 标记任务 {task_id} 停止失败: {e}")
+
+
+# ── 对比 ──────────────────────────────────────────────────────
+
+def _percentile(sorted_vals: list[float], q: float) -> float:
+    pos = (len(sorted_vals) - 1) * q
+    low, high = math.floor(pos), math.ceil(pos)
+    return sorted_vals[low] + (sorted_vals[high] - sorted_vals[low]) * (pos - low)
+
+
+def _distribution(vals: list[float]) -> Optional[Dict[str, float]]:
+    if not vals:
+        return None
+    vals = sorted(vals)
+    mean = sum(vals) / len(vals)
+    std = (sum((v - mean) ** 2 for v in vals) / (len(vals) - 1)) ** 0.5 if len(vals) > 1 else 0.0
+    return {"count": len(vals), "avg": round(mean, 2), "p50": round(_percentile(vals, 0.5), 2),
+            "p90": round(_percentile(vals, 0.9), 2), "min": vals[0], "max": vals[-1], "stdev": round(std, 2)}
+
+
+def launch_summary(rows: list[dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    由 launch.csv 记录汇总每轮启动耗时的分布：
+    {"iterations": n, "total": {"avg", "p50", "p90", "min", "max", "stdev", "count"}, "displayed": {...}, "values": {...}}
+    """
+    if not rows:
+        return None
+    values: Dict[str, list[float]] = {"total": [], "displayed": []}
+    for row in rows:
+        # 记录按完整表头取键（total(ms)），按单位前的列名匹配
+        for k, v in row.items():
+            key = k.split("(")[0]
+            if key in values and isinstance(v, (int, float)):
+                values[key].append(float(v))
+    return {
+        "iterations": len(rows),
+        "total": _distribution(values["total"]),
+        "displayed": _distribution(values["displayed"]),
+        "values": values,
+    }
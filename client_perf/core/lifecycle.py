@@ -0,0 +1,342 @@
+# coding: utf-8
+"""
+目标进程生命周期跟踪 — 每个采集任务一个 LifecycleWatcher。
+
+* 目标进程退出检测尽量廉价：
+    - Linux PC：pidfd_open + 事件循环 add_reader（内核在进程退出时唤醒，零轮询）；
+    - 其他 PC：psutil 按 (pid, create_time) 判断，防止 pid 复用误判；
+    - 设备：每轮一次 pidof（一次 shell 往返同时完成存活判断和重新解析）。
+* 目标退出后按任务选项 on_target_exit 处理：
+    - stop     ：记录事件、停止全部 Monitor 并把任务标记为已停止；
+    - reattach ：暂停采集，按包名/进程名重新解析 pid，找到后继续采集，
+                 并记录一段明确的 gap（exit_ts ~ reattach_ts）。
+* 事件写入 <save_dir>/events.jsonl（非 CSV，DataCollect 不会读取），
+  由 /task_events/ 接口对外提供。
+
+用法：
+    target = ProcessTarget(pid)
+    watcher = LifecycleWatcher(target, save_dir, probe=..., resolver=..., mode="reattach")
+    monitors = {"cpu": Monitor(cpu, pid=pid, target=target, ...), ...}
+    await run_monitors(monitors, watcher)
+"""
+import asyncio
+import json
+import os
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any, Optional
+
+from client_perf.log import log as logger
+
+ON_EXIT_STOP = "stop"
+ON_EXIT_REATTACH = "reattach"
+ON_TARGET_EXIT_MODES = (ON_EXIT_STOP, ON_EXIT_REATTACH)
+DEFAULT_ON_TARGET_EXIT = ON_EXIT_STOP
+
+EVENTS_FILE = "events.jsonl"
+
+
+# ── 事件记录 ──────────────────────────────────────────────────
+
+def record_event(save_dir: str, event: str, **fields: Any) -> dict[str, Any]:
+    """追加一条任务事件"""
+    item = {"time": int(time.time()), "event": event, **fields}
+    path = Path(save_dir) / EVENTS_FILE
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(item, ensure_ascii=False) + "\n")
+    logger.info(f"[lifecycle] {item}")
+    return item
+
+
+def read_events(save_dir: str) -> list[dict[str, Any]]:
+    """读取任务事件；文件不存在时返回空列表"""
+    path = Path(save_dir) / EVENTS_FILE
+    if not path.exists():
+        return []
+    events = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                events.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return events
+
+
+# ── 采集目标 ──────────────────────────────────────────────────
+
+class ProcessTarget:
+    """
+    Monitor 之间共享的采集目标。
+    Monitor 每轮从这里读取最新 pid；alive 为 False 时暂停采集。
+    """
+
+    def __init__(self, pid: int) -> None:
+        self.pid = int(pid or 0)
+        self.alive = True
+        self._watcher: Optional["LifecycleWatcher"] = None
+
+    async def confirm_alive(self) -> bool:
+        """采集出错时调用：立即检查一次目标是否还活着"""
+        if self._watcher is None:
+            return True
+        return await self._watcher.check()
+
+
+# ── 存活探测 ──────────────────────────────────────────────────
+
+def pc_probe(pid: int) -> Callable[[int], bool]:
+    """PC 存活探测：按 (pid, create_time) 判断，pid 被复用也能识别"""
+    import psutil
+
+    create_times: dict[int, float] = {}
+
+    def probe(p: int) -> bool:
+        try:
+            proc = psutil.Process(p)
+            ct = proc.create_time()
+            if create_times.setdefault(p, ct) != ct:
+                return False
+            return proc.status() != psutil.STATUS_ZOMBIE
+        except (psutil.NoSuchProcess, psutil.ZombieProcess):
+            return False
+        except psutil.AccessDenied:
+            return psutil.pid_exists(p)
+
+    probe(pid)
+    return probe
+
+
+def pc_resolver(pid: int) -> Optional[Callable[[], int]]:
+    """PC 重新解析：按原进程的名称和可执行文件路径查找新启动的进程"""
+    import psutil
+
+    try:
+        proc = psutil.Process(pid)
+        name, exe = proc.name(), proc.exe()
+        started = proc.create_time()
+    except (psutil.Error, OSError):
+        return None
+
+    def resolve() -> int:
+        best = None
+        for p in psutil.process_iter(["name", "exe", "create_time"]):
+            info = p.info
+            if info["name"] != name or (exe and info["exe"] and info["exe"] != exe):
+                continue
+            if (info["create_time"] or 0) <= started:
+                continue
+            # 多个候选时取最早启动的（通常是主进程）
+            if best is None or info["create_time"] < best[1]:
+                best = (p.pid, info["create_time"])
+        return best[0] if best else 0
+
+    return resolve
+
+
+def pidof_probe(shell: Callable[[str], str], package_name: str) -> tuple[Callable[[int], bool], Callable[[], int]]:
+    """
+    设备端探测：一次 pidof 同时完成存活判断和重新解析。
+    返回 (probe, resolver)。
+    """
+
+    def pids() -> list[int]:
+        output = shell(f"pidof {package_name} 2>/dev/null") or ""
+        return [int(p) for p in output.split() if p.isdigit()]
+
+    def probe(pid: int) -> bool:
+        return pid in pids()
+
+    def resolve() -> int:
+        found = pids()
+        return found[0] if found else 0
+
+    return probe, resolve
+
+
+def proc_dir_probe(shell: Callable[[str], str]) -> Callable[[int], bool]:
+    """设备端探测（没有包名时）：检查 /proc/<pid> 是否存在"""
+
+    def probe(pid: int) -> bool:
+        return bool((shell(f"ls -d /proc/{pid} 2>/dev/null") or "").strip())
+
+    return probe
+
+
+# ── 生命周期跟踪 ──────────────────────────────────────────────
+
+class LifecycleWatcher:
+    """
+    参数
+    ----
+    target      : 共享的 ProcessTarget
+    save_dir    : 任务目录（写 events.jsonl）
+    probe       : 同步函数 probe(pid) -> bool，在线程中执行
+    resolver    : 同步函数 resolver() -> 新 pid（0 表示未找到），reattach 模式使用
+    mode        : on_target_exit 选项，stop / reattach
+    task_id     : stop 模式下用于把任务标记为已停止
+    interval    : 轮询间隔（秒）；pidfd 可用时仅作为停止检查间隔
+    on_reattach : 重新附着后的回调 on_reattach(new_pid)
+    """
+
+    def __init__(
+        self,
+        target: ProcessTarget,
+        save_dir: str,
+        probe: Callable[[int], bool],
+        resolver: Optional[Callable[[], int]] = None,
+        mode: str = DEFAULT_ON_TARGET_EXIT,
+        task_id: Optional[int] = None,
+        interval: float = 1.0,
+        use_pidfd: bool = False,
+        on_reattach: Optional[Callable[[int], Any]] = None,
+    ) -> None:
+        self.target = target
+        self.save_dir = save_dir
+        self.probe = probe
+        self.resolver = resolver
+        self.mode = mode if mode in ON_TARGET_EXIT_MODES else DEFAULT_ON_TARGET_EXIT
+        if self.mode == ON_EXIT_REATTACH and resolver is None:
+            logger.warning("[lifecycle] 无法重新解析目标进程，on_target_exit 退化为 stop")
+            self.mode = ON_EXIT_STOP
+        self.task_id = task_id
+        self.interval = interval
+        self.use_pidfd = use_pidfd and hasattr(os, "pidfd_open")
+        self.on_reattach = on_reattach
+
+        self.monitors: dict[str, Any] = {}
+        self._lock = asyncio.Lock()
+        self._stopped = asyncio.Event()
+        self._exit_ts = 0
+        target._watcher = self
+
+    # ── 公开接口 ──────────────────────────────────────────────
+
+    async def check(self) -> bool:
+        """立即探测一次；发现退出时按模式处理。返回目标是否存活"""
+        async with self._lock:
+            if not self.target.alive:
+                return False
+            pid = self.target.pid
+            try:
+                alive = await asyncio.to_thread(self.probe, pid)
+            except Exception as e:
+                # 探测本身失败（设备断连等）不等于进程退出
+                logger.warning(f"[lifecycle] 探测 pid={pid} 失败: {e}")
+                return True
+            if not alive:
+                await self._on_exit(pid)
+            return alive
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    async def run(self, monitors: dict[str, Any]) -> None:
+        self.monitors = monitors
+        while not self._stopped.is_set():
+            if self.target.alive:
+                if await self._wait_exit():
+                    await self.check()
+            else:
+                await self._try_reattach()
+
+    # ── 内部实现 ──────────────────────────────────────────────
+
+    async def _wait_exit(self) -> bool:
+        """等待一个周期；返回 True 表示需要探测"""
+        if not self.use_pidfd:
+            await self._sleep(self.interval)
+            return True
+        try:
+            fd = os.pidfd_open(self.target.pid)
+        except OSError:
+            # 进程已不存在（ESRCH）或内核不支持：交给 probe 判定
+            self.use_pidfd = False
+            return True
+        loop = asyncio.get_running_loop()
+        exited = asyncio.Event()
+        loop.add_reader(fd, exited.set)
+        try:
+            pid = self.target.pid
+            while not self._stopped.is_set() and not exited.is_set() and self.target.pid == pid:
+                await self._sleep(self.interval, exited)
+            return exited.is_set()
+        finally:
+            loop.remove_reader(fd)
+            os.close(fd)
+
+    async def _sleep(self, seconds: float, wake: Optional[asyncio.Event] = None) -> None:
+        waiters = [asyncio.ensure_future(self._stopped.wait())]
+        if wake is not None:
+            waiters.append(asyncio.ensure_future(wake.wait()))
+        await asyncio.wait(waiters, timeout=seconds, return_when=asyncio.FIRST_COMPLETED)
+        for w in waiters:
+            w.cancel()
+
+    async def _on_exit(self, pid: int) -> None:
+        self.target.alive = False
+        self._exit_ts = int(time.time())
+        record_event(self.save_dir, "target_exit", pid=pid)
+        if self.mode == ON_EXIT_STOP:
+            await self._stop_task(pid)
+
+    async def _stop_task(self, pid: int) -> None:
+        record_event(self.save_dir, "task_auto_stop", pid=pid)
+        for monitor in self.monitors.values():
+            monitor.stop()
+        self.stop()
+        if self.task_id:
+            try:
+                from client_perf.db import submit_write
+                await submit_write("stop_task", self.task_id)
+            except Exception as e:
+                logger.error(f"[lifecycle] 标记任务 {self.task_id} 停止失败: {e}")
+
+    async def _try_reattach(self) -> None:
+        try:
+            new_pid = await asyncio.to_thread(self.resolver)
+        except Exception as e:
+            logger.warning(f"[lifecycle] 重新解析目标进程失败: {e}")
+            new_pid = 0
+        if not new_pid:
+            await self._sleep(self.interval)
+            return
+        async with self._lock:
+            old_pid = self.target.pid
+            self.target.pid = int(new_pid)
+            self.target.alive = True
+            if self.on_reattach is not None:
+                try:
+                    await asyncio.to_thread(self.on_reattach, self.target.pid)
+                except Exception as e:
+                    logger.warning(f"[lifecycle] on_reattach 回调失败: {e}")
+            now = int(time.time())
+            record_event(self.save_dir, "target_reattach", old_pid=old_pid, pid=self.target.pid)
+            record_event(self.save_dir, "gap", start=self._exit_ts, end=now)
+
+
+def device_watcher(target: ProcessTarget, save_dir: str, shell: Callable[[str], str],
+                   package_name: str = "", options: Optional[dict] = None,
+                   task_id: Optional[int] = None, **kwargs: Any) -> LifecycleWatcher:
+    """Android / HarmonyOS 通用：有包名时用 pidof 探测并可重新解析，否则只检查 /proc/<pid>"""
+    if package_name:
+        probe, resolver = pidof_probe(shell, package_name)
+    else:
+        probe, resolver = proc_dir_probe(shell), None
+    return LifecycleWatcher(
+        target, save_dir, probe, resolver,
+        mode=(options or {}).get("on_target_exit", DEFAULT_ON_TARGET_EXIT),
+        task_id=task_id, **kwargs,
+    )
+
+
+async def run_monitors(monitors: dict[str, Any], watcher: Optional[LifecycleWatcher] = None) -> None:
+    """并发运行全部 Monitor（及生命周期跟踪），直到全部停止"""
+    tasks = [monitor.run() for monitor in monitors.values()]
+    if watcher is not None:
+        tasks.append(watcher.run(monitors))
+    await asyncio.gather(*tasks)
@@ -31,6 +31,9 @@ class Monitor:
     monitor_name: CSV 文件名（不含扩展名），默认取 func.__name__
     save_dir    : CSV 保存目录
     is_out      : 是否写 CSV（截图等不需要写 CSV 时传 False）
+    interval    : 采集周期（秒），默认 1；慢速指标（如 memory_detail）可调大
+    target      : 可选的 ProcessTarget（见 lifecycle.py）；每轮用其最新 pid 覆盖 kwargs["pid"]，
+                  目标进程退出期间暂停采集
     """
 
     def __init__(self, func: Callable[..., Coroutine[Any, Any, dict | None]], **kwargs: Any) -> None:
@@ -43,6 +46,8 @@ class Monitor:
         self.name: str = kwargs.pop("monitor_name", None) or func.__name__
         self.save_dir: str | None = kwargs.get("save_dir")
         self.is_out: bool = kwargs.get("is_out", True)
+        self.target = kwargs.pop("target", None)
+        self.interval: float = kwargs.pop("interval", 1.0)
 
         self._keys: list[str] = [k.split("(")[0] for k in self.key_value]
 
@@ -70,6 +75,11 @@ class Monitor:
         while not self._stop_event.is_set():
             t0 = time.monotonic()
             try:
+                if self.target is not None:
+                    if not self.target.alive:
+                        continue
+                    if "pid" in call_kwargs:
+                        call_kwargs["pid"] = self.target.pid
                 res = await self.func(**call_kwargs)
                 if self.is_out and res and self.csv_path:
                     with open(self.csv_path, "a", encoding="utf-8", newline="") as f:
@@ -77,8 +87,10 @@ class Monitor:
                             [res.get(k, "") for k in self._keys]
                         )
             except Exception:
-                logger.error(traceback.format_exc())
+                # 目标进程已退出导致的异常不再刷屏
+                if self.target is None or await self.target.confirm_alive():
+                    logger.error(traceback.format_exc())
             finally:
                 elapsed = time.monotonic() - t0
-                if elapsed < 1.0:
-                    await asyncio.sleep(1.0 - elapsed)
+                if elapsed < self.interval:
+                    await asyncio.sleep(self.interval - elapsed)
@@ -0,0 +1,95 @@
+# coding: utf-8
+"""
+设备应用列表缓存 — Android / HarmonyOS 共用。
+
+* 运行状态通过一次 `ps -A` 快照在本机与包名做 join，不再逐个包 `pidof`；
+* 包列表（pm list packages / bm dump）按设备缓存：
+    - 超过 PACKAGE_CACHE_TTL 或调用方传 refresh=True 时重新获取；
+    - ps 快照中出现了缓存时不认识的应用进程（多半是新装的应用）时自动失效。
+  未命中时包列表与 ps 在同一次 shell 往返中取回（以 PS_MARKER 分隔）。
+"""
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+PACKAGE_CACHE_TTL = 300
+PS_MARKER = "__CLIENT_PERF_PS__"
+PS_COMMAND = "ps -A -o USER,PID,NAME 2>/dev/null || ps -A"
+
+
+def with_ps(list_cmd: str) -> str:
+    """把包列表命令和 ps 快照拼成一次 shell 调用"""
+    return f"{list_cmd}; echo {PS_MARKER}; {PS_COMMAND}"
+
+
+def split_ps(output: str) -> Tuple[str, str]:
+    """拆分 with_ps() 的输出，返回 (包列表部分, ps 部分)"""
+    head, _, tail = (output or "").partition(PS_MARKER)
+    return head, tail
+
+
+def parse_ps(output: str) -> Dict[str, int]:
+    """解析 ps 输出，返回 {进程名: pid}；同名进程取第一个（与 pidof 首个结果一致）"""
+    running: Dict[str, int] = {}
+    for line in (output or "").strip().split("\n"):
+        parts = line.split()
+        # 兼容 "USER PID NAME" 与老版本 ps 的 "USER PID PPID ... NAME"
+        if len(parts) < 3 or not parts[1].isdigit():
+            continue
+        running.setdefault(parts[-1], int(parts[1]))
+    return running
+
+
+def _looks_like_app(name: str) -> bool:
+    return "." in name and "/" not in name and not name.startswith("[")
+
+
+class PackageCache:
+    """按设备缓存包列表：{serial: (获取时间, 包名列表, 获取时已存在的进程名)}"""
+
+    def __init__(self, ttl: float = PACKAGE_CACHE_TTL) -> None:
+        self.ttl = ttl
+        self._entries: Dict[str, Tuple[float, List[str], frozenset]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, serial: str, running: Dict[str, int]) -> Optional[List[str]]:
+        """缓存有效且与当前 ps 快照一致时返回包名列表，否则返回 None"""
+        with self._lock:
+            entry = self._entries.get(serial)
+        if not entry:
+            return None
+        ts, packages, known = entry
+        if time.monotonic() - ts > self.ttl:
+            return None
+        package_set = set(packages)
+        for name in running:
+            if name in known or not _looks_like_app(name):
+                continue
+            if name.split(":")[0] not in package_set:
+                return None
+        return packages
+
+    def put(self, serial: str, packages: List[str], running: Dict[str, int]) -> None:
+        with self._lock:
+            self._entries[serial] = (time.monotonic(), list(packages), frozenset(running))
+
+    def invalidate(self, serial: str) -> None:
+        with self._lock:
+            self._entries.pop(serial, None)
+
+
+def join_packages(packages: List[str], running: Dict[str, int]) -> List[Dict]:
+    """包名列表与 ps 快照 join，返回应用列表（运行中的排在前面）"""
+    result = []
+    for pkg in packages:
+        pid = running.get(pkg, 0)
+        result.append({
+            "package_name": pkg,
+            "pid": pid,
+            "name": pkg,
+            "running": pid > 0,
+            # 兼容 iOS 字段
+            "bundle_id": pkg,
+        })
+    result.sort(key=lambda x: (-int(x['running']), x['name']))
+    return result
@@ -0,0 +1,230 @@
+# coding: utf-8
+"""
+包级多进程聚合采集 — Android / HarmonyOS 的 include_child 模式。
+
+一个应用往往有 :remote / :push / 独立沙箱等多个进程，只采主进程会低估资源占用。
+PackageSampler 每轮只发起一次 shell 往返：
+    * 通过一次 ps 找出属于该包 UID（或进程名为 <包名> / <包名>:*）的全部进程；
+    * 同一条命令里批量读取各进程的 /proc/<pid>/stat、status、io 以及 /proc/stat；
+    * 在本机计算差值并聚合 CPU、内存（VmRSS 之和）、线程数、磁盘 IO，
+      同时保留每个进程的明细（package_procs.csv 的 procs 列，JSON）。
+
+cpu / memory / process_info / disk_io / package_procs 五个 Monitor 共享同一个
+PackageSampler，同一轮内后到的 Monitor 直接复用最近一次采样结果。
+
+用法：
+    sampler = PackageSampler(shell, package_name)
+    Monitor(package_cpu, sampler=sampler, pid=pid, monitor_name="cpu", ...)
+"""
+import asyncio
+import json
+import threading
+import time
+from collections.abc import Callable
+from typing import Any, Dict, Optional
+
+MB_CONVERSION = 1024 * 1024
+BLOCK_MARKER = "@@"
+# 同一轮内多个 Monitor 复用采样结果的时间窗口（秒）
+SAMPLE_REUSE_WINDOW = 0.5
+
+
+def _package_command(package_name: str, pid: int) -> str:
+    """构造一次往返的采样命令"""
+    pkg = package_name
+    return (
+        "head -1 /proc/stat; "
+        "grep -c ^processor /proc/cpuinfo; "
+        f"P={int(pid or 0)}; "
+        f"[ \"$P\" -gt 0 ] || P=$(pidof {pkg} | cut -d' ' -f1); "
+        "U=$(stat -c %u /proc/$P 2>/dev/null); "
+        "ps -A -o PID,UID,NAME | while read p u n; do "
+        f"case \"$n\" in {pkg}|{pkg}:*) ;; *) [ -n \"$U\" ] && [ \"$u\" = \"$U\" ] || continue;; esac; "
+        f"echo \"{BLOCK_MARKER} $p $n\"; "
+        "cat /proc/$p/stat /proc/$p/status /proc/$p/io 2>/dev/null; "
+        "done"
+    )
+
+
+def _parse_sys_cpu(line: str) -> Optional[Dict[str, int]]:
+    parts = line.split()
+    if len(parts) < 5 or parts[0] != "cpu":
+        return None
+    try:
+        vals = [int(v) for v in parts[1:8]]
+    except ValueError:
+        return None
+    return {"idle": vals[3], "total": sum(vals)}
+
+
+def _parse_output(output: str) -> tuple[Optional[Dict[str, int]], int, Dict[int, Dict[str, Any]]]:
+    """解析采样命令输出，返回 (系统 CPU, 核心数, {pid: 进程数据})"""
+    lines = (output or "").split("\n")
+    sys_cpu = _parse_sys_cpu(lines[0]) if lines else None
+    cores = int(lines[1].strip()) if len(lines) > 1 and lines[1].strip().isdigit() else 1
+
+    procs: Dict[int, Dict[str, Any]] = {}
+    current: Optional[Dict[str, Any]] = None
+    for line in lines[2:]:
+        if line.startswith(BLOCK_MARKER + " "):
+            parts = line.split(None, 2)
+            if len(parts) < 2 or not parts[1].isdigit():
+                current = None
+                continue
+            current = {"pid": int(parts[1]), "name": parts[2].strip() if len(parts) > 2 else ""}
+            procs[current["pid"]] = current
+            continue
+        if current is None:
+            continue
+        if line.startswith(f"{current['pid']} ("):
+            # comm 可能含空格，取最后一个 ')' 之后的字段：state 为第 0 个，utime/stime 为第 11/12 个
+            fields = line[line.rfind(")") + 2:].split()
+            if len(fields) > 12:
+                current["cpu_ticks"] = int(fields[11]) + int(fields[12])
+            continue
+        key, sep, value = line.partition(":")
+        if not sep:
+            continue
+        key, value = key.strip(), value.strip()
+        if key == "VmRSS":
+            current["rss_kb"] = int(value.split()[0]) if value.split() else 0
+        elif key == "Threads":
+            current["threads"] = int(value) if value.isdigit() else 0
+        elif key in ("read_bytes", "write_bytes") and value.isdigit():
+            current[key] = int(value)
+    return sys_cpu, cores, procs
+
+
+class PackageSampler:
+    """按包聚合的多进程采样器，线程安全，同一轮内共享结果"""
+
+    def __init__(self, shell: Callable[[str], str], package_name: str) -> None:
+        self.shell = shell
+        self.package_name = package_name
+        self._lock = threading.Lock()
+        self._prev: Optional[tuple[float, Optional[Dict[str, int]], Dict[int, Dict[str, Any]]]] = None
+        self._latest: Optional[Dict[str, Any]] = None
+
+    def sample(self, pid: int = 0) -> Optional[Dict[str, Any]]:
+        """返回最近一次聚合结果；第一次采样只建立基线，返回 None"""
+        with self._lock:
+            if self._prev is not None and time.monotonic() - self._prev[0] < SAMPLE_REUSE_WINDOW:
+                return self._latest
+            now = time.monotonic()
+            sys_cpu, cores, procs = _parse_output(self.shell(_package_command(self.package_name, pid)))
+            prev, self._prev = self._prev, (now, sys_cpu, procs)
+            self._latest = self._aggregate(prev, self._prev, cores) if prev is not None else None
+            return self._latest
+
+    @staticmethod
+    def _aggregate(prev, cur, cores: int) -> Dict[str, Any]:
+        prev_ts, prev_sys, prev_procs = prev
+        cur_ts, cur_sys, cur_procs = cur
+        elapsed = max(cur_ts - prev_ts, 1e-6)
+        sys_delta = (cur_sys["total"] - prev_sys["total"]) if cur_sys and prev_sys else 0
+        idle_delta = (cur_sys["idle"] - prev_sys["idle"]) if cur_sys and prev_sys else 0
+
+        breakdown = []
+        totals = {"cpu_usage": 0.0, "rss_kb": 0, "threads": 0, "read_rate": 0.0, "write_rate": 0.0,
+                  "read_bytes": 0, "write_bytes": 0}
+        for pid, proc in cur_procs.items():
+            old = prev_procs.get(pid)
+            cpu = 0.0
+            read_rate = write_rate = 0.0
+            # 新出现的进程本轮只建立基线，避免把累计值当作增量
+            if old is not None:
+                if sys_delta > 0 and "cpu_ticks" in proc and "cpu_ticks" in old:
+                    cpu = max(0, proc["cpu_ticks"] - old["cpu_ticks"]) / sys_delta * 100 * cores
+                if "read_bytes" in proc and "read_bytes" in old:
+                    read_rate = max(0, proc["read_bytes"] - old["read_bytes"]) / MB_CONVERSION / elapsed
+                if "write_bytes" in proc and "write_bytes" in old:
+                    write_rate = max(0, proc["write_bytes"] - old["write_bytes"]) / MB_CONVERSION / elapsed
+            totals["cpu_usage"] += cpu
+            totals["rss_kb"] += proc.get("rss_kb", 0)
+            totals["threads"] += proc.get("threads", 0)
+            totals["read_rate"] += read_rate
+            totals["write_rate"] += write_rate
+            totals["read_bytes"] += proc.get("read_bytes", 0)
+            totals["write_bytes"] += proc.get("write_bytes", 0)
+            breakdown.append({
+                "pid": pid,
+                "name": proc["name"],
+                "cpu": round(cpu, 2),
+                "memory": round(proc.get("rss_kb", 0) / 1024, 2),
+                "threads": proc.get("threads", 0),
+                "disk_read_rate": round(read_rate, 4),
+                "disk_write_rate": round(write_rate, 4),
+            })
+        breakdown.sort(key=lambda x: -x["cpu"])
+        totals["cpu_usage_all"] = round((1 - idle_delta / sys_delta) * 100, 2) if sys_delta > 0 else 0.0
+        totals["cpu_core_num"] = cores
+        totals["procs"] = breakdown
+        totals["time"] = int(time.time())
+        return totals
+
+
+# ── Monitor 采集函数 ──────────────────────────────────────────
+
+async def _sample(sampler: PackageSampler, pid: int) -> Optional[Dict[str, Any]]:
+    return await asyncio.wait_for(asyncio.to_thread(sampler.sample, pid), timeout=15)
+
+
+async def package_cpu(sampler: PackageSampler, pid: int = 0) -> Optional[Dict]:
+    data = await _sample(sampler, pid)
+    if not data:
+        return None
+    return {"cpu_usage": round(data["cpu_usage"], 2), "cpu_usage_all": data["cpu_usage_all"],
+            "cpu_core_num": data["cpu_core_num"], "time": data["time"]}
+
+
+async def package_memory(sampler: PackageSampler, pid: int = 0) -> Optional[Dict]:
+    data = await _sample(sampler, pid)
+    if not data:
+        return None
+    return {"process_memory_usage": round(data["rss_kb"] / 1024, 2), "time": data["time"]}
+
+
+async def package_process_info(sampler: PackageSampler, pid: int = 0) -> Optional[Dict]:
+    data = await _sample(sampler, pid)
+    if not data:
+        return None
+    return {"num_threads": data["threads"], "num_processes": len(data["procs"]), "time": data["time"]}
+
+
+async def package_disk_io(sampler: PackageSampler, pid: int = 0) -> Optional[Dict]:
+    data = await _sample(sampler, pid)
+    if not data:
+        return None
+    return {"disk_read_rate": round(data["read_rate"], 4), "disk_write_rate": round(data["write_rate"], 4),
+            "disk_read": data["read_bytes"], "disk_write": data["write_bytes"], "time": data["time"]}
+
+
+async def package_procs(sampler: PackageSampler, pid: int = 0) -> Optional[Dict]:
+    data = await _sample(sampler, pid)
+    if not data:
+        return None
+    return {"process_count": len(data["procs"]),
+            "procs": json.dumps(data["procs"], ensure_ascii=False, separators=(",", ":")),
+            "time": data["time"]}
+
+
+def package_monitors(sampler: PackageSampler, monitor_cls, save_dir: str, **common: Any) -> Dict[str, Any]:
+    """构造包聚合模式下替换 cpu / memory / process_info / disk_io 的 Monitor，外加进程明细"""
+    return {
+        "cpu": monitor_cls(package_cpu, sampler=sampler, monitor_name="cpu",
+                           key_value=["time", "cpu_usage(%)", "cpu_usage_all(%)", "cpu_core_num(个)"],
+                           save_dir=save_dir, **common),
+        "memory": monitor_cls(package_memory, sampler=sampler, monitor_name="memory",
+                              key_value=["time", "process_memory_usage(M)"],
+                              save_dir=save_dir, **common),
+        "process_info": monitor_cls(package_process_info, sampler=sampler, monitor_name="process_info",
+                                    key_value=["time", "num_threads(个)", "num_processes(个)"],
+                                    save_dir=save_dir, **common),
+        "disk_io": monitor_cls(package_disk_io, sampler=sampler, monitor_name="disk_io",
+                               key_value=["time", "disk_read_rate(MB/s)", "disk_write_rate(MB/s)",
+                                          "disk_read(字节)", "disk_write(字节)"],
+                               save_dir=save_dir, **common),
+        "package_procs": monitor_cls(package_procs, sampler=sampler, monitor_name="package_procs",
+                                     key_value=["time", "process_count(个)", "procs"],
+                                     save_dir=save_dir, **common),
+    }
@@ -10,7 +10,16 @@ import psutil
 import pynvml
 from pathlib import Path
 from client_perf.log import log as logger
+from client_perf.core.launch import PcLaunchDriver, launch_options, run_launch
+from client_perf.core.linux_gpu import LinuxGpuSampler
+from client_perf.core.lifecycle import (
+    LifecycleWatcher, ProcessTarget, pc_probe, pc_resolver, run_monitors, DEFAULT_ON_TARGET_EXIT,
+)
 from client_perf.core.monitor import Monitor
+from client_perf.core.block_io import BLOCK_IO_KEYS, BlockIoSampler
+from client_perf.core.host_contention import HOST_CONTENTION_KEYS, HostContentionSampler, host_contention
+from client_perf.core.thread_cpu import THREAD_CPU_KEYS, ThreadCpuSampler, pc_thread_cpu, thread_options
+from client_perf.core.screenshot import save_screenshot, screenshot_busy
 
 MB_CONVERSION = 1024 * 1024
 
@@ -139,19 +148,33 @@ async def sys_info():
     return await asyncio.wait_for(asyncio.to_thread(real_func), timeout=10)
 
 
+# 进程表快照缓存：pids() 与 process_tree() 共用，短时间内重复请求不再重新扫描进程表
+PROCESS_SNAPSHOT_TTL = 2
+_process_snapshot_cache = (0.0, [])
+_process_snapshot_lock = threading.Lock()
+
+
+def _process_snapshot():
+    """一次 process_iter 取全所有属性，返回 [{name, pid, ppid, cmd, username}]"""
+    global _process_snapshot_cache
+    with _process_snapshot_lock:
+        ts, snapshot = _process_snapshot_cache
+        if time.monotonic() - ts < PROCESS_SNAPSHOT_TTL:
+            return snapshot
+        snapshot = []
+        for proc in psutil.process_iter(attrs=['name', 'pid', 'ppid', 'cmdline', 'username']):
+            info = proc.info
+            snapshot.append({"name": info['name'], "pid": info['pid'], "ppid": info['ppid'],
+                             "cmd": info['cmdline'], "username": info['username']})
+        _process_snapshot_cache = (time.monotonic(), snapshot)
+        return snapshot
+
+
 async def pids():
     def real_func():
-        process_list = []
-        for proc in psutil.process_iter(attrs=['name', 'pid', 'cmdline', 'username']):
-            try:
-                if proc.is_running():
-                    process_list.append(
-                        {"name": proc.info['name'], "pid": proc.info['pid'], "cmd": proc.info['cmdline'],
-                         "username": proc.username()})
-            except Exception as e:
-                pass
-        process_list.sort(key=lambda x: x['name'])
-        # print_json(process_list)
+        process_list = [{"name": p["name"], "pid": p["pid"], "cmd": p["cmd"], "username": p["username"]}
+                        for p in _process_snapshot()]
+        process_list.sort(key=lambda x: x['name'] or "")
         return process_list
 
     return await asyncio.wait_for(asyncio.to_thread(real_func), timeout=10)
@@ -192,48 +215,34 @@ def get_visible_top_level_windows():
 
 async def process_tree():
     def real_func():
-        process_list = []
         if platform.system() == "Windows":
-            appliction_pids = get_visible_top_level_windows()
+            appliction_pids = set(get_visible_top_level_windows())
+            is_top = lambda p: p["pid"] in appliction_pids
         else:
-            appliction_pids = [0, 1]
-        for proc in psutil.process_iter(attrs=['name', 'pid', 'cmdline', 'username', 'ppid']):
-            try:
-                # 检查进程是否正在运行且父进程 ID 为 1
-                if proc.is_running() and (
-                        proc.pid if platform.system() == "Windows" else proc.ppid()) in appliction_pids:
-                    process_info = {
-                        "name": proc.info['name'],
-                        "ppid": proc.info['ppid'],
-                        "pid": proc.info['pid'],
-                        "cmd": proc.info['cmdline'],
-                        "username": proc.username(),
-                        "child_p": []
-                    }
-                    try:
-                        # 获取子进程信息
-                        children = proc.children(recursive=True)
-                        for child in children:
-                            try:
-                                child_info = {
-                                    "name": child.name(),
-                                    "ppid": child.ppid(),
-                                    "pid": child.pid,
-                                    "cmd": child.cmdline(),
-                                    "username": child.username()
-                                }
-                                process_info["child_p"].append(child_info)
-                            except Exception:
-                                # 处理子进程不存在的情况
-                                pass
-                    except psutil.NoSuchProcess:
-                        # 处理父进程不存在的情况
-                        logger.error(f"父进程 {proc.pid} 已不存在")
-                    process_list.append(process_info)
-            except Exception as e:
-                logger.error(e)
+            is_top = lambda p: p["ppid"] in (0, 1)
+        snapshot = _process_snapshot()
+        # 单次遍历建立 ppid -> 子进程索引，再从顶层进程向下展开，整体 O(n)
+        children_of = {}
+        for p in snapshot:
+            if p["pid"] != p["ppid"]:
+                children_of.setdefault(p["ppid"], []).append(p)
+
+        process_list = []
+        for proc in snapshot:
+            if not is_top(proc):
+                continue
+            child_p = []
+            visited = {proc["pid"]}
+            stack = list(reversed(children_of.get(proc["pid"], [])))
+            while stack:
+                child = stack.pop()
+                if child["pid"] in visited:
+                    continue
+                visited.add(child["pid"])
+                child_p.append(dict(child))
+                stack.extend(reversed(children_of.get(child["pid"], [])))
+            process_list.append({**proc, "child_p": child_p})
         process_list.sort(key=lambda x: -len(x['child_p']))
-        # print_json(process_list)
         return process_list
 
     return await asyncio.wait_for(asyncio.to_thread(real_func), timeout=10)
@@ -245,10 +254,13 @@ window_cache = {}
 WINDOW_CACHE_EXPIRE_TIME = 15
 
 
-async def screenshot(pid, save_dir, include_child=False):
+async def screenshot(pid, save_dir, include_child=False, options=None):
     def real_func(pid, save_dir):
         if not SCREENSHOT_AVAILABLE:
             return None
+        # 编码管线繁忙时连抓图也跳过，避免干扰指标采集
+        if save_dir and screenshot_busy():
+            return None
         global window_cache
         if pid:
             window = (window_cache.get(pid)[0] if window_cache.get(pid)[-1] + WINDOW_CACHE_EXPIRE_TIME > time.time() else None) if window_cache.get(pid) else None
@@ -283,10 +295,7 @@ async def screenshot(pid, save_dir, include_child=False):
             else:
                 screenshot = ImageGrab.grab(all_screens=True)
             if save_dir:
-                dir_instance = Path(save_dir)
-                screenshot_dir = dir_instance.joinpath("screenshot")
-                screenshot_dir.mkdir(exist_ok=True)
-                screenshot.save(screenshot_dir.joinpath(str(int(time.time() + 0.5)) + ".png"), format="PNG")
+                save_screenshot(screenshot, save_dir, options)
             else:
                 output_buffer = BytesIO()
                 screenshot.save(output_buffer, format='PNG')
@@ -347,7 +356,29 @@ async def fps(pid, include_child=False):
     return res
 
 
-async def gpu(pid, include_child=False):
+_NVML_HANDLES = None
+
+
+def _nvml_handles() -> list:
+    """NVML 设备句柄只枚举一次，跨轮复用"""
+    global _NVML_HANDLES
+    if _NVML_HANDLES is None:
+        _NVML_HANDLES = [pynvml.nvmlDeviceGetHandleByIndex(i) for i in range(pynvml.nvmlDeviceGetCount())]
+    return _NVML_HANDLES
+
+
+def _nvml_pids(handle) -> set[int]:
+    """在该 GPU 上运行的计算与图形进程"""
+    pids = set()
+    for getter in (pynvml.nvmlDeviceGetComputeRunningProcesses, pynvml.nvmlDeviceGetGraphicsRunningProcesses):
+        try:
+            pids.update(p.pid for p in getter(handle))
+        except pynvml.NVMLError:
+            continue
+    return pids
+
+
+async def gpu(pid, include_child=False, sampler: LinuxGpuSampler | None = None):
     pid = int(pid)
 
     def real_func(pid):
@@ -359,21 +390,19 @@ async def gpu(pid, include_child=False):
                 sub_pid = [sub_p.pid for sub_p in p_chs]
                 pids.extend(sub_pid)
         start_time = int(time.time())
-        sum_gpu = 0
         if SUPPORT_GPU:
-            device_count = pynvml.nvmlDeviceGetCount()
-            res = None
             gpu_utilization_percentage = None
-            for i in range(device_count):
-                handle = pynvml.nvmlDeviceGetHandleByIndex(i)
-                processes = pynvml.nvmlDeviceGetComputeRunningProcesses(handle)
-                for process in processes:
-                    if process.pid in pids:
-                        gpu_Utilization = pynvml.nvmlDeviceGetUtilizationRates(handle)
-                        gpu_utilization_percentage = gpu_Utilization.gpu  # GPU的计算使用率
-                        sum_gpu += gpu_utilization_percentage
+            for handle in _nvml_handles():
+                if _nvml_pids(handle).intersection(pids):
+                    gpu_Utilization = pynvml.nvmlDeviceGetUtilizationRates(handle)
+                    # GPU的计算使用率，多卡时取最大值
+                    gpu_utilization_percentage = max(gpu_Utilization.gpu, gpu_utilization_percentage or 0)
             res = {"gpu": gpu_utilization_percentage, "time": start_time}
             return res
+        elif sampler is not None:
+            res = sampler.update(pids)
+            res["time"] = start_time
+            return res
         else:
             return {"time": start_time}
 
@@ -408,8 +437,8 @@ async def process_info(pid, include_child=False):
     return res
 
 
-async def disk_io(pid, include_child=False):
-    """监控进程的磁盘I/O指标"""
+async def disk_io(pid, include_child=False, block_sampler: BlockIoSampler | None = None):
+    """监控进程的磁盘I/O指标；传入 block_sampler 时同一窗口内附带块设备延迟与队列深度"""
     process = psutil.Process(int(pid))
     # 获取初始IO计数
     try:
@@ -418,12 +447,18 @@ async def disk_io(pid, include_child=False):
         prev_io = await get_main_io
         prev_disk_read = prev_io.read_bytes
         prev_disk_write = prev_io.write_bytes
+        if block_sampler is not None:
+            block_before = await asyncio.to_thread(block_sampler.snapshot, int(pid))
+            window_start = time.monotonic()
         
         # 休眠一小段时间以计算速率
         await asyncio.sleep(1)
         
         # 获取更新后的IO计数器
         current_io = await asyncio.to_thread(process.io_counters)
+        if block_sampler is not None:
+            block_after = await asyncio.to_thread(block_sampler.snapshot, int(pid))
+            block_stats = BlockIoSampler.derive(block_before, block_after, time.monotonic() - window_start)
         disk_read = current_io.read_bytes
         disk_write = current_io.write_bytes
         
@@ -444,6 +479,8 @@ async def disk_io(pid, include_child=False):
             "disk_write": disk_write,  # 总写入字节数
             "time": int(time.time())
         }
+        if block_sampler is not None:
+            res.update(block_stats)
         
         logger.info(json.dumps(res))
         return res
@@ -495,39 +532,76 @@ async def network_io(pid, include_child=False):
         return {"net_sent_rate": 0, "net_recv_rate": 0, "time": start_time}
 
 
-async def perf(pid, save_dir, include_child):
+async def perf(pid, save_dir, include_child, options=None, task_id=None):
+    options = options or {}
+    target = ProcessTarget(pid)
+    watcher = LifecycleWatcher(
+        target, save_dir,
+        probe=pc_probe(int(pid)),
+        resolver=pc_resolver(int(pid)),
+        mode=options.get("on_target_exit", DEFAULT_ON_TARGET_EXIT),
+        task_id=task_id,
+        use_pidfd=platform.system() == "Linux",
+    )
+    # 非 NVIDIA 的 Linux 机器走 DRM sysfs/fdinfo 通用后端
+    gpu_sampler = LinuxGpuSampler() if not SUPPORT_GPU and platform.system() == "Linux" else None
+    if gpu_sampler is not None and not gpu_sampler.available():
+        gpu_sampler = None
+    block_sampler = BlockIoSampler() if options.get("disk_latency") and platform.system() == "Linux" else None
     monitors = {
         "cpu": Monitor(cpu,
-                       pid=pid,
+                       pid=pid, target=target,
                        key_value=["time", "cpu_usage(%)", "cpu_usage_all(%)", "cpu_core_num(个)"],
                        save_dir=save_dir, include_child=include_child),
         "memory": Monitor(memory,
-                          pid=pid,
+                          pid=pid, target=target,
                           key_value=["time", "process_memory_usage(M)"],
                           save_dir=save_dir, include_child=include_child),
         "process_info": Monitor(process_info,
-                                pid=pid,
+                                pid=pid, target=target,
                                 key_value=["time", "num_threads(个)", "num_handles(个)"],
                                 save_dir=save_dir, include_child=include_child),
         "fps": Monitor(fps,
-                       pid=pid,
+                       pid=pid, target=target,
                        key_value=["time", "fps(帧)", "frames"],
                        save_dir=save_dir, include_child=include_child),
         "gpu": Monitor(gpu,
-                       pid=pid,
-                       key_value=["time", "gpu(%)"],
+                       pid=pid, target=target, sampler=gpu_sampler,
+                       key_value=["time", "gpu(%)"] if gpu_sampler is None
+                       else ["time", "gpu(%)", "gpu_device(%)", "gpu_memory(M)"],
                        save_dir=save_dir, include_child=include_child),
         "disk_io": Monitor(disk_io,
-                          pid=pid,
-                          key_value=["time", "disk_read_rate(MB/s)", "disk_write_rate(MB/s)", "disk_read(字节)", "disk_write(字节)"],
+                          pid=pid, target=target, block_sampler=block_sampler,
+                          key_value=["time", "disk_read_rate(MB/s)", "disk_write_rate(MB/s)", "disk_read(字节)", "disk_write(字节)"]
+                          + (BLOCK_IO_KEYS if block_sampler is not None else []),
                           save_dir=save_dir, include_child=include_child),
         "network_io": Monitor(network_io,
-                             pid=pid,
+                             pid=pid, target=target,
                              key_value=["time", "net_sent_rate(MB/s)", "net_recv_rate(MB/s)", "net_sent(字节)", "net_recv(字节)"],
                              save_dir=save_dir, include_child=include_child),
         "screenshot": Monitor(screenshot,
-                              pid=pid,
-                              save_dir=save_dir, is_out=False, include_child=include_child)
+                              pid=pid, target=target,
+                              save_dir=save_dir, is_out=False, include_child=include_child,
+                              options=options)
     }
-    run_monitors = [monitor.run() for name, monitor in monitors.items()]
-    await asyncio.gather(*run_monitors)
+    thread_on, thread_top_n = thread_options(options)
+    if thread_on:
+        monitors["thread_cpu"] = Monitor(pc_thread_cpu,
+                                         sampler=ThreadCpuSampler(thread_top_n),
+                                         pid=pid, target=target,
+                                         monitor_name="thread_cpu",
+                                         key_value=THREAD_CPU_KEYS,
+                                         save_dir=save_dir)
+    if options.get("host_contention") and platform.system() == "Linux":
+        monitors["host_contention"] = Monitor(host_contention,
+                                              sampler=HostContentionSampler(),
+                                              pid=pid, target=target,
+                                              monitor_name="host_contention",
+                                              key_value=HOST_CONTENTION_KEYS,
+                                              save_dir=save_dir)
+    await run_monitors(monitors, watcher)
+
+
+async def launch(save_dir, options=None, task_id=None):
+    """PC 启动耗时测量入口（task_type=launch）"""
+    await run_launch(PcLaunchDriver(launch_options(options)["command"]), save_dir, options, task_id)
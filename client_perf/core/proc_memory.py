@@ -0,0 +1,104 @@
+# coding: utf-8
+"""
+分层内存采样 — Android / HarmonyOS 共用的命令与解析。
+
+* 快层（每轮）：一次 shell 读取 /proc/<pid>/smaps_rollup 与 /proc/<pid>/status，
+  得到 PSS / RSS / Swap。smaps_rollup 需要 ptrace 权限（debuggable 应用或 root），
+  读不到时 PSS 改由慢层命令取得（每轮多一次 shell）；process_memory_usage 始终是 PSS，
+  不同设备 / 权限下的任务对比的是同一个量，RSS 只写 rss 列。
+* 慢层（memory_detail_interval 秒一次）：dumpsys meminfo / hidumper --mem
+  的完整分类（Java/ArkTS 堆、Native 堆、Graphics、Code、Stack），单独写 memory_detail.csv。
+  这两个命令在设备上耗时数百毫秒且会扰动被测应用，不适合每秒执行。
+"""
+import re
+from typing import Dict, Optional
+
+DEFAULT_MEMORY_DETAIL_INTERVAL = 10
+
+MEMORY_DETAIL_KEYS = ["time", "total_pss(M)", "java_heap(M)", "native_heap(M)",
+                      "graphics(M)", "code(M)", "stack(M)"]
+
+
+def memory_detail_interval(options: Optional[dict]) -> int:
+    """慢层采样间隔（秒），0 表示关闭"""
+    try:
+        return max(0, int((options or {}).get("memory_detail_interval", DEFAULT_MEMORY_DETAIL_INTERVAL)))
+    except (TypeError, ValueError):
+        return DEFAULT_MEMORY_DETAIL_INTERVAL
+
+
+def fast_memory_command(pid: int) -> str:
+    return (f"cat /proc/{pid}/smaps_rollup 2>/dev/null; "
+            f"grep -E '^(VmRSS|VmSwap):' /proc/{pid}/status 2>/dev/null")
+
+
+def parse_fast_memory(output: str) -> Dict[str, float]:
+    """解析 fast_memory_command 输出，返回 {pss, rss, swap}（MB，缺失的键不返回）"""
+    kb: Dict[str, int] = {}
+    for line in (output or "").split("\n"):
+        key, sep, value = line.partition(":")
+        if not sep:
+            continue
+        nums = value.split()
+        if nums and nums[0].isdigit():
+            # smaps_rollup 与 status 都有 Rss，先出现的 smaps_rollup 优先
+            kb.setdefault(key.strip(), int(nums[0]))
+    res: Dict[str, float] = {}
+    if "Pss" in kb:
+        res["pss"] = round(kb["Pss"] / 1024.0, 2)
+    rss = kb.get("Rss", kb.get("VmRSS"))
+    if rss is not None:
+        res["rss"] = round(rss / 1024.0, 2)
+    swap = kb.get("SwapPss", kb.get("Swap", kb.get("VmSwap")))
+    if swap is not None:
+        res["swap"] = round(swap / 1024.0, 2)
+    return res
+
+
+def _mb(kb: Optional[int]) -> Optional[float]:
+    return round(kb / 1024.0, 2) if kb is not None else None
+
+
+def parse_dumpsys_meminfo(output: str) -> Dict[str, Optional[float]]:
+    """解析 dumpsys meminfo <pkg> 的 App Summary 部分（MB）"""
+
+    def find(pattern: str) -> Optional[int]:
+        match = re.search(pattern, output or "", re.MULTILINE)
+        return int(match.group(1)) if match else None
+
+    return {
+        "total_pss": _mb(find(r'TOTAL\s+PSS:\s+(\d+)') or find(r'^\s*TOTAL\s+(\d+)')),
+        "java_heap": _mb(find(r'^\s*Java Heap:\s+(\d+)')),
+        "native_heap": _mb(find(r'^\s*Native Heap:\s+(\d+)')),
+        "graphics": _mb(find(r'^\s*Graphics:\s+(\d+)')),
+        "code": _mb(find(r'^\s*Code:\s+(\d+)')),
+        "stack": _mb(find(r'^\s*Stack:\s+(\d+)')),
+    }
+
+
+# hidumper --mem 分类名 -> memory_detail 列（同一列的多个分类求和）
+_HIDUMPER_CATEGORIES = {
+    "ark ts heap": "java_heap",
+    "native heap": "native_heap",
+    "graph": "graphics",
+    "gl": "graphics",
+    "dma": "graphics",
+    ".so": "code",
+    ".hap": "code",
+    ".hsp": "code",
+    "stack": "stack",
+    "total": "total_pss",
+}
+
+
+def parse_hidumper_mem(output: str) -> Dict[str, Optional[float]]:
+    """解析 hidumper --mem <pid|bundle> 的分类表（取每行第一个数值列，即 PSS，MB）"""
+    kb: Dict[str, int] = {}
+    for line in (output or "").split("\n"):
+        match = re.match(r'^\s*([A-Za-z.][A-Za-z .]*?)\s+(\d+)\b', line)
+        if not match:
+            continue
+        column = _HIDUMPER_CATEGORIES.get(match.group(1).strip().lower())
+        if column:
+            kb[column] = kb.get(column, 0) + int(match.group(2))
+    return {k.split("(")[0]: _mb(kb.get(k.split("(")[0])) for k in MEMORY_DETAIL_KEYS if k != "time"}
@@ -0,0 +1,606 @@
+# coding: utf-8
+"""
+截图编码管线 — 采集线程只负责抓图，缩放与编码交给后台编码池。
+
+* 编码池默认使用进程池；采集子进程（TaskHandle，daemon）不允许再派生子进程，
+  此时退化为线程池（Pillow 编码期间会释放 GIL）。
+* 队列有界：在途编码数达到上限时直接丢弃新截图（drop-when-busy），
+  保证截图永远不会拖慢同一进程里的指标采集。
+* 支持 PNG / JPEG / WebP 输出、质量参数和最大宽度（等比缩放）。
+* 去重落盘（ScreenshotStore）：每帧计算 64 位 dHash 感知哈希，与上一帧足够相似
+  或与已存图片哈希相同时不再写新文件；唯一图片按内容哈希命名，只存一份。
+  时间戳 -> 图片的映射写入紧凑二进制索引，供 UI 按时间取图。
+* 索引查找（ScreenshotIndex）直接在 index.bin 上二分 seek，不加载整个文件；
+  每张唯一图片同时预生成低分辨率缩略图，时间轴拖动时按区间拼成雪碧图返回。
+* 清理（prune_screenshots）：数据保留策略对旧任务只保留标签边界附近的截图。
+
+截图目录布局（<save_dir>/screenshot/）：
+    <sha1[:16]><ext>   唯一图片（内容寻址）
+    images.txt         每行 "<文件名> <dhash hex>"，行号即图片编号
+    index.bin          定长记录 <uint32 ts, uint32 图片编号>，按 ts 递增
+    thumb/<stem>.jpg   缩略图（宽 THUMB_WIDTH）
+    sprite/*.jpg       按时间区间拼接的缩略图雪碧图缓存
+
+用法：
+    from client_perf.core.screenshot import save_screenshot, screenshot_busy
+    if not screenshot_busy():
+        save_screenshot(pil_image_or_bytes, save_dir, options)
+"""
+import bisect
+import hashlib
+import multiprocessing
+import os
+import struct
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Optional, Union
+
+from client_perf.log import log as logger
+
+# format -> (Pillow 格式名, 文件扩展名, MIME)
+SCREENSHOT_FORMATS: dict[str, tuple[str, str, str]] = {
+    "png":  ("PNG",  ".png",  "image/png"),
+    "jpeg": ("JPEG", ".jpg",  "image/jpeg"),
+    "jpg":  ("JPEG", ".jpg",  "image/jpeg"),
+    "webp": ("WEBP", ".webp", "image/webp"),
+}
+
+DEFAULT_FORMAT = "png"
+DEFAULT_QUALITY = 80
+DEFAULT_MAX_WIDTH = 0          # 0 = 不缩放
+DEFAULT_MAX_PENDING = 2        # 在途编码上限，超过即丢帧
+DEFAULT_WORKERS = 1
+# 与上一帧 dHash 汉明距离 <= 该值视为同一画面
+DEFAULT_DEDUP_DISTANCE = 4
+
+INDEX_FILE = "index.bin"
+IMAGES_FILE = "images.txt"
+THUMB_DIR = "thumb"
+SPRITE_DIR = "sprite"
+THUMB_WIDTH = 160
+THUMB_QUALITY = 60
+SPRITE_MAX_FRAMES = 120
+_INDEX_RECORD = struct.Struct("<II")
+
+# 截图载荷：PIL.Image（可 pickle）或已编码的图片字节（PNG/JPEG 文件内容）
+Payload = Union[bytes, Any]
+
+
+def screenshot_options(options: Optional[dict] = None) -> dict[str, Any]:
+    """从任务 options 中取出截图相关配置，并补默认值 / 校验格式。"""
+    options = options or {}
+    fmt = str(options.get("screenshot_format") or DEFAULT_FORMAT).lower()
+    if fmt not in SCREENSHOT_FORMATS:
+        logger.warning(f"不支持的截图格式 {fmt}，回退为 {DEFAULT_FORMAT}")
+        fmt = DEFAULT_FORMAT
+    quality = int(options.get("screenshot_quality") or DEFAULT_QUALITY)
+    max_width = int(options.get("screenshot_max_width") or DEFAULT_MAX_WIDTH)
+    return {
+        "format": fmt,
+        "quality": min(max(quality, 1), 100),
+        "max_width": max(max_width, 0),
+    }
+
+
+def screenshot_ext(fmt: str) -> str:
+    return SCREENSHOT_FORMATS.get(fmt, SCREENSHOT_FORMATS[DEFAULT_FORMAT])[1]
+
+
+def screenshot_mime(fmt: str) -> str:
+    return SCREENSHOT_FORMATS.get(fmt, SCREENSHOT_FORMATS[DEFAULT_FORMAT])[2]
+
+
+# ── 编码（在编码池中执行，必须是模块级函数以便 pickle）───────────
+
+def encode_image(payload: Payload, fmt: str = DEFAULT_FORMAT,
+                 quality: int = DEFAULT_QUALITY, max_width: int = DEFAULT_MAX_WIDTH) -> bytes:
+    """解码 / 缩放 / 重新编码，返回目标格式的图片字节。"""
+    from PIL import Image
+
+    if isinstance(payload, (bytes, bytearray)):
+        img = Image.open(BytesIO(payload))
+        img.load()
+    else:
+        img = payload
+
+    if max_width and img.width > max_width:
+        height = max(1, round(img.height * max_width / img.width))
+        img = img.resize((max_width, height), Image.BILINEAR)
+
+    pil_fmt = SCREENSHOT_FORMATS.get(fmt, SCREENSHOT_FORMATS[DEFAULT_FORMAT])[0]
+    save_kwargs: dict[str, Any] = {}
+    if pil_fmt == "JPEG":
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        save_kwargs = {"quality": quality, "optimize": False}
+    elif pil_fmt == "WEBP":
+        save_kwargs = {"quality": quality, "method": 0}
+    else:
+        # PNG 无损，压缩级别取速度优先
+        save_kwargs = {"compress_level": 1}
+
+    buf = BytesIO()
+    img.save(buf, format=pil_fmt, **save_kwargs)
+    return buf.getvalue()
+
+
+def dhash(img: Any) -> int:
+    """64 位差值哈希：灰度缩到 9x8，比较水平相邻像素。"""
+    from PIL import Image
+
+    small = img.convert("L").resize((9, 8), Image.BILINEAR)
+    px = list(small.getdata())
+    value = 0
+    for row in range(8):
+        base = row * 9
+        for col in range(8):
+            value = (value << 1) | (px[base + col] > px[base + col + 1])
+    return value
+
+
+def _within(a: int, b: int, distance: int) -> bool:
+    return bin(a ^ b).count("1") <= distance
+
+
+def make_thumbnail(payload: Payload) -> bytes:
+    """生成宽 THUMB_WIDTH 的 JPEG 缩略图。"""
+    return encode_image(payload, "jpeg", THUMB_QUALITY, THUMB_WIDTH)
+
+
+def _encode_frame(payload: Payload, fmt: str, quality: int, max_width: int,
+                  anchor: Optional[int] = None,
+                  distance: int = DEFAULT_DEDUP_DISTANCE) -> tuple[int, Optional[bytes], Optional[bytes]]:
+    """
+    编码池任务：返回 (dhash, 编码后字节, 缩略图字节)。
+    与 anchor（上一张已存图片的哈希）足够相似时跳过编码，字节均返回 None。
+    """
+    from PIL import Image
+
+    if isinstance(payload, (bytes, bytearray)):
+        img = Image.open(BytesIO(payload))
+        img.load()
+    else:
+        img = payload
+    phash = dhash(img)
+    if anchor is not None and _within(phash, anchor, distance):
+        return phash, None, None
+    return phash, encode_image(img, fmt, quality, max_width), make_thumbnail(img)
+
+
+# ── 去重存储 ──────────────────────────────────────────────────
+
+class ScreenshotStore:
+    """
+    单个任务截图目录的去重写入器（只在采集进程内使用，线程安全）。
+
+    add() 由编码池回调调用：相似帧只追加索引记录，不写图片文件。
+    """
+
+    def __init__(self, save_dir: str, dedup_distance: int = DEFAULT_DEDUP_DISTANCE) -> None:
+        self.dir = Path(save_dir) / "screenshot"
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.dedup_distance = dedup_distance
+        self._lock = threading.Lock()
+        self._names: list[str] = []
+        self._hashes: list[int] = []
+        self._by_hash: dict[int, int] = {}
+        self._last_id: Optional[int] = None
+        self._last_ts = -1
+        self.frames = 0
+        self._load()
+
+    def _load(self) -> None:
+        images = self.dir / IMAGES_FILE
+        if images.exists():
+            for line in images.read_text(encoding="utf-8").splitlines():
+                parts = line.split()
+                if len(parts) != 2:
+                    continue
+                phash = int(parts[1], 16)
+                self._by_hash.setdefault(phash, len(self._names))
+                self._names.append(parts[0])
+                self._hashes.append(phash)
+        index = self.dir / INDEX_FILE
+        if index.exists() and index.stat().st_size >= _INDEX_RECORD.size:
+            with open(index, "rb") as f:
+                f.seek(-_INDEX_RECORD.size, os.SEEK_END)
+                self._last_ts, self._last_id = _INDEX_RECORD.unpack(f.read(_INDEX_RECORD.size))
+
+    @property
+    def anchor(self) -> Optional[int]:
+        """上一帧所引用图片的哈希；相似度始终与已存图片比较，避免缓慢变化的画面累积漂移。"""
+        with self._lock:
+            return self._hashes[self._last_id] if self._last_id is not None else None
+
+    def add(self, ts: int, phash: int, data: Optional[bytes], ext: str,
+            thumb: Optional[bytes] = None) -> Optional[str]:
+        """登记一帧截图，返回其对应的图片文件名；data 为 None 表示编码端已判定为重复帧。"""
+        with self._lock:
+            image_id = None
+            if (self._last_id is not None
+                    and _within(phash, self._hashes[self._last_id], self.dedup_distance)):
+                image_id = self._last_id
+            elif phash in self._by_hash:
+                image_id = self._by_hash[phash]
+            elif data is None:
+                # 编码端依据的 anchor 已过期，退回到最相近的已存图片
+                if not self._hashes:
+                    return None
+                image_id = min(range(len(self._hashes)),
+                               key=lambda i: bin(phash ^ self._hashes[i]).count("1"))
+
+            if image_id is None:
+                name = hashlib.sha1(data).hexdigest()[:16] + ext
+                path = self.dir / name
+                if not path.exists():
+                    tmp_path = path.with_name(name + ".tmp")
+                    tmp_path.write_bytes(data)
+                    os.replace(tmp_path, path)
+                if thumb:
+                    thumb_dir = self.dir / THUMB_DIR
+                    thumb_dir.mkdir(exist_ok=True)
+                    (thumb_dir / f"{path.stem}.jpg").write_bytes(thumb)
+                image_id = len(self._names)
+                self._names.append(name)
+                self._hashes.append(phash)
+                self._by_hash[phash] = image_id
+                with open(self.dir / IMAGES_FILE, "a", encoding="utf-8") as f:
+                    f.write(f"{name} {phash:016x}\n")
+
+            self._last_id = image_id
+            # 索引按 ts 严格递增，乱序/同秒的帧只更新去重状态
+            if ts > self._last_ts:
+                with open(self.dir / INDEX_FILE, "ab") as f:
+                    f.write(_INDEX_RECORD.pack(ts, image_id))
+                self._last_ts = ts
+            self.frames += 1
+            return self._names[image_id]
+
+
+# images.txt 只追加：按目录缓存已读出的文件名和读到的偏移，增量读取新增行
+_names_cache: dict[str, tuple[int, list[str]]] = {}
+_names_cache_lock = threading.Lock()
+
+
+def _image_names(screenshot_dir: Path) -> list[str]:
+    path = screenshot_dir / IMAGES_FILE
+    key = str(path)
+    try:
+        size = path.stat().st_size
+    except FileNotFoundError:
+        return []
+    with _names_cache_lock:
+        offset, names = _names_cache.get(key, (0, []))
+        if size < offset:
+            offset, names = 0, []
+        if size > offset:
+            with open(path, "rb") as f:
+                f.seek(offset)
+                chunk = f.read(size - offset)
+            # 只消费完整的行，半行留到下次
+            complete = chunk.rfind(b"\n") + 1
+            names = names + [line.split()[0] for line in
+                             chunk[:complete].decode("utf-8").splitlines() if line.strip()]
+            offset += complete
+            _names_cache[key] = (offset, names)
+        return names
+
+
+class ScreenshotIndex:
+    """
+    截图索引只读视图：在 index.bin 定长记录上二分 seek，
+    查找复杂度 O(log n) 次小读，不加载整个索引文件。
+    """
+
+    def __init__(self, save_dir: str) -> None:
+        self.dir = Path(save_dir) / "screenshot"
+        self.index_path = self.dir / INDEX_FILE
+
+    def __len__(self) -> int:
+        try:
+            return self.index_path.stat().st_size // _INDEX_RECORD.size
+        except FileNotFoundError:
+            return 0
+
+    @staticmethod
+    def _record(f, i: int) -> tuple[int, int]:
+        f.seek(i * _INDEX_RECORD.size)
+        return _INDEX_RECORD.unpack(f.read(_INDEX_RECORD.size))
+
+    def _nearest_record(self, f, n: int, ts: int, tolerance: int) -> Optional[tuple[int, int]]:
+        lo, hi = 0, n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._record(f, mid)[0] < ts:
+                lo = mid + 1
+            else:
+                hi = mid
+        best = None
+        for j in (lo - 1, lo):
+            if 0 <= j < n:
+                rec = self._record(f, j)
+                if abs(rec[0] - ts) <= tolerance and (best is None or abs(rec[0] - ts) < abs(best[0] - ts)):
+                    best = rec
+        return best
+
+    def nearest_many(self, ts_list: list[int], tolerance: int = 2) -> list[Optional[tuple[int, Path]]]:
+        """批量查找：返回每个 ts 对应的 (实际截图 ts, 图片路径)，容差外为 None。"""
+        n = len(self)
+        if not n:
+            return [None] * len(ts_list)
+        names = _image_names(self.dir)
+        result: list[Optional[tuple[int, Path]]] = []
+        with open(self.index_path, "rb") as f:
+            for ts in ts_list:
+                rec = self._nearest_record(f, n, int(ts), tolerance)
+                if rec is None or rec[1] >= len(names):
+                    result.append(None)
+                else:
+                    result.append((rec[0], self.dir / names[rec[1]]))
+        return result
+
+    def lookup(self, ts: int, tolerance: int = 2) -> Optional[Path]:
+        """返回 ts 时刻（容差 tolerance 秒内最近一帧）的截图路径；兼容旧版 <ts>.png 命名。"""
+        hit = self.nearest_many([ts], tolerance)[0]
+        if hit:
+            return hit[1]
+        legacy = self.dir / f"{int(ts)}.png"
+        return legacy if legacy.exists() else None
+
+    def thumbnail(self, image_path: Path) -> Optional[Path]:
+        """图片对应的缩略图；旧任务或缺失时按需生成。"""
+        thumb = self.dir / THUMB_DIR / f"{image_path.stem}.jpg"
+        if not thumb.exists():
+            if not image_path.exists():
+                return None
+            thumb.parent.mkdir(exist_ok=True)
+            thumb.write_bytes(make_thumbnail(image_path.read_bytes()))
+        return thumb
+
+    def sprite(self, start_ts: int, end_ts: int, count: int = 30) -> dict[str, Any]:
+        """
+        把 [start_ts, end_ts] 区间均匀取 count 个时间点的缩略图横向拼成一张雪碧图。
+        返回 {"sprite": 相对 save_dir 的路径 | None, "tile_width", "tile_height",
+              "frames": [{"ts": 请求时间点, "shot_ts": 实际截图时间, "tile": 列号}]}
+        相同区间的结果缓存在 sprite/ 下；运行中的任务索引增长后自动重建。
+        """
+        from PIL import Image
+
+        count = max(1, min(int(count), SPRITE_MAX_FRAMES))
+        start_ts, end_ts = int(start_ts), int(end_ts)
+        if end_ts < start_ts:
+            start_ts, end_ts = end_ts, start_ts
+        step = (end_ts - start_ts) / (count - 1) if count > 1 else 0
+        points = [round(start_ts + step * i) for i in range(count)]
+        hits = self.nearest_many(points, tolerance=max(2, int(step / 2) + 1))
+
+        tiles: list[Path] = []
+        tile_of: dict[Path, int] = {}
+        frames = []
+        for ts, hit in zip(points, hits):
+            if hit is None:
+                continue
+            thumb = self.thumbnail(hit[1])
+            if thumb is None:
+                continue
+            if thumb not in tile_of:
+                tile_of[thumb] = len(tiles)
+                tiles.append(thumb)
+            frames.append({"ts": ts, "shot_ts": hit[0], "tile": tile_of[thumb]})
+
+        result: dict[str, Any] = {"sprite": None, "tile_width": 0, "tile_height": 0, "frames": frames}
+        if not tiles:
+            return result
+
+        sprite_dir = self.dir / SPRITE_DIR
+        sprite_path = sprite_dir / f"{start_ts}_{end_ts}_{count}_{len(self)}.jpg"
+        if sprite_path.exists():
+            with Image.open(sprite_path) as im:
+                height = im.height
+        else:
+            images = [Image.open(p) for p in tiles]
+            height = max(im.height for im in images)
+            sheet = Image.new("RGB", (THUMB_WIDTH * len(images), height), (0, 0, 0))
+            for i, im in enumerate(images):
+                sheet.paste(im.convert("RGB"), (i * THUMB_WIDTH, 0))
+                im.close()
+            sprite_dir.mkdir(exist_ok=True)
+            tmp_path = sprite_path.with_name(sprite_path.name + ".tmp")
+            sheet.save(tmp_path, format="JPEG", quality=THUMB_QUALITY)
+            os.replace(tmp_path, sprite_path)
+        result.update({
+            "sprite": sprite_path.relative_to(self.dir.parent).as_posix(),
+            "tile_width": THUMB_WIDTH,
+            "tile_height": height,
+        })
+        return result
+
+
+# ── 清理 ──────────────────────────────────────────────────────
+
+def _bracketing(times: list[int], keep_ts: list[float]) -> set[int]:
+    """每个 keep_ts 前后最近的两条记录的下标（times 递增）"""
+    keep: set[int] = set()
+    for ts in keep_ts:
+        i = bisect.bisect_left(times, ts)
+        keep.update(j for j in (i - 1, i) if 0 <= j < len(times))
+    return keep
+
+
+def prune_screenshots(save_dir: str, keep_ts: list[float]) -> int:
+    """
+    只保留 keep_ts（如标签起止时间）前后最近的截图，其余图片、缩略图和雪碧图缓存全部删除，返回释放的字节数。
+    index.bin 重写为只含保留的记录；images.txt 不变（图片编号即行号，不能重排）。
+    只用于已停止的任务。
+    """
+    shot_dir = Path(save_dir) / "screenshot"
+    if not shot_dir.is_dir():
+        return 0
+    freed = 0
+
+    def _remove(path: Path) -> None:
+        nonlocal freed
+        try:
+            size = path.stat().st_size
+            path.unlink()
+            freed += size
+        except OSError:
+            pass
+
+    names = _image_names(shot_dir)
+    index = shot_dir / INDEX_FILE
+    if index.exists():
+        raw = index.read_bytes()
+        usable = len(raw) - len(raw) % _INDEX_RECORD.size
+        records = list(_INDEX_RECORD.iter_unpack(raw[:usable]))
+        kept = [records[i] for i in sorted(_bracketing([ts for ts, _ in records], keep_ts))]
+        tmp_path = index.with_name(INDEX_FILE + ".tmp")
+        tmp_path.write_bytes(b"".join(_INDEX_RECORD.pack(*rec) for rec in kept))
+        os.replace(tmp_path, index)
+        freed += len(raw) - len(kept) * _INDEX_RECORD.size
+        keep_names = {names[image_id] for _, image_id in kept if image_id < len(names)}
+        for name in set(names) - keep_names:
+            _remove(shot_dir / name)
+            _remove(shot_dir / THUMB_DIR / f"{Path(name).stem}.jpg")
+
+    # 旧版按 <ts>.png 命名、没有索引的截图
+    legacy = sorted((int(p.stem), p) for p in shot_dir.glob("*.png") if p.stem.isdigit())
+    if legacy:
+        keep = _bracketing([ts for ts, _ in legacy], keep_ts)
+        for i, (_, path) in enumerate(legacy):
+            if i not in keep:
+                _remove(path)
+
+    sprite_dir = shot_dir / SPRITE_DIR
+    if sprite_dir.is_dir():
+        for p in sprite_dir.iterdir():
+            _remove(p)
+    return freed
+
+
+# ── 管线 ──────────────────────────────────────────────────────
+
+class ScreenshotPipeline:
+    """
+    有界编码队列 + 编码池。
+
+    submit() 非阻塞：拿不到空闲槽位时返回 False 并计入 dropped。
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_WORKERS, max_pending: int = DEFAULT_MAX_PENDING) -> None:
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.dropped = 0
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                if multiprocessing.current_process().daemon:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers, thread_name_prefix="screenshot-encode"
+                    )
+                else:
+                    self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    @property
+    def busy(self) -> bool:
+        """在途编码已满；调用方可据此跳过本次抓图。"""
+        return self._pending >= self.max_pending
+
+    def submit(self, payload: Payload, store: ScreenshotStore, ts: int, fmt: str = DEFAULT_FORMAT,
+               quality: int = DEFAULT_QUALITY, max_width: int = DEFAULT_MAX_WIDTH) -> bool:
+        """提交一张截图异步编码，完成后交给 store 去重落盘；队列满时丢弃并返回 False。"""
+        if not self._slots.acquire(blocking=False):
+            self.dropped += 1
+            if self.dropped % 10 == 1:
+                logger.warning(f"[screenshot] 编码繁忙，已丢弃 {self.dropped} 张截图")
+            return False
+        with self._lock:
+            self._pending += 1
+        try:
+            fut = self._get_executor().submit(
+                _encode_frame, payload, fmt, quality, max_width, store.anchor, store.dedup_distance
+            )
+        except Exception:
+            self._release()
+            raise
+        ext = screenshot_ext(fmt)
+        fut.add_done_callback(lambda f: self._on_done(f, store, ts, ext))
+        return True
+
+    def encode(self, payload: Payload, fmt: str = DEFAULT_FORMAT,
+               quality: int = DEFAULT_QUALITY, max_width: int = DEFAULT_MAX_WIDTH) -> Future:
+        """编码到内存（不占用丢帧槽位），返回 concurrent Future[bytes]。"""
+        return self._get_executor().submit(encode_image, payload, fmt, quality, max_width)
+
+    def _release(self) -> None:
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def _on_done(self, fut: Future, store: ScreenshotStore, ts: int, ext: str) -> None:
+        try:
+            exc = fut.exception()
+            if exc is not None:
+                logger.error(f"[screenshot] 编码失败: {exc}")
+                return
+            phash, data, thumb = fut.result()
+            store.add(ts, phash, data, ext, thumb)
+        except Exception as e:
+            logger.error(f"[screenshot] 截图落盘失败: {e}")
+        finally:
+            self._release()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pipeline: Optional[ScreenshotPipeline] = None
+_pipeline_lock = threading.Lock()
+_stores: dict[str, ScreenshotStore] = {}
+
+
+def get_pipeline() -> ScreenshotPipeline:
+    """进程内共享的截图管线（懒加载）。"""
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = ScreenshotPipeline()
+        return _pipeline
+
+
+def screenshot_busy() -> bool:
+    return _pipeline is not None and _pipeline.busy
+
+
+def get_store(save_dir: str) -> ScreenshotStore:
+    with _pipeline_lock:
+        store = _stores.get(save_dir)
+        if store is None:
+            store = _stores[save_dir] = ScreenshotStore(save_dir)
+        return store
+
+
+def save_screenshot(payload: Payload, save_dir: str, options: Optional[dict] = None,
+                    ts: Optional[int] = None) -> bool:
+    """
+    把截图提交给编码管线，编码完成后去重写入 <save_dir>/screenshot/。
+    返回是否成功入队（False 表示因繁忙被丢弃）。
+    """
+    opts = screenshot_options(options)
+    if ts is None:
+        ts = int(time.time() + 0.5)
+    return get_pipeline().submit(
+        payload, get_store(save_dir), ts, opts["format"], opts["quality"], opts["max_width"]
+    )
@@ -0,0 +1,153 @@
+# coding: utf-8
+"""
+线程级 CPU 采集 — 可选指标（任务选项 thread_cpu）。
+
+* PC：psutil Process.threads() 的 user/system 时间差值；Linux 上额外读 /proc/<pid>/task/<tid>/comm 取线程名。
+* Android / HarmonyOS：一次 shell 批量 `cat /proc/<pid>/task/*/stat`，在本机解析线程名与 utime+stime。
+* 稀疏存储：每轮只保留 CPU 增量最高的 top N 个线程，写入 thread_cpu.csv 的 threads 列（JSON）：
+      [{"tid": 123, "name": "RenderThread", "cpu": 35.2}, ...]
+  cpu 为单核百分比（与 cpu.csv 的 cpu_usage 口径一致，满核 = 100 * 核数）。
+"""
+import asyncio
+import json
+import platform
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+DEFAULT_THREAD_TOP_N = 10
+# Linux / Android 的 USER_HZ
+CLOCK_TICKS = 100
+
+THREAD_CPU_KEYS = ["time", "thread_count(个)", "threads"]
+
+
+def thread_options(options: Optional[dict]) -> tuple[bool, int]:
+    """返回 (是否开启, top N)"""
+    options = options or {}
+    try:
+        top_n = max(1, int(options.get("thread_top_n", DEFAULT_THREAD_TOP_N)))
+    except (TypeError, ValueError):
+        top_n = DEFAULT_THREAD_TOP_N
+    return bool(options.get("thread_cpu")), top_n
+
+
+class ThreadCpuSampler:
+    """保存上一轮各线程累计 CPU 时间（秒），计算增量并取 top N"""
+
+    def __init__(self, top_n: int = DEFAULT_THREAD_TOP_N) -> None:
+        self.top_n = top_n
+        self._prev: Optional[tuple[float, int, Dict[int, float]]] = None
+
+    def update(self, pid: int, threads: Dict[int, tuple[str, float]]) -> Optional[Dict[str, Any]]:
+        """
+        threads: {tid: (线程名, 累计 CPU 秒数)}
+        第一轮或目标 pid 变化时只建立基线，返回 None
+        """
+        now = time.monotonic()
+        prev, self._prev = self._prev, (now, pid, {tid: t for tid, (_, t) in threads.items()})
+        if prev is None or prev[1] != pid:
+            return None
+        elapsed = max(now - prev[0], 1e-6)
+        busy = []
+        for tid, (name, cpu_time) in threads.items():
+            old = prev[2].get(tid)
+            if old is None:
+                continue
+            usage = max(0.0, cpu_time - old) / elapsed * 100
+            if usage > 0:
+                busy.append({"tid": tid, "name": name, "cpu": round(usage, 2)})
+        busy.sort(key=lambda x: -x["cpu"])
+        return {
+            "thread_count": len(threads),
+            "threads": json.dumps(busy[:self.top_n], ensure_ascii=False, separators=(",", ":")),
+            "time": int(time.time()),
+        }
+
+
+# ── 线程数据读取 ──────────────────────────────────────────────
+
+def parse_task_stats(output: str) -> Dict[int, tuple[str, float]]:
+    """解析 `cat /proc/<pid>/task/*/stat` 输出，返回 {tid: (线程名, 累计 CPU 秒数)}"""
+    threads: Dict[int, tuple[str, float]] = {}
+    for line in (output or "").split("\n"):
+        lpar, rpar = line.find("("), line.rfind(")")
+        if lpar <= 0 or rpar < lpar:
+            continue
+        tid = line[:lpar].strip()
+        fields = line[rpar + 2:].split()
+        if not tid.isdigit() or len(fields) < 13:
+            continue
+        try:
+            ticks = int(fields[11]) + int(fields[12])
+        except ValueError:
+            continue
+        threads[int(tid)] = (line[lpar + 1:rpar], ticks / CLOCK_TICKS)
+    return threads
+
+
+def device_threads(shell: Callable[[str], str], pid: int) -> Dict[int, tuple[str, float]]:
+    return parse_task_stats(shell(f"cat /proc/{pid}/task/*/stat 2>/dev/null"))
+
+
+def pc_threads(pid: int) -> Dict[int, tuple[str, float]]:
+    import psutil
+
+    proc = psutil.Process(pid)
+    task_dir = Path(f"/proc/{pid}/task")
+    read_names = platform.system() == "Linux" and task_dir.exists()
+    threads: Dict[int, tuple[str, float]] = {}
+    for th in proc.threads():
+        name = str(th.id)
+        if read_names:
+            try:
+                name = (task_dir / str(th.id) / "comm").read_text().strip() or name
+            except OSError:
+                pass
+        threads[th.id] = (name, th.user_time + th.system_time)
+    return threads
+
+
+# ── Monitor 采集函数 ──────────────────────────────────────────
+
+async def pc_thread_cpu(sampler: ThreadCpuSampler, pid: int) -> Optional[Dict]:
+    def real_func():
+        return sampler.update(int(pid), pc_threads(int(pid)))
+
+    return await asyncio.wait_for(asyncio.to_thread(real_func), timeout=10)
+
+
+async def device_thread_cpu(sampler: ThreadCpuSampler, shell: Callable[[str], str], pid: int = 0) -> Optional[Dict]:
+    if not pid:
+        return None
+
+    def real_func():
+        return sampler.update(int(pid), device_threads(shell, int(pid)))
+
+    return await asyncio.wait_for(asyncio.to_thread(real_func), timeout=15)
+
+
+# ── 对比 ──────────────────────────────────────────────────────
+
+def thread_averages(rows: list[dict[str, Any]]) -> Dict[str, float]:
+    """
+    由 thread_cpu.csv 记录计算各线程名在整个任务期间的平均 CPU。
+    同名线程（线程池等）合并；某轮未进入 top N 的线程按 0 计。
+    """
+    totals: Dict[str, float] = {}
+    ticks = 0
+    for row in rows:
+        raw = row.get("threads")
+        if raw is None:
+            continue
+        ticks += 1
+        try:
+            items = json.loads(raw) if isinstance(raw, str) else []
+        except json.JSONDecodeError:
+            continue
+        for item in items:
+            totals[item.get("name", "")] = totals.get(item.get("name", ""), 0.0) + float(item.get("cpu") or 0)
+    if not ticks:
+        return {}
+    return {name: round(total / ticks, 4) for name, total in totals.items()}
@@ -8,18 +8,23 @@
 * Collection 类的方法签名与旧版完全兼容，api.py / comparison.py 无需修改。
 * 数据库迁移：startup 时执行 _run_migrations()，用 ALTER TABLE 幂等地补列，
   新增表直接 CREATE TABLE IF NOT EXISTS，永远不删已有数据。
+* 并发：连接开启 WAL 与 busy_timeout；采集子进程不直接写库，
+  而是通过单写者队列（submit_write）交给 API 进程内唯一的 run_writer() 顺序执行。
 """
 from __future__ import annotations
 
+import asyncio
+import base64
 import datetime
 import json
+import multiprocessing
 import os
 import platform
 from typing import Any
 
 from sqlalchemy import (
     Boolean, Column, Float, Integer, String, Text,
-    delete, select, update,
+    and_, delete, event, func, or_, select, update,
 )
 from sqlalchemy.ext.asyncio import (
     AsyncSession,
@@ -28,21 +33,35 @@ from sqlalchemy.ext.asyncio import (
 )
 from sqlalchemy.orm import DeclarativeBase
 
+from client_perf.archive import ARCHIVE_TASKS_PER_RUN, archive_task, pending_csv
 from client_perf.log import log as logger
+from client_perf.util import DataCollect, task_data_cache
 
 # ── 数据库路径 ────────────────────────────────────────────────
 DB_PATH = os.path.join(os.getcwd(), "task.sqlite")
 _DB_URL  = f"sqlite+aiosqlite:///{DB_PATH}"
 
 # ── Engine & Session ──────────────────────────────────────────
+SQLITE_BUSY_TIMEOUT = 30      # 秒
+
 _engine = create_async_engine(
     _DB_URL,
     echo=False,
-    connect_args={"check_same_thread": False},
+    connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT},
 )
 _Session = async_sessionmaker(_engine, expire_on_commit=False)
 
 
+@event.listens_for(_engine.sync_engine, "connect")
+def _sqlite_pragmas(dbapi_conn, _record) -> None:
+    """WAL：读写互不阻塞；busy_timeout：锁冲突时等待而不是立即报 database is locked"""
+    cursor = dbapi_conn.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT * 1000}")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
 # ── ORM Base ──────────────────────────────────────────────────
 
 class _Base(DeclarativeBase):
@@ -73,6 +92,20 @@ class TaskModel(_Base):
     device_type     = Column(String, default="pc")
     device_id       = Column(String)
     package_name    = Column(String)
+    options         = Column(Text)          # JSON dict：截图格式等任务级采集选项
+    task_type       = Column(String, default="perf")   # perf / launch
+    # 摘要缓存：任务停止时由 DataCollect.summarize() 计算，任务列表无需读 CSV
+    duration        = Column(Float)         # 秒
+    sample_count    = Column(Integer)
+    data_size       = Column(Integer)       # 任务目录总字节数
+    cpu_avg         = Column(Float)
+    memory_avg      = Column(Float)
+    fps_avg         = Column(Float)
+    gpu_avg         = Column(Float)
+    summary_time    = Column(String)        # 摘要计算时间（已尝试过，即使没有任何指标数据）
+    # 数据保留策略（retention.py）的处理状态
+    rollup_seconds      = Column(Integer)                # 降采样粒度（秒），NULL = 待处理，0 = 保留全分辨率
+    screenshots_pruned  = Column(Integer, default=0)     # 1 = 截图已清理（只保留标签边界）
 
 
 class ComparisonReportModel(_Base):
@@ -85,6 +118,7 @@ class ComparisonReportModel(_Base):
     base_task_id = Column(Integer)
     report_path  = Column(String)
     description  = Column(Text)
+    result_json  = Column(Text)          # 导出时的对比结果（均值 / 差值），重新打开报告无需重算
 
 
 class LabelModel(_Base):
@@ -100,6 +134,39 @@ class LabelModel(_Base):
     create_time = Column(String)
 
 
+class MetricCatalogModel(_Base):
+    """每个任务、每个指标一行的聚合统计（任务停止时写入），趋势查询只读本表"""
+    __tablename__ = "metric_catalog"
+
+    id        = Column(Integer, primary_key=True, autoincrement=True)
+    task_id   = Column(Integer, nullable=False)
+    metric    = Column(String, nullable=False)
+    count     = Column(Integer)
+    mean      = Column(Float)
+    stdev     = Column(Float)
+    p50       = Column(Float)
+    p95       = Column(Float)
+    min       = Column(Float)
+    max       = Column(Float)
+
+
+class JobModel(_Base):
+    """后台作业（报告 / Excel 导出），状态落库以便服务重启后续跑"""
+    __tablename__ = "jobs"
+
+    id          = Column(String, primary_key=True)      # uuid hex
+    kind        = Column(String, nullable=False)
+    status      = Column(String, default="pending")     # pending / running / done / failed / cancelled
+    progress    = Column(Float, default=0)              # 0 ~ 100
+    message     = Column(String, default="")
+    params      = Column(Text)                          # JSON dict，重启后据此重新执行
+    result_path = Column(String)
+    error       = Column(Text)
+    create_time = Column(String)
+    start_time  = Column(String)
+    end_time    = Column(String)
+
+
 # ══════════════════════════════════════════════════════════════
 #  迁移：幂等地补列 / 建表
 # ══════════════════════════════════════════════════════════════
@@ -113,18 +180,46 @@ _MIGRATIONS: list[tuple[str, str, str]] = [
     ("tasks", "device_id",    "TEXT"),
     ("tasks", "package_name", "TEXT"),
     ("tasks", "include_child","INTEGER DEFAULT 0"),
+    ("tasks", "options",      "TEXT"),
+    ("tasks", "task_type",    "TEXT DEFAULT 'perf'"),
+    ("tasks", "duration",     "REAL"),
+    ("tasks", "sample_count", "INTEGER"),
+    ("tasks", "data_size",    "INTEGER"),
+    ("tasks", "cpu_avg",      "REAL"),
+    ("tasks", "memory_avg",   "REAL"),
+    ("tasks", "fps_avg",      "REAL"),
+    ("tasks", "gpu_avg",      "REAL"),
+    ("tasks", "summary_time", "TEXT"),
+    ("tasks", "rollup_seconds",     "INTEGER"),
+    ("tasks", "screenshots_pruned", "INTEGER DEFAULT 0"),
     ("comparison_reports", "report_path",  "TEXT"),
     ("comparison_reports", "description",  "TEXT"),
+    ("comparison_reports", "result_json",  "TEXT"),
     ("labels", "color",       "TEXT DEFAULT '#3b6ef0'"),
     ("labels", "note",        "TEXT DEFAULT ''"),
     ("labels", "create_time", "TEXT"),
 ]
 
+# 每个元素：(index_name, table, columns)
+_INDEXES: list[tuple[str, str, str]] = [
+    ("ix_tasks_status",                   "tasks",              "status"),
+    ("ix_tasks_version",                  "tasks",              "version"),
+    ("ix_tasks_device_type",              "tasks",              "device_type"),
+    ("ix_tasks_start_time",               "tasks",              "start_time"),
+    ("ix_labels_task_id",                 "labels",             "task_id"),
+    ("ix_comparison_reports_create_time", "comparison_reports", "create_time"),
+    ("ix_metric_catalog_metric_task",     "metric_catalog",     "metric, task_id"),
+    ("ix_metric_catalog_task_id",         "metric_catalog",     "task_id"),
+    ("ix_jobs_status",                    "jobs",               "status"),
+    ("ix_jobs_create_time",               "jobs",               "create_time"),
+]
+
 
 async def _run_migrations() -> None:
     """
     1. 用 ORM metadata 创建所有不存在的表（CREATE TABLE IF NOT EXISTS）。
     2. 逐列检查 _MIGRATIONS，缺失则 ALTER TABLE ADD COLUMN（SQLite 支持）。
+    3. CREATE INDEX IF NOT EXISTS 补齐 _INDEXES。
     """
     async with _engine.begin() as conn:
         # 建表（幂等）
@@ -141,6 +236,10 @@ async def _run_migrations() -> None:
                 )
                 logger.info(f"[migration] ALTER TABLE {table} ADD COLUMN {col}")
 
+        # 补索引
+        for name, table, cols in _INDEXES:
+            await conn.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({cols})")
+
 
 async def create_tables() -> None:
     """对外入口：建表 + 迁移，在 FastAPI lifespan 中调用。"""
@@ -148,6 +247,65 @@ async def create_tables() -> None:
     logger.info(f"数据库就绪: {DB_PATH}")
 
 
+# ══════════════════════════════════════════════════════════════
+#  单写者队列
+# ══════════════════════════════════════════════════════════════
+#
+# API 进程创建一个 multiprocessing.Queue，随 TaskHandle 传给采集子进程；
+# 子进程调用 submit_write() 只是入队，由 API 进程的 run_writer() 逐条执行。
+# 这样所有写库都发生在同一个进程里，任务启动/停止不会在 SQLite 锁上互相等待。
+
+# 允许通过队列执行的写操作（TaskCollection 方法名）
+_QUEUED_WRITES = {"set_task_running", "stop_task"}
+
+_write_queue: Any = None
+_in_collector = False
+
+
+def write_queue() -> Any:
+    """API 进程内惰性创建写队列"""
+    global _write_queue
+    if _write_queue is None:
+        _write_queue = multiprocessing.Queue()
+    return _write_queue
+
+
+def attach_write_queue(queue: Any) -> None:
+    """采集子进程启动时调用，此后 submit_write 改为入队"""
+    global _write_queue, _in_collector
+    _write_queue = queue
+    _in_collector = queue is not None
+
+
+async def submit_write(method: str, *args: Any) -> None:
+    """执行一次写操作：采集子进程内入队，否则直接执行"""
+    if method not in _QUEUED_WRITES:
+        raise ValueError(f"不支持的队列写操作: {method}")
+    if _in_collector:
+        _write_queue.put((method, args))
+        return
+    await getattr(TaskCollection, method)(*args)
+
+
+async def run_writer() -> None:
+    """API 进程内唯一的写者：顺序执行采集子进程提交的写操作，收到 None 退出"""
+    queue = write_queue()
+    while True:
+        item = await asyncio.to_thread(queue.get)
+        if item is None:
+            break
+        method, args = item
+        try:
+            await getattr(TaskCollection, method)(*args)
+        except Exception as e:
+            logger.error(f"[db writer] {method}{args} 失败: {e}")
+
+
+def stop_writer() -> None:
+    if _write_queue is not None and not _in_collector:
+        _write_queue.put(None)
+
+
 # ══════════════════════════════════════════════════════════════
 #  工具
 # ══════════════════════════════════════════════════════════════
@@ -156,6 +314,18 @@ def _now() -> str:
     return datetime.datetime.now().isoformat(sep=" ", timespec="seconds")
 
 
+def _encode_cursor(value: Any, row_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([value, row_id]).encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[Any, int]:
+    try:
+        value, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        return value, int(row_id)
+    except (ValueError, TypeError):
+        raise ValueError("无效的 cursor")
+
+
 def _model_to_dict(obj: Any) -> dict[str, Any]:
     """将 ORM 实例转为普通 dict（过滤 SQLAlchemy 内部属性）。"""
     return {
@@ -168,6 +338,17 @@ def _model_to_dict(obj: Any) -> dict[str, Any]:
 #  TaskCollection
 # ══════════════════════════════════════════════════════════════
 
+# 正在后台补算摘要的任务 ID（见 TaskCollection.request_summary）
+_summary_pending: set[int] = set()
+
+TASK_PAGE_SIZE = 50
+TASK_PAGE_MAX = 500
+# 任务列表允许的排序字段
+_TASK_TEXT_SORT = {"start_time", "end_time", "name", "version"}
+_TASK_SORTABLE = {"id", "duration", "sample_count", "data_size",
+                  "cpu_avg", "memory_avg", "fps_avg", "gpu_avg"} | _TASK_TEXT_SORT
+
+
 class TaskCollection:
 
     @classmethod
@@ -181,6 +362,8 @@ class TaskCollection:
         device_type: str = "pc",
         device_id: str | None = None,
         package_name: str | None = None,
+        options: dict[str, Any] | None = None,
+        task_type: str = "perf",
     ) -> tuple[int, str]:
         """创建任务，返回 (task_id, file_dir)"""
         async with _Session() as s, s.begin():
@@ -228,6 +411,8 @@ class TaskCollection:
                 device_type=device_type,
                 device_id=device_id,
                 package_name=package_name,
+                options=json.dumps(options or {}),
+                task_type=task_type,
             )
             s.add(task)
             await s.flush()          # 获取自增 id
@@ -257,8 +442,145 @@ class TaskCollection:
                 .values(status=2, end_time=_now())
             )
             task = await s.get(TaskModel, task_id)
+        if task and task.file_dir:
+            return await cls.refresh_summary(task_id)
+        return _model_to_dict(task)
+
+    @classmethod
+    async def refresh_summary(cls, task_id: int) -> dict[str, Any]:
+        """重新计算并缓存任务摘要（时长、采样数、数据大小、关键指标均值）"""
+        task = await cls.get_item_task(task_id)
+        collect = DataCollect(task["file_dir"] or "")
+        summary = await asyncio.to_thread(collect.summarize)
+        # 停止时补全时间索引，之后的区间查询无需再扫描
+        await asyncio.to_thread(collect.build_time_index)
+        metrics = summary.pop("metrics")
+        async with _Session() as s, s.begin():
+            await s.execute(update(TaskModel).where(TaskModel.id == task_id)
+                            .values(**summary, summary_time=_now()))
+            await MetricCatalogCollection.replace_task(s, task_id, metrics)
+            task = await s.get(TaskModel, task_id)
         return _model_to_dict(task)
 
+    @classmethod
+    async def backfill_summaries(cls) -> int:
+        """
+        为已停止但从未计算过摘要的旧任务补算，返回补算数量（启动时后台执行）。
+        计算过的任务记下 summary_time，没有任何指标数据或补算失败的任务也不会在下次启动时重读
+        """
+        async with _Session() as s:
+            ids = (await s.execute(
+                select(TaskModel.id)
+                .where(TaskModel.status == 2,
+                       TaskModel.file_dir.is_not(None),
+                       TaskModel.summary_time.is_(None),
+                       ~select(MetricCatalogModel.id)
+                       .where(MetricCatalogModel.task_id == TaskModel.id).exists())
+                .order_by(TaskModel.id.desc())
+            )).scalars().all()
+        for task_id in ids:
+            try:
+                await cls.refresh_summary(task_id)
+            except Exception as e:
+                logger.error(f"[catalog] 任务 {task_id} 摘要补算失败: {e}")
+                async with _Session() as s, s.begin():
+                    await s.execute(update(TaskModel).where(TaskModel.id == task_id).values(summary_time=_now()))
+        return len(ids)
+
+    @classmethod
+    def request_summary(cls, task_id: int) -> None:
+        """后台补算单个任务的摘要（不阻塞调用方；同一任务同时只排一次）"""
+        if task_id in _summary_pending:
+            return
+        _summary_pending.add(task_id)
+
+        async def _run() -> None:
+            try:
+                await cls.refresh_summary(task_id)
+            except Exception as e:
+                logger.error(f"[catalog] 任务 {task_id} 摘要补算失败: {e}")
+            finally:
+                _summary_pending.discard(task_id)
+
+        asyncio.create_task(_run())
+
+    @classmethod
+    async def archive_stopped_tasks(cls, limit: int = ARCHIVE_TASKS_PER_RUN) -> int:
+        """
+        把已停止任务的 CSV 归档为 .tsc（定时执行，每轮最多处理 limit 个任务），返回本轮归档的任务数。
+        最后一轮写入后静默不足 ARCHIVE_QUIET_SECONDS 的 CSV 留到下一轮；归档后 data_size 同步减去节省的字节
+        """
+        async with _Session() as s:
+            rows = (await s.execute(
+                select(TaskModel.id, TaskModel.file_dir)
+                .where(TaskModel.status == 2, TaskModel.file_dir.is_not(None))
+                .order_by(TaskModel.id)
+            )).all()
+        done = attempted = 0
+        for task_id, file_dir in rows:
+            if attempted >= limit:
+                break
+            if not await asyncio.to_thread(pending_csv, file_dir):
+                continue
+            attempted += 1
+            try:
+                saved = await asyncio.to_thread(archive_task, file_dir)
+            except Exception as e:
+                logger.error(f"[archive] 任务 {task_id} 归档失败: {e}")
+                continue
+            if not saved:
+                continue
+            # 已解码的数据按 CSV 路径缓存，归档后失效；pin 状态保留
+            task_data_cache.drop(file_dir, keep_pin=True)
+            await cls.record_reclaimed(task_id, saved)
+            done += 1
+        return done
+
+    @classmethod
+    async def record_reclaimed(cls, task_id: int, saved: int, **values: Any) -> None:
+        """归档 / 保留策略回收空间后：data_size 减去回收的字节，并更新 values 中的处理状态"""
+        async with _Session() as s, s.begin():
+            if values:
+                await s.execute(update(TaskModel).where(TaskModel.id == task_id).values(**values))
+            if saved:
+                await s.execute(
+                    update(TaskModel)
+                    .where(TaskModel.id == task_id, TaskModel.data_size.is_not(None))
+                    .values(data_size=TaskModel.data_size - saved)
+                )
+
+    @classmethod
+    async def retention_candidates(
+        cls,
+        rollup_before: str | None,
+        screenshot_before: str | None,
+        limit: int,
+    ) -> list[dict[str, Any]]:
+        """
+        需要执行保留策略的任务：已停止、非基线，且
+        结束时间早于 rollup_before 尚未降采样，或早于 screenshot_before 尚未清理截图；按结束时间从旧到新
+        """
+        due = []
+        if rollup_before:
+            due.append(and_(TaskModel.rollup_seconds.is_(None), TaskModel.end_time < rollup_before))
+        if screenshot_before:
+            due.append(and_(func.coalesce(TaskModel.screenshots_pruned, 0) == 0,
+                            TaskModel.end_time < screenshot_before))
+        if not due:
+            return []
+        async with _Session() as s:
+            rows = (await s.execute(
+                select(TaskModel)
+                .where(TaskModel.status == 2,
+                       func.coalesce(TaskModel.is_baseline, 0) == 0,
+                       TaskModel.file_dir.is_not(None),
+                       TaskModel.end_time.is_not(None),
+                       or_(*due))
+                .order_by(TaskModel.end_time, TaskModel.id)
+                .limit(limit)
+            )).scalars().all()
+        return [_model_to_dict(r) for r in rows]
+
     @classmethod
     async def get_all_task(cls) -> list[dict[str, Any]]:
         async with _Session() as s:
@@ -267,6 +589,81 @@ class TaskCollection:
             )).scalars().all()
         return [_model_to_dict(r) for r in rows]
 
+    @classmethod
+    async def list_tasks(
+        cls,
+        cursor: str | None = None,
+        limit: int = TASK_PAGE_SIZE,
+        status: int | None = None,
+        device_type: str | None = None,
+        version: str | None = None,
+        package_name: str | None = None,
+        start_from: str | None = None,
+        start_to: str | None = None,
+        sort: str = "id",
+        order: str = "desc",
+    ) -> dict[str, Any]:
+        """
+        游标分页 + 过滤 + 服务端排序：
+        {"items": [...], "next_cursor": "..." | None, "total": n}
+        cursor 为上一页返回的 next_cursor（编码了最后一行的 (排序值, id)），翻页不受新增任务影响。
+        已停止但还没有摘要的旧任务原样返回（摘要为空），摘要在后台补算。
+        """
+        if sort not in _TASK_SORTABLE:
+            raise ValueError(f"sort 仅支持: {', '.join(sorted(_TASK_SORTABLE))}")
+        desc = order != "asc"
+        limit = max(1, min(int(limit), TASK_PAGE_MAX))
+        column = getattr(TaskModel, sort)
+        # NULL 排序值统一折算，保证 (排序值, id) 严格有序
+        key = func.coalesce(column, "" if sort in _TASK_TEXT_SORT else -1)
+
+        filters = []
+        if status is not None:
+            filters.append(TaskModel.status == status)
+        if device_type:
+            filters.append(TaskModel.device_type == device_type)
+        if version:
+            filters.append(TaskModel.version == version)
+        if package_name:
+            filters.append(or_(TaskModel.package_name == package_name,
+                               TaskModel.target_pid_name == package_name))
+        if start_from:
+            filters.append(TaskModel.start_time >= start_from)
+        if start_to:
+            filters.append(TaskModel.start_time <= start_to)
+
+        page_filters = list(filters)
+        if cursor:
+            last_value, last_id = _decode_cursor(cursor)
+            if desc:
+                page_filters.append(or_(key < last_value, and_(key == last_value, TaskModel.id < last_id)))
+            else:
+                page_filters.append(or_(key > last_value, and_(key == last_value, TaskModel.id > last_id)))
+
+        async with _Session() as s:
+            stmt = select(TaskModel).where(*page_filters)
+            stmt = stmt.order_by(key.desc(), TaskModel.id.desc()) if desc \
+                else stmt.order_by(key.asc(), TaskModel.id.asc())
+            rows = (await s.execute(stmt.limit(limit + 1))).scalars().all()
+            total = (await s.execute(
+                select(func.count()).select_from(TaskModel).where(*filters)
+            )).scalar_one()
+
+        has_more = len(rows) > limit
+        items = [_model_to_dict(r) for r in rows[:limit]]
+        # 缺摘要的已停止任务先原样返回，摘要在后台补算，下次查询即可看到
+        for item in items:
+            if item["status"] == 2 and item["data_size"] is None and item["file_dir"]:
+                cls.request_summary(item["id"])
+
+        next_cursor = None
+        if has_more:
+            last = rows[limit - 1]
+            value = getattr(last, sort)
+            next_cursor = _encode_cursor("" if value is None and sort in _TASK_TEXT_SORT
+                                         else -1 if value is None else value, last.id)
+        return {"items": items, "next_cursor": next_cursor, "total": total}
+
     @classmethod
     async def get_item_task(cls, task_id: int) -> dict[str, Any]:
         async with _Session() as s:
@@ -285,6 +682,7 @@ class TaskCollection:
                 raise RuntimeError("任务运行中，不能删除")
             result = _model_to_dict(task)
             await s.delete(task)
+            await s.execute(delete(MetricCatalogModel).where(MetricCatalogModel.task_id == task_id))
         return result
 
     @classmethod
@@ -387,6 +785,14 @@ class ComparisonReportCollection:
             raise RuntimeError(f"对比报告 {report_id} 不存在")
         return _model_to_dict(report)
 
+    @classmethod
+    async def get_report_result(cls, report_id: int) -> dict[str, Any]:
+        """报告信息 + 导出时保存的对比结果（result，旧报告为 None）"""
+        report = await cls.get_report(report_id)
+        raw = report.pop("result_json", None)
+        report["result"] = json.loads(raw) if raw else None
+        return report
+
     @classmethod
     async def get_all_reports(cls) -> list[dict[str, Any]]:
         async with _Session() as s:
@@ -394,7 +800,13 @@ class ComparisonReportCollection:
                 select(ComparisonReportModel)
                 .order_by(ComparisonReportModel.id.desc())
             )).scalars().all()
-        return [_model_to_dict(r) for r in rows]
+        # 列表不带体积较大的对比结果，只标记是否已保存
+        result = []
+        for r in rows:
+            item = _model_to_dict(r)
+            item["has_result"] = bool(item.pop("result_json", None))
+            result.append(item)
+        return result
 
     @classmethod
     async def delete_report(cls, report_id: int) -> dict[str, Any]:
@@ -407,6 +819,146 @@ class ComparisonReportCollection:
         return result
 
 
+# ══════════════════════════════════════════════════════════════
+#  JobCollection
+# ══════════════════════════════════════════════════════════════
+
+# 尚未结束的作业状态
+JOB_ACTIVE_STATUSES = ("pending", "running")
+
+
+def _job_to_dict(job: JobModel) -> dict[str, Any]:
+    result = _model_to_dict(job)
+    result["params"] = json.loads(job.params) if job.params else {}
+    return result
+
+
+class JobCollection:
+
+    @classmethod
+    async def create_job(cls, job_id: str, kind: str, params: dict[str, Any]) -> dict[str, Any]:
+        async with _Session() as s, s.begin():
+            job = JobModel(id=job_id, kind=kind, status="pending", progress=0, message="",
+                           params=json.dumps(params, ensure_ascii=False), create_time=_now())
+            s.add(job)
+            await s.flush()
+            result = _job_to_dict(job)
+        return result
+
+    @classmethod
+    async def update_job(cls, job_id: str, **kwargs: Any) -> dict[str, Any]:
+        status = kwargs.get("status")
+        if status == "running":
+            kwargs.setdefault("start_time", _now())
+        elif status and status not in JOB_ACTIVE_STATUSES:
+            kwargs.setdefault("end_time", _now())
+        async with _Session() as s, s.begin():
+            await s.execute(update(JobModel).where(JobModel.id == job_id).values(**kwargs))
+            job = await s.get(JobModel, job_id)
+        if not job:
+            raise RuntimeError(f"作业 {job_id} 不存在")
+        return _job_to_dict(job)
+
+    @classmethod
+    async def set_progress(cls, job_id: str, progress: float, message: str = "") -> None:
+        """只更新仍在执行中的作业，避免迟到的进度覆盖最终状态"""
+        async with _Session() as s, s.begin():
+            await s.execute(
+                update(JobModel)
+                .where(JobModel.id == job_id, JobModel.status == "running")
+                .values(progress=progress, message=message)
+            )
+
+    @classmethod
+    async def get_job(cls, job_id: str) -> dict[str, Any]:
+        async with _Session() as s:
+            job = await s.get(JobModel, job_id)
+        if not job:
+            raise RuntimeError(f"作业 {job_id} 不存在")
+        return _job_to_dict(job)
+
+    @classmethod
+    async def list_jobs(cls, status: str | None = None, kind: str | None = None,
+                        limit: int = 50) -> list[dict[str, Any]]:
+        stmt = select(JobModel)
+        if status:
+            stmt = stmt.where(JobModel.status == status)
+        if kind:
+            stmt = stmt.where(JobModel.kind == kind)
+        async with _Session() as s:
+            rows = (await s.execute(
+                stmt.order_by(JobModel.create_time.desc()).limit(max(1, min(limit, 500)))
+            )).scalars().all()
+        return [_job_to_dict(r) for r in rows]
+
+    @classmethod
+    async def get_unfinished_jobs(cls) -> list[dict[str, Any]]:
+        """上次退出时仍在排队 / 执行的作业，按创建顺序"""
+        async with _Session() as s:
+            rows = (await s.execute(
+                select(JobModel)
+                .where(JobModel.status.in_(JOB_ACTIVE_STATUSES))
+                .order_by(JobModel.create_time.asc())
+            )).scalars().all()
+        return [_job_to_dict(r) for r in rows]
+
+
+# ══════════════════════════════════════════════════════════════
+#  MetricCatalogCollection
+# ══════════════════════════════════════════════════════════════
+
+class MetricCatalogCollection:
+    """跨任务指标目录：趋势 / 回归查询只读聚合行，不打开原始 CSV。"""
+
+    @classmethod
+    async def replace_task(cls, s: AsyncSession, task_id: int, metrics: dict[str, dict[str, Any]]) -> None:
+        """在调用方事务内替换某任务的全部目录行"""
+        await s.execute(delete(MetricCatalogModel).where(MetricCatalogModel.task_id == task_id))
+        s.add_all([MetricCatalogModel(task_id=task_id, metric=metric, **stats)
+                   for metric, stats in metrics.items()])
+
+    @classmethod
+    async def query(
+        cls,
+        metric: str,
+        device_type: str | None = None,
+        device_id: str | None = None,
+        package_name: str | None = None,
+        version: str | None = None,
+    ) -> list[dict[str, Any]]:
+        """
+        返回已停止任务在该指标上的目录行，附带任务的 version / device / package / is_baseline / start_time，
+        按任务开始时间升序
+        """
+        filters = [MetricCatalogModel.metric == metric, TaskModel.status == 2]
+        if device_type:
+            filters.append(TaskModel.device_type == device_type)
+        if device_id:
+            filters.append(TaskModel.device_id == device_id)
+        if package_name:
+            filters.append(or_(TaskModel.package_name == package_name,
+                               TaskModel.target_pid_name == package_name))
+        if version:
+            filters.append(TaskModel.version == version)
+        async with _Session() as s:
+            rows = (await s.execute(
+                select(MetricCatalogModel, TaskModel.version, TaskModel.device_type, TaskModel.device_id,
+                       TaskModel.serialno, TaskModel.package_name, TaskModel.target_pid_name,
+                       TaskModel.is_baseline, TaskModel.start_time, TaskModel.name)
+                .join(TaskModel, TaskModel.id == MetricCatalogModel.task_id)
+                .where(*filters)
+                .order_by(TaskModel.start_time.asc(), TaskModel.id.asc())
+            )).all()
+        result = []
+        for cat, version_, device_type_, device_id_, serialno, package, pid_name, is_baseline, start, name in rows:
+            item = _model_to_dict(cat)
+            item.update(version=version_ or "", device_type=device_type_, device_id=device_id_ or serialno,
+                        package_name=package or pid_name or "", is_baseline=bool(is_baseline),
+                        start_time=start, task_name=name or "")
+            result.append(item)
+        return result
+
+
 # ══════════════════════════════════════════════════════════════
 #  LabelCollection
 # ══════════════════════════════════════════════════════════════
@@ -0,0 +1,214 @@
+# coding: utf-8
+"""
+后台作业 — 报告 / Excel 导出等耗时操作放到有界进程池执行，API 事件循环只负责调度。
+
+作业类型通过 register_job(kind, build, prepare, finish) 注册：
+  prepare(params)                async，API 进程内：查库、整理载荷（轻量）
+  build(payload, progress)       同步，进程池内：读取 CSV / 生成文件，返回结果文件路径
+  finish(params, payload, path)  async，API 进程内：登记报告等写库操作（写库只在 API 进程）
+
+* 进度：build 调用 progress(pct, message)，经 multiprocessing.Queue 回传，由 API 进程写入 jobs 表
+* 取消：写取消标记文件；排队中的作业不再执行，执行中的作业在下次上报进度时抛 JobCancelled
+* 持久化：jobs 表保存状态与参数，服务重启后 pending / running 的作业按参数重新执行
+"""
+import asyncio
+import multiprocessing
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+
+from client_perf.db import JobCollection
+from client_perf.log import log as logger
+
+# 进程池大小：报告生成是纯 CPU 操作，最多占一半核心，至少 1 个
+JOB_WORKERS = max(1, min(2, (os.cpu_count() or 2) // 2))
+
+# 取消标记目录（跨进程可见，不依赖共享内存）
+JOB_DIR = Path(__file__).parent / "test_result" / ".jobs"
+
+
+class JobCancelled(Exception):
+    """作业被取消"""
+
+
+# kind -> (build, prepare, finish)
+_JOB_KINDS: dict[str, tuple[Callable, Optional[Callable], Optional[Callable]]] = {}
+
+
+def register_job(
+    kind: str,
+    build: Callable[[Any, Callable], str],
+    prepare: Optional[Callable[[dict], Awaitable[Any]]] = None,
+    finish: Optional[Callable[[dict, Any, str], Awaitable[None]]] = None,
+) -> None:
+    """注册作业类型；build 必须是模块级函数（需要被进程池序列化）"""
+    _JOB_KINDS[kind] = (build, prepare, finish)
+
+
+def job_kinds() -> list[str]:
+    return sorted(_JOB_KINDS)
+
+
+def _cancel_flag(job_id: str) -> Path:
+    return JOB_DIR / f"{job_id}.cancel"
+
+
+# ── 进程池侧 ──────────────────────────────────────────────────
+
+_progress_queue: Any = None
+
+
+def _init_worker(queue: Any) -> None:
+    global _progress_queue
+    _progress_queue = queue
+
+
+class JobProgress:
+    """传给 build 的进度回调；发现取消标记时抛 JobCancelled"""
+
+    def __init__(self, job_id: str) -> None:
+        self.job_id = job_id
+
+    def __call__(self, pct: float, message: str = "") -> None:
+        if _cancel_flag(self.job_id).exists():
+            raise JobCancelled(self.job_id)
+        if _progress_queue is not None:
+            _progress_queue.put((self.job_id, round(min(max(pct, 0.0), 100.0), 1), message))
+
+
+def _run_build(build: Callable, job_id: str, payload: Any) -> str:
+    return build(payload, JobProgress(job_id))
+
+
+# ── API 进程侧 ────────────────────────────────────────────────
+
+_pool: Optional[ProcessPoolExecutor] = None
+_queue: Any = None
+_slots: Optional[asyncio.Semaphore] = None
+_tasks: dict[str, asyncio.Task] = {}
+
+
+def _executor() -> ProcessPoolExecutor:
+    """惰性创建进程池；spawn 启动，避免 fork 带上事件循环与数据库连接线程"""
+    global _pool
+    if _pool is None:
+        ctx = multiprocessing.get_context("spawn")
+        _pool = ProcessPoolExecutor(max_workers=JOB_WORKERS, mp_context=ctx,
+                                    initializer=_init_worker, initargs=(_queue,))
+    return _pool
+
+
+async def _read_progress() -> None:
+    """把进程池回传的进度写入 jobs 表，收到 None 退出"""
+    while True:
+        item = await asyncio.to_thread(_queue.get)
+        if item is None:
+            break
+        job_id, pct, message = item
+        try:
+            await JobCollection.set_progress(job_id, pct, message)
+        except Exception as e:
+            logger.error(f"[jobs] 进度写入失败 {job_id}: {e}")
+
+
+async def _execute(job_id: str, kind: str, params: dict[str, Any]) -> None:
+    global _pool
+    build, prepare, finish = _JOB_KINDS[kind]
+    async with _slots:
+        if _cancel_flag(job_id).exists():
+            _cancel_flag(job_id).unlink(missing_ok=True)
+            return
+        await JobCollection.update_job(job_id, status="running", progress=0, message="准备数据", error=None)
+        try:
+            payload = await prepare(params) if prepare else params
+            loop = asyncio.get_running_loop()
+            path = await loop.run_in_executor(_executor(), _run_build, build, job_id, payload)
+            if finish:
+                await finish(params, payload, path)
+            await JobCollection.update_job(job_id, status="done", progress=100, message="完成", result_path=path)
+            logger.info(f"[jobs] {kind} {job_id} 完成: {path}")
+        except JobCancelled:
+            await JobCollection.update_job(job_id, status="cancelled", message="已取消")
+        except asyncio.CancelledError:
+            # 服务关闭：保持 running，下次启动时重新执行
+            raise
+        except BrokenProcessPool as e:
+            _pool = None
+            await JobCollection.update_job(job_id, status="failed", message="失败", error=f"工作进程异常退出: {e}")
+        except Exception as e:
+            logger.error(f"[jobs] {kind} {job_id} 失败: {e}")
+            await JobCollection.update_job(job_id, status="failed", message="失败", error=str(e))
+        finally:
+            _cancel_flag(job_id).unlink(missing_ok=True)
+
+
+def _schedule(job: dict[str, Any]) -> None:
+    job_id = job["id"]
+    task = asyncio.create_task(_execute(job_id, job["kind"], job["params"]))
+    _tasks[job_id] = task
+    task.add_done_callback(lambda _t: _tasks.pop(job_id, None))
+
+
+async def submit_job(kind: str, params: dict[str, Any]) -> dict[str, Any]:
+    """登记并排队一个作业，立即返回作业信息（含 id）"""
+    if kind not in _JOB_KINDS:
+        raise ValueError(f"不支持的作业类型: {kind}")
+    job = await JobCollection.create_job(uuid.uuid4().hex, kind, params)
+    _schedule(job)
+    return job
+
+
+async def wait_job(job_id: str) -> dict[str, Any]:
+    """等待作业结束（不阻塞事件循环）；请求断开不会取消作业本身"""
+    task = _tasks.get(job_id)
+    if task is not None:
+        await asyncio.shield(task)
+    return await JobCollection.get_job(job_id)
+
+
+async def cancel_job(job_id: str) -> dict[str, Any]:
+    job = await JobCollection.get_job(job_id)
+    if job["status"] not in ("pending", "running"):
+        raise RuntimeError(f"作业已结束（{job['status']}）")
+    JOB_DIR.mkdir(parents=True, exist_ok=True)
+    _cancel_flag(job_id).touch()
+    if job["status"] == "pending":
+        return await JobCollection.update_job(job_id, status="cancelled", message="已取消")
+    return await JobCollection.update_job(job_id, message="取消中")
+
+
+async def start_jobs() -> None:
+    """API 启动时调用：启动进度读取，并重新执行上次未完成的作业"""
+    global _queue, _slots
+    _queue = multiprocessing.get_context("spawn").Queue()
+    _slots = asyncio.Semaphore(JOB_WORKERS)
+    asyncio.create_task(_read_progress())
+    jobs = await JobCollection.get_unfinished_jobs()
+    # 已结束作业残留的取消标记（取消请求晚于作业结束）
+    unfinished = {job["id"] for job in jobs}
+    for flag in JOB_DIR.glob("*.cancel"):
+        if flag.stem not in unfinished:
+            flag.unlink(missing_ok=True)
+    for job in jobs:
+        if job["kind"] not in _JOB_KINDS:
+            await JobCollection.update_job(job["id"], status="failed", error=f"未知作业类型: {job['kind']}")
+            continue
+        if _cancel_flag(job["id"]).exists():
+            _cancel_flag(job["id"]).unlink(missing_ok=True)
+            await JobCollection.update_job(job["id"], status="cancelled", message="已取消")
+            continue
+        logger.info(f"[jobs] 重新执行未完成作业 {job['kind']} {job['id']}")
+        job = await JobCollection.update_job(job["id"], status="pending", progress=0, message="服务重启后重新排队")
+        _schedule(job)
+
+
+def stop_jobs() -> None:
+    global _pool
+    if _queue is not None:
+        _queue.put(None)
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -0,0 +1,505 @@
+# coding: utf-8
+"""
+报告生成 — 单任务 / 任务对比 / 标签对比 Excel，单任务另可导出 CSV 压缩包或 Parquet。
+
+* 全部以流式方式生成：openpyxl write_only 工作表逐行追加，数据按块从 CSV 读取
+  （DataCollect.iter_csv），不在内存里构造整本工作簿，内存占用与任务时长无关。
+* 生成是纯 CPU 的同步操作，不在 API 事件循环里执行：
+  每种报告注册为一个后台作业（见 jobs.py），分三段：
+    prepare_*  API 进程内查库、整理载荷（只含汇总数据与任务目录，不含原始序列）
+    build_*    进程池内读取 CSV / 生成文件，返回文件路径
+    finish_*   API 进程内登记对比报告（写库仍只发生在 API 进程）
+"""
+import asyncio
+import csv
+import io
+import json
+import tempfile
+import time
+import zipfile
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from openpyxl import Workbook
+
+from client_perf.cache import cached_comparison
+from client_perf.db import ComparisonReportCollection, TaskCollection
+from client_perf.jobs import register_job
+from client_perf.log import log as logger
+from client_perf.util import CATALOG_METRICS, DataCollect
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+# 报告保存目录
+REPORT_DIR = Path(__file__).parent / "test_result" / "excel_reports"
+REPORT_DIR.mkdir(exist_ok=True, parents=True)
+
+COMPARISON_REPORT_DIR = Path(__file__).parent / "test_result" / "comparison_reports"
+COMPARISON_REPORT_DIR.mkdir(exist_ok=True, parents=True)
+
+# 单任务导出格式
+EXPORT_FORMATS = ("xlsx", "csv_zip", "parquet")
+
+# 对比报告原始数据工作表：(metric_key, 标题)，数据来源 (csv_stem, 列前缀) 见 _RAW_SOURCES
+_RAW_METRICS = [
+    ("cpu", "CPU 使用率 (%)"),
+    ("memory", "内存使用量 (MB)"),
+    ("fps", "FPS"),
+    ("gpu", "GPU 使用率 (%)"),
+    ("threads", "线程数"),
+    ("handles", "句柄数"),
+    ("disk_read", "磁盘读取 (MB/s)"),
+    ("disk_write", "磁盘写入 (MB/s)"),
+    ("net_sent", "网络发送 (MB/s)"),
+    ("net_recv", "网络接收 (MB/s)"),
+]
+_RAW_SOURCES = {**CATALOG_METRICS, "handles": ("process_info", "num_handles")}
+
+
+def _no_progress(pct: float, message: str = "") -> None:
+    pass
+
+
+def _csv_files(save_dir: str) -> list[Path]:
+    return DataCollect(save_dir).csv_files
+
+
+def _iter_series(
+    save_dir: str,
+    metric: str,
+    start_ts: Optional[float] = None,
+    end_ts: Optional[float] = None,
+) -> Iterator[list[tuple[float, float]]]:
+    """按块流式读取某指标的 (time, value) 序列，可按时间区间过滤"""
+    stem, col_prefix = _RAW_SOURCES[metric]
+    path = DataCollect.data_file(save_dir, stem)
+    if path is None:
+        return
+    header = DataCollect.csv_header(path)
+    col = next((i for i, h in enumerate(header) if h.startswith(col_prefix)), None)
+    if col is None or "time" not in header:
+        return
+    t_col = header.index("time")
+    for chunk in DataCollect.iter_csv(path):
+        points = []
+        for row in chunk:
+            if len(row) <= max(col, t_col):
+                continue
+            t, v = row[t_col], row[col]
+            if not isinstance(t, (int, float)) or not isinstance(v, (int, float)):
+                continue
+            if (start_ts is not None and t < start_ts) or (end_ts is not None and t > end_ts):
+                continue
+            points.append((t, float(v)))
+        if points:
+            yield points
+
+
+def _write_series_blocks(ws, save_dir: str, start_ts: Optional[float] = None,
+                         end_ts: Optional[float] = None, progress=None) -> None:
+    """在 write_only 工作表中按指标依次追加「指标名 / 表头 / 数据 / 空行」块，无数据的指标跳过"""
+    progress = progress or _no_progress
+    for metric_key, metric_name in _RAW_METRICS:
+        started = False
+        for points in _iter_series(save_dir, metric_key, start_ts, end_ts):
+            if not started:
+                ws.append([metric_name])
+                ws.append(["时间", "值"])
+                started = True
+            for t, v in points:
+                # 转换时间戳为可读时间
+                ws.append([datetime.fromtimestamp(t).strftime("%Y-%m-%d %H:%M:%S"), v])
+            progress(None, f"写入 {metric_name}")
+        if started:
+            # 空行分隔不同指标
+            ws.append([])
+
+
+def _sheet_title(title: str, used: set[str]) -> str:
+    """工作表名最长 31 字符且不能重复"""
+    base = title[:31] or "Sheet"
+    name, n = base, 1
+    while name in used:
+        n += 1
+        suffix = f"_{n}"
+        name = base[:31 - len(suffix)] + suffix
+    used.add(name)
+    return name
+
+
+def _report_path(directory: Path, name: str, suffix: str) -> Path:
+    # 生成文件名
+    timestamp = time.strftime("%Y%m%d_%H%M%S")
+    return directory / f"{name}_{timestamp}{suffix}"
+
+
+class _Progress:
+    """把「第 i 个单元」换算成总进度；pct 传 None 时只刷新消息（同时检查取消）"""
+
+    def __init__(self, progress, total: int, start: float = 0.0, end: float = 90.0) -> None:
+        self.progress = progress or _no_progress
+        self.total = max(total, 1)
+        self.start, self.end = start, end
+        self.index = 0
+
+    def step(self, index: int, message: str = "") -> None:
+        self.index = index
+        self(None, message)
+
+    def __call__(self, pct: Optional[float], message: str = "") -> None:
+        done = self.start + (self.end - self.start) * self.index / self.total
+        self.progress(done if pct is None else pct, message)
+
+
+# ── 单任务导出（同步，进程池内执行）──────────────────────────────
+
+def create_excel_report(task_name: str, save_dir: str, progress=None) -> str:
+    """
+    导出单个任务的 Excel 报告：每个 CSV 一个工作表，表头沿用 CSV 表头（含单位）
+    """
+    try:
+        files = _csv_files(save_dir)
+        step = _Progress(progress, len(files))
+        wb = Workbook(write_only=True)
+        used: set[str] = set()
+        for i, path in enumerate(files):
+            step.step(i, f"写入 {path.stem}")
+            ws = wb.create_sheet(title=_sheet_title(path.stem, used))
+            header = DataCollect.csv_header(path)
+            rows = 0
+            if header:
+                ws.append(header)
+                for chunk in DataCollect.iter_csv(path):
+                    for row in chunk:
+                        ws.append(row)
+                    rows += len(chunk)
+                    step(None, f"写入 {path.stem}（{rows} 行）")
+            if not rows:
+                # 无数据时写入提示
+                ws.append(["无数据"])
+        if not files:
+            wb.create_sheet(title="无数据").append(["无数据"])
+
+        file_path = _report_path(REPORT_DIR, task_name, ".xlsx")
+        step(90, "保存文件")
+        wb.save(file_path)
+        logger.info(f"Excel 报告导出成功: {file_path}")
+        return str(file_path)
+    except Exception as e:
+        logger.error(f"导出 Excel 报告失败: {e}")
+        raise
+
+
+def create_csv_zip(task_name: str, save_dir: str, progress=None) -> str:
+    """把任务目录下的 CSV 原样打包为 zip（逐块压缩，不整体读入内存）；已归档的还原为 CSV 文本写入"""
+    files = _csv_files(save_dir)
+    step = _Progress(progress, len(files))
+    file_path = _report_path(REPORT_DIR, task_name, "_csv.zip")
+    with zipfile.ZipFile(file_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for i, path in enumerate(files):
+            step.step(i, f"压缩 {path.stem}.csv")
+            if path.suffix == ".csv":
+                zf.write(path, arcname=path.name)
+                continue
+            with zf.open(f"{path.stem}.csv", "w") as raw, \
+                    io.TextIOWrapper(raw, encoding="utf-8", newline="") as text:
+                csv.writer(text).writerows(DataCollect.iter_csv_text(path))
+    logger.info(f"CSV 压缩包导出成功: {file_path}")
+    return str(file_path)
+
+
+def _parquet_schema(header: list[str], sample: list[list[Any]]) -> "pa.Schema":
+    """首块数据推断列类型：全为数值的列用 float64，否则 string"""
+    fields = []
+    for i, name in enumerate(header):
+        values = [row[i] for row in sample if i < len(row) and row[i] is not None]
+        numeric = all(isinstance(v, (int, float)) for v in values)
+        fields.append(pa.field(name, pa.float64() if numeric else pa.string()))
+    return pa.schema(fields)
+
+
+def _parquet_batch(schema: "pa.Schema", chunk: list[list[Any]]) -> "pa.RecordBatch":
+    columns = []
+    for i, field in enumerate(schema):
+        col = [row[i] if i < len(row) else None for row in chunk]
+        if pa.types.is_floating(field.type):
+            col = [float(v) if isinstance(v, (int, float)) else None for v in col]
+        else:
+            col = [None if v is None else str(v) for v in col]
+        columns.append(pa.array(col, type=field.type))
+    return pa.RecordBatch.from_arrays(columns, schema=schema)
+
+
+def create_parquet_zip(task_name: str, save_dir: str, progress=None) -> str:
+    """每个 CSV 转为一个 Parquet 文件（按块写入行组），打包为 zip"""
+    if not PARQUET_AVAILABLE:
+        raise RuntimeError("未安装 pyarrow，无法导出 Parquet")
+    files = _csv_files(save_dir)
+    step = _Progress(progress, len(files))
+    file_path = _report_path(REPORT_DIR, task_name, "_parquet.zip")
+    with tempfile.TemporaryDirectory(dir=REPORT_DIR) as tmp, \
+            zipfile.ZipFile(file_path, "w", compression=zipfile.ZIP_STORED) as zf:
+        for i, path in enumerate(files):
+            step.step(i, f"转换 {path.name}")
+            header = DataCollect.csv_header(path)
+            if not header:
+                continue
+            out = Path(tmp) / f"{path.stem}.parquet"
+            writer = None
+            try:
+                for chunk in DataCollect.iter_csv(path):
+                    if writer is None:
+                        writer = pq.ParquetWriter(out, _parquet_schema(header, chunk), compression="zstd")
+                    writer.write_batch(_parquet_batch(writer.schema_arrow, chunk))
+                    step(None, f"转换 {path.name}")
+                if writer is None:
+                    writer = pq.ParquetWriter(out, pa.schema([pa.field(h, pa.string()) for h in header]))
+            finally:
+                if writer is not None:
+                    writer.close()
+            zf.write(out, arcname=out.name)
+            out.unlink()
+    logger.info(f"Parquet 导出成功: {file_path}")
+    return str(file_path)
+
+
+_TASK_EXPORTERS = {
+    "xlsx": create_excel_report,
+    "csv_zip": create_csv_zip,
+    "parquet": create_parquet_zip,
+}
+
+
+# ── 对比报告（同步，进程池内执行）────────────────────────────────
+
+def create_comparison_excel(data: dict, report_name: str, progress=None) -> str:
+    """
+    导出任务对比报告为 Excel；data["tasks"] 每项需带 file_dir，原始数据工作表从 CSV 流式读取
+    """
+    try:
+        tasks = data.get("tasks", [])
+        step = _Progress(progress, len(tasks))
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet(title="对比结果")
+
+        # 写入表头
+        ws.append([
+            "任务名称", "版本", "基准", "CPU 均值(%)", "内存均值(MB)",
+            "FPS 均值", "GPU 均值(%)", "线程数均值", "句柄数均值",
+            "磁盘读取均值(MB/s)", "磁盘写入均值(MB/s)", "网络发送均值(MB/s)", "网络接收均值(MB/s)"
+        ])
+        # 写入数据
+        for task in tasks:
+            avg = task.get("avg", {})
+            ws.append([
+                task.get("name", ""),
+                task.get("version", ""),
+                "是" if task.get("id") == data.get("base_task", {}).get("id") else "否",
+                *(avg.get(f"{key}_avg", "—") for key, _ in _RAW_METRICS),
+            ])
+
+        # 为每个任务添加原始数据工作表
+        used = {"对比结果"}
+        for i, task in enumerate(tasks):
+            task_name = task.get("name", "未知任务")
+            step.step(i, f"写入 {task_name}")
+            task_ws = wb.create_sheet(title=_sheet_title(f"{task_name}_{task.get('id', '')}", used))
+            if task.get("file_dir"):
+                _write_series_blocks(task_ws, task["file_dir"], progress=step)
+
+        file_path = _report_path(COMPARISON_REPORT_DIR, report_name, ".xlsx")
+        step(90, "保存文件")
+        wb.save(file_path)
+        logger.info(f"对比报告导出成功: {file_path}")
+        return str(file_path)
+    except Exception as e:
+        logger.error(f"导出对比报告失败: {e}")
+        raise
+
+
+def create_label_comparison_excel(data: dict, report_name: str, progress=None) -> str:
+    """
+    导出标签对比报告为 Excel；原始数据工作表按标签区间从 CSV 流式读取
+    """
+    try:
+        tasks = data.get("tasks", [])
+        step = _Progress(progress, len(tasks))
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet(title="标签对比结果")
+
+        # 写入表头
+        ws.append([
+            "任务名称", "版本", "标签名称", "开始时间", "结束时间",
+            "CPU 均值(%)", "内存均值(MB)", "FPS 均值", "GPU 均值(%)",
+            "线程数均值", "句柄数均值", "磁盘读取均值(MB/s)",
+            "磁盘写入均值(MB/s)", "网络发送均值(MB/s)", "网络接收均值(MB/s)"
+        ])
+        # 写入数据
+        for task in tasks:
+            avg = task.get("avg", {})
+            ws.append([
+                task.get("name", ""),
+                task.get("version", ""),
+                task.get("label_name", ""),
+                datetime.fromtimestamp(task.get("start_ts", 0)).strftime("%Y-%m-%d %H:%M:%S"),
+                datetime.fromtimestamp(task.get("end_ts", 0)).strftime("%Y-%m-%d %H:%M:%S"),
+                *(avg.get(f"{key}_avg", "—") for key, _ in _RAW_METRICS),
+            ])
+
+        # 为每个标签添加原始数据工作表
+        used = {"标签对比结果"}
+        for i, task in enumerate(tasks):
+            task_name = task.get("name", "未知任务")
+            label_name = task.get("label_name", "未知标签")
+            step.step(i, f"写入 {task_name}")
+            task_ws = wb.create_sheet(title=_sheet_title(f"{task_name}_{label_name}", used))
+            if task.get("file_dir"):
+                _write_series_blocks(task_ws, task["file_dir"], task.get("start_ts"), task.get("end_ts"), step)
+
+        file_path = _report_path(COMPARISON_REPORT_DIR, report_name, ".xlsx")
+        step(90, "保存文件")
+        wb.save(file_path)
+        logger.info(f"标签对比报告导出成功: {file_path}")
+        return str(file_path)
+    except Exception as e:
+        logger.error(f"导出标签对比报告失败: {e}")
+        raise
+
+
+# ── 任务对比数据 ──────────────────────────────────────────────
+
+def _series_stats(save_dir: str) -> dict[str, float | None]:
+    """按块流式统计各指标的均值 / 最大 / 最小值（键与 TaskComparison 的 avg 相同），不整体载入数据"""
+    result: dict[str, float | None] = {}
+    for metric, _ in _RAW_METRICS:
+        n, total, lo, hi = 0, 0.0, None, None
+        for points in _iter_series(save_dir, metric):
+            values = [v for _, v in points]
+            n += len(values)
+            total += sum(values)
+            lo = min(values) if lo is None else min(lo, *values)
+            hi = max(values) if hi is None else max(hi, *values)
+        result[f"{metric}_avg"] = round(total / n, 4) if n else None
+        result[f"{metric}_max"] = round(hi, 4) if n else None
+        result[f"{metric}_min"] = round(lo, 4) if n else None
+    return result
+
+
+async def comparison_export_data(task_ids: list[int], base_task_id: Optional[int] = None) -> dict[str, Any]:
+    """对比报告汇总：各任务指标均值及相对基准任务的差值，不含原始序列（结果缓存，见 cache.py）"""
+    base_id = base_task_id if base_task_id in task_ids else task_ids[0]
+    infos = [await TaskCollection.get_item_task(tid) for tid in task_ids]
+    return await cached_comparison(
+        "compare_tasks_export", infos, base_id, lambda: _compute_comparison_export(infos, base_id),
+    )
+
+
+async def _compute_comparison_export(infos: list[dict], base_id: int) -> dict[str, Any]:
+    from client_perf.comparison import diff_to_base
+    avgs = await asyncio.gather(*[asyncio.to_thread(_series_stats, info["file_dir"] or "") for info in infos])
+    tasks_result = [{
+        "id":       info["id"],
+        "file_dir": info["file_dir"],
+        "name":     info.get("name", ""),
+        "version":  info.get("version", ""),
+        "avg":      avg,
+    } for info, avg in zip(infos, avgs)]
+    diff_to_base(tasks_result, next(t["avg"] for t in tasks_result if t["id"] == base_id))
+    base_info = next(info for info in infos if info["id"] == base_id)
+    return {
+        "base_task": {
+            "id":      base_info["id"],
+            "name":    base_info.get("name", ""),
+            "version": base_info.get("version", ""),
+        },
+        "tasks": tasks_result,
+    }
+
+
+# ── 标签对比数据 ──────────────────────────────────────────────
+
+async def label_comparison_data(ids: list[int]) -> dict[str, Any]:
+    """标签对比结果（与 /compare_labels/ 共用计算与缓存），去掉逐点数据、补上任务目录供 build 流式读取"""
+    from client_perf.comparison import TaskComparison
+    data = await TaskComparison.compare_labels(ids)
+    # 结果来自缓存，复制后再改
+    tasks = []
+    for task in data["tasks"]:
+        task = {k: v for k, v in task.items() if k != "data"}
+        task["file_dir"] = (await TaskCollection.get_item_task(task["id"]))["file_dir"]
+        tasks.append(task)
+    return {**data, "tasks": tasks}
+
+
+# ── 作业定义 ──────────────────────────────────────────────────
+
+async def prepare_task_excel(params: dict[str, Any]) -> dict[str, Any]:
+    task = await TaskCollection.get_item_task(params["task_id"])
+    return {
+        "task_name": task.get("name") or f"任务{params['task_id']}",
+        "file_dir": task["file_dir"],
+        "format": params.get("format") or "xlsx",
+    }
+
+
+def build_task_excel(payload: dict[str, Any], progress) -> str:
+    exporter = _TASK_EXPORTERS[payload.get("format") or "xlsx"]
+    return exporter(payload["task_name"], payload["file_dir"], progress)
+
+
+async def prepare_comparison_excel(params: dict[str, Any]) -> dict[str, Any]:
+    # 只把汇总（均值 / 差值）传给进程池，原始序列由 build 按任务目录流式读取
+    data = await comparison_export_data(params["task_ids"], params.get("base_task_id"))
+    return {"data": data, "report_name": params["report_name"]}
+
+
+def build_comparison_excel(payload: dict[str, Any], progress) -> str:
+    return create_comparison_excel(payload["data"], payload["report_name"], progress)
+
+
+async def finish_comparison_excel(params: dict[str, Any], payload: dict[str, Any], file_path: str) -> None:
+    data = payload["data"]
+    task_ids = params["task_ids"]
+    report = await ComparisonReportCollection.create_report(
+        name=params["report_name"],
+        task_ids=task_ids,
+        base_task_id=data["base_task"]["id"],
+        description=f"对比任务: {','.join(map(str, task_ids))}",
+    )
+    await ComparisonReportCollection.update_report(
+        report["id"], report_path=file_path, result_json=json.dumps(data, ensure_ascii=False, default=str),
+    )
+
+
+async def prepare_label_comparison_excel(params: dict[str, Any]) -> dict[str, Any]:
+    data = await label_comparison_data(params["label_ids"])
+    return {"data": data, "report_name": params["report_name"]}
+
+
+def build_label_comparison_excel(payload: dict[str, Any], progress) -> str:
+    return create_label_comparison_excel(payload["data"], payload["report_name"], progress)
+
+
+async def finish_label_comparison_excel(params: dict[str, Any], payload: dict[str, Any], file_path: str) -> None:
+    data = payload["data"]
+    report = await ComparisonReportCollection.create_report(
+        name=params["report_name"],
+        task_ids=[t["id"] for t in data["tasks"]],
+        base_task_id=data["base_task"]["id"],
+        description=f"对比标签: {','.join(map(str, params['label_ids']))}",
+    )
+    await ComparisonReportCollection.update_report(
+        report["id"], report_path=file_path, result_json=json.dumps(data, ensure_ascii=False, default=str),
+    )
+
+
+register_job("task_excel", build_task_excel, prepare_task_excel)
+register_job("comparison_excel", build_comparison_excel, prepare_comparison_excel, finish_comparison_excel)
+register_job("label_comparison_excel", build_label_comparison_excel,
+             prepare_label_comparison_excel, finish_label_comparison_excel)
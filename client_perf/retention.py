@@ -0,0 +1,273 @@
+# coding: utf-8
+"""
+数据保留策略 — 定时对旧任务降采样、清理截图，回收磁盘空间。
+
+策略保存在 test_result/retention.json，通过 /retention_policy/ 查看、/set_retention_policy/ 修改：
+  enabled               总开关
+  full_resolution_days  结束超过这么多天的任务降采样为 rollup_seconds 秒一行；0 = 不降采样
+  rollup_seconds        降采样粒度：数值列取均值，另加 <列>_min / <列>_max 两列；
+                        文本列（JSON 等）取区间内最后一个值
+  screenshot_days       结束超过这么多天的任务只保留标签起止时间前后最近的截图；0 = 不清理
+  tasks_per_run         每轮最多处理的任务数
+  max_mb_per_run        每轮最多读取的数据量（MB），超过后剩余任务留到下一轮
+
+* 基线任务（is_baseline）与未停止的任务永远不处理
+* 处理状态记在 tasks 表（rollup_seconds / screenshots_pruned），已处理的任务不再重复读取
+* 任务摘要与指标目录保留停止时按全分辨率计算的结果，不随降采样改变
+* 降采样结果先写成 CSV 替换原文件，随后由归档作业（archive.py）重新压缩为 .tsc
+"""
+import asyncio
+import csv
+import datetime
+import itertools
+import json
+import os
+from pathlib import Path
+from typing import Any, Optional
+
+from client_perf.archive import DATA_REWRITE_LOCK, parse_value
+from client_perf.core.screenshot import prune_screenshots
+from client_perf.db import LabelCollection, TaskCollection
+from client_perf.log import log as logger
+from client_perf.util import DataCollect, task_data_cache
+
+RETENTION_FILE = Path(__file__).parent / "test_result" / "retention.json"
+
+# 调度间隔（分钟）
+RETENTION_INTERVAL_MINUTES = 10
+
+# 降采样时跳过的 CSV：launch.csv 每行是一次独立的启动测量，不是时间序列
+ROLLUP_SKIP_STEMS = {"launch"}
+
+# 判断列是否为数值列时抽样的行数
+_SAMPLE_ROWS = 1000
+
+DEFAULT_POLICY: dict[str, Any] = {
+    "enabled": True,
+    "full_resolution_days": 30,
+    "rollup_seconds": 10,
+    "screenshot_days": 7,
+    "tasks_per_run": 2,
+    "max_mb_per_run": 256,
+}
+
+
+# ── 策略配置 ──────────────────────────────────────────────────
+
+def load_policy() -> dict[str, Any]:
+    """当前策略：retention.json 中的设置覆盖默认值"""
+    policy = dict(DEFAULT_POLICY)
+    try:
+        saved = json.loads(RETENTION_FILE.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return policy
+    except (OSError, ValueError) as e:
+        logger.warning(f"[retention] 读取保留策略失败，使用默认值: {e}")
+        return policy
+    policy.update({k: v for k, v in saved.items() if k in DEFAULT_POLICY})
+    return policy
+
+
+def save_policy(changes: dict[str, Any]) -> dict[str, Any]:
+    """校验并保存策略修改（值为 None 的项不变），返回修改后的完整策略"""
+    policy = load_policy()
+    for key, value in changes.items():
+        if value is None:
+            continue
+        if key not in DEFAULT_POLICY:
+            raise ValueError(f"未知的保留策略项: {key}")
+        if key == "enabled":
+            policy[key] = bool(value)
+            continue
+        value = int(value)
+        if value < 0:
+            raise ValueError(f"{key} 不能为负数")
+        policy[key] = value
+    if policy["rollup_seconds"] < 2:
+        raise ValueError("rollup_seconds 至少为 2 秒")
+    if policy["tasks_per_run"] < 1 or policy["max_mb_per_run"] < 1:
+        raise ValueError("tasks_per_run / max_mb_per_run 至少为 1")
+    RETENTION_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = RETENTION_FILE.with_name(RETENTION_FILE.name + ".tmp")
+    tmp.write_text(json.dumps(policy, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, RETENTION_FILE)
+    return policy
+
+
+# ── 降采样（同步，在线程中执行）────────────────────────────────
+
+def _suffixed(name: str, suffix: str) -> str:
+    """cpu_usage(%) + _min → cpu_usage_min(%)"""
+    base, sep, unit = name.partition("(")
+    return f"{base}{suffix}{sep}{unit}"
+
+
+def _numeric_column(sample: list[list[str]], col: int) -> bool:
+    values = [parse_value(r[col]) for r in sample if col < len(r) and r[col] != ""]
+    return bool(values) and all(isinstance(v, (int, float)) for v in values)
+
+
+class _Bucket:
+    """一个降采样区间内各列的累计值"""
+
+    def __init__(self, start: int, width: int, numeric: list[int]) -> None:
+        self.start = start
+        self.width = width
+        self.last = [""] * width                        # 每列最后一个非空文本
+        self.sums = {c: 0.0 for c in numeric}
+        self.counts = {c: 0 for c in numeric}
+        self.mins: dict[int, tuple[float, str]] = {}    # 列 -> (值, 原文本)
+        self.maxs: dict[int, tuple[float, str]] = {}
+
+    def add(self, row: list[str]) -> None:
+        for c, text in enumerate(row[:self.width]):
+            if text == "":
+                continue
+            self.last[c] = text
+            if c not in self.sums:
+                continue
+            v = parse_value(text)
+            if not isinstance(v, (int, float)):
+                continue
+            self.sums[c] += v
+            self.counts[c] += 1
+            if c not in self.mins or v < self.mins[c][0]:
+                self.mins[c] = (v, text)
+            if c not in self.maxs or v > self.maxs[c][0]:
+                self.maxs[c] = (v, text)
+
+    def row(self, time_col: int) -> list[str]:
+        out = list(self.last)
+        out[time_col] = str(self.start)
+        extra = []
+        for c in self.sums:
+            if self.counts[c]:
+                out[c] = repr(round(self.sums[c] / self.counts[c], 4))
+                extra += [self.mins[c][1], self.maxs[c][1]]
+            else:
+                extra += ["", ""]
+        return out + extra
+
+
+def rollup_file(path: Path, seconds: int) -> Optional[Path]:
+    """
+    把一个数据文件（CSV 或归档）降采样为 seconds 秒一行，结果写回 <stem>.csv 并删除原归档 / 时间索引；
+    没有 time 列的文件不处理，返回 None
+    """
+    rows = DataCollect.iter_csv_text(path)
+    header = next(rows, None)
+    if not header or "time" not in header:
+        return None
+    time_col = header.index("time")
+    width = len(header)
+    sample = list(itertools.islice(rows, _SAMPLE_ROWS))
+    numeric = [c for c in range(width) if c != time_col and _numeric_column(sample, c)]
+    out_header = header + [_suffixed(header[c], s) for c in numeric for s in ("_min", "_max")]
+
+    csv_path = path.with_suffix(".csv")
+    tmp = csv_path.with_name(csv_path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(out_header)
+        bucket: Optional[_Bucket] = None
+        for row in itertools.chain(sample, rows):
+            t = parse_value(row[time_col]) if time_col < len(row) else None
+            if not isinstance(t, (int, float)):
+                continue
+            start = int(t // seconds * seconds)
+            if bucket is None or start != bucket.start:
+                if bucket is not None:
+                    writer.writerow(bucket.row(time_col))
+                bucket = _Bucket(start, width, numeric)
+            bucket.add(row)
+        if bucket is not None:
+            writer.writerow(bucket.row(time_col))
+    os.replace(tmp, csv_path)
+    if path != csv_path:
+        path.unlink(missing_ok=True)
+    csv_path.with_suffix(".idx").unlink(missing_ok=True)
+    return csv_path
+
+
+def _file_bytes(*paths: Path) -> int:
+    return sum(p.stat().st_size for p in paths if p.exists())
+
+
+def rollup_task(save_dir: str, seconds: int) -> tuple[int, int]:
+    """降采样任务目录下的全部数据文件，返回 (释放的字节数, 读取的字节数)"""
+    freed = read = 0
+    for path in DataCollect(save_dir).csv_files:
+        if path.stem in ROLLUP_SKIP_STEMS:
+            continue
+        with DATA_REWRITE_LOCK:
+            if not path.exists():
+                continue
+            before = _file_bytes(path, path.with_suffix(".idx"))
+            read += path.stat().st_size
+            out = rollup_file(path, seconds)
+            if out is not None:
+                freed += before - out.stat().st_size
+    return freed, read
+
+
+# ── 调度 ──────────────────────────────────────────────────────
+
+_run_lock = asyncio.Lock()
+
+
+def _cutoff(now: datetime.datetime, days: int) -> Optional[str]:
+    """结束时间早于该值的任务到期（与 tasks.end_time 同格式）；days 为 0 表示不启用"""
+    if not days:
+        return None
+    return (now - datetime.timedelta(days=days)).isoformat(sep=" ", timespec="seconds")
+
+
+async def run_retention() -> dict[str, Any]:
+    """执行一轮保留策略（调度器定时调用，也可通过 /run_retention/ 手动触发），返回本轮统计"""
+    stats = {"rolled_up": 0, "screenshots_pruned": 0, "freed_bytes": 0, "read_bytes": 0}
+    policy = load_policy()
+    if not policy["enabled"] or _run_lock.locked():
+        return stats
+    async with _run_lock:
+        now = datetime.datetime.now()
+        rollup_before = _cutoff(now, policy["full_resolution_days"])
+        screenshot_before = _cutoff(now, policy["screenshot_days"])
+        budget = policy["max_mb_per_run"] * 1024 * 1024
+        tasks = await TaskCollection.retention_candidates(rollup_before, screenshot_before, policy["tasks_per_run"])
+        for task in tasks:
+            if stats["read_bytes"] >= budget:
+                break
+            # 排队期间可能被设为基线
+            task = await TaskCollection.get_item_task(task["id"])
+            if task["is_baseline"] or task["status"] != 2:
+                continue
+            values: dict[str, Any] = {}
+            freed = 0
+            if rollup_before and task["rollup_seconds"] is None and task["end_time"] < rollup_before:
+                seconds = policy["rollup_seconds"]
+                try:
+                    saved, read = await asyncio.to_thread(rollup_task, task["file_dir"], seconds)
+                    freed += saved
+                    stats["read_bytes"] += read
+                    stats["rolled_up"] += 1
+                    values["rollup_seconds"] = seconds
+                except Exception as e:
+                    logger.error(f"[retention] 任务 {task['id']} 降采样失败，保留全分辨率: {e}")
+                    values["rollup_seconds"] = 0
+            if screenshot_before and not task["screenshots_pruned"] and task["end_time"] < screenshot_before:
+                labels = await LabelCollection.get_labels_by_task(task["id"])
+                keep_ts = [ts for label in labels for ts in (label["start_ts"], label["end_ts"])]
+                try:
+                    freed += await asyncio.to_thread(prune_screenshots, task["file_dir"], keep_ts)
+                    stats["screenshots_pruned"] += 1
+                    values["screenshots_pruned"] = 1
+                except OSError as e:
+                    logger.error(f"[retention] 任务 {task['id']} 截图清理失败: {e}")
+            # 已解码的数据已过期；pin 状态保留
+            task_data_cache.drop(task["file_dir"], keep_pin=True)
+            await TaskCollection.record_reclaimed(task["id"], freed, **values)
+            stats["freed_bytes"] += freed
+    if stats["rolled_up"] or stats["screenshots_pruned"]:
+        logger.info(f"[retention] 降采样 {stats['rolled_up']} 个任务，清理截图 {stats['screenshots_pruned']} 个任务，"
+                    f"释放 {stats['freed_bytes']} 字节")
+    return stats
@@ -3,6 +3,7 @@
 TaskHandle — 每个性能采集任务在独立子进程中运行。
 
 支持平台：pc / android / ios / harmony
+任务类型：perf（持续采集）/ launch（启动耗时测量，见 core/launch.py；iOS 暂不支持）
 """
 import asyncio
 import os
@@ -11,7 +12,7 @@ from multiprocessing import Process
 
 import psutil
 
-from client_perf.db import TaskCollection
+from client_perf.db import attach_write_queue, submit_write, write_queue
 from client_perf.log import log as logger
 
 
@@ -28,6 +29,8 @@ class TaskHandle(Process):
         device_type: str = "pc",
         device_id: str | None = None,
         package_name: str | None = None,
+        options: dict | None = None,
+        db_queue=None,
     ) -> None:
         super().__init__(daemon=True)
         self.serialno = serialno
@@ -39,6 +42,9 @@ class TaskHandle(Process):
         self.device_type = device_type
         self.device_id = device_id
         self.package_name = package_name
+        self.options = options or {}
+        # 子进程不直接写库，经 API 进程的单写者队列提交
+        self.db_queue = db_queue if db_queue is not None else write_queue()
 
         os.makedirs(self.file_dir, exist_ok=True)
 
@@ -50,10 +56,13 @@ class TaskHandle(Process):
             f"device_type={self.device_type} device_id={self.device_id} "
             f"package={self.package_name}"
         )
-        asyncio.run(TaskCollection.set_task_running(self.task_id, self.pid))
+        attach_write_queue(self.db_queue)
+        asyncio.run(submit_write("set_task_running", self.task_id, self.pid))
 
         try:
-            if self.device_type == "android":
+            if self.options.get("task_type") == "launch":
+                self._run_launch()
+            elif self.device_type == "android":
                 self._run_android()
             elif self.device_type == "ios":
                 self._run_ios()
@@ -69,7 +78,8 @@ class TaskHandle(Process):
     def _run_pc(self) -> None:
         from client_perf.core.pc_tools import perf as pc_perf
         asyncio.run(
-            pc_perf(self.target_pid, self.file_dir, include_child=self.include_child)
+            pc_perf(self.target_pid, self.file_dir, include_child=self.include_child,
+                    options=self.options, task_id=self.task_id)
         )
 
     def _run_android(self) -> None:
@@ -84,6 +94,8 @@ class TaskHandle(Process):
                 pid=self.target_pid,
                 save_dir=self.file_dir,
                 include_child=self.include_child,
+                options=self.options,
+                task_id=self.task_id,
             )
         )
 
@@ -96,6 +108,8 @@ class TaskHandle(Process):
                 pid=self.target_pid,
                 save_dir=self.file_dir,
                 include_child=self.include_child,
+                options=self.options,
+                task_id=self.task_id,
             )
         )
 
@@ -111,9 +125,28 @@ class TaskHandle(Process):
                 pid=self.target_pid,
                 save_dir=self.file_dir,
                 include_child=self.include_child,
+                options=self.options,
+                task_id=self.task_id,
             )
         )
 
+    def _run_launch(self) -> None:
+        if self.device_type == "android":
+            from client_perf.core.android_tools import android_launch
+            coro = android_launch(self.device_id, self.package_name or "", self.file_dir,
+                                  options=self.options, task_id=self.task_id)
+        elif self.device_type == "harmony":
+            from client_perf.core.harmony_tools import harmony_launch
+            coro = harmony_launch(self.device_id, self.package_name or "", self.file_dir,
+                                  options=self.options, task_id=self.task_id)
+        elif self.device_type == "pc":
+            from client_perf.core.pc_tools import launch as pc_launch
+            coro = pc_launch(self.file_dir, options=self.options, task_id=self.task_id)
+        else:
+            logger.error(f"启动耗时测量不支持 device_type={self.device_type}")
+            return
+        asyncio.run(coro)
+
     # ── 停止 ──────────────────────────────────────────────────
 
     @staticmethod
@@ -1,14 +1,298 @@
 # coding: utf-8
 """
 DataCollect — 读取任务目录下所有 CSV，返回结构化 JSON 数据。
+
+API 进程内解码后的 CSV 行缓存在 task_data_cache（TaskDataCache）中，
+/result/、对比、区间对比等接口短时间内重复读取同一任务时不再重复解析。
+
+每个 CSV 旁有一个稀疏时间索引 <stem>.idx（每 TIME_INDEX_EVERY 行记录一次 时间 → 字节偏移），
+get_range() 二分定位后只读取时间窗口附近的字节。
+
+已停止任务的 CSV 会被归档为 <stem>.tsc（见 archive.py），本模块的读取接口对两种格式透明。
 """
 import asyncio
+import bisect
 import csv
+import io
+import json
+import os
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterator, Optional
 
+from client_perf.archive import ARCHIVE_SUFFIX, iter_blocks, iter_text_rows, parse_value, read_footer, read_records
+from client_perf.cache import LruCache
 from client_perf.log import log as logger
 
+# 指标目录（metric_catalog）统计的指标：metric_key -> (csv_stem, csv_column_prefix)
+CATALOG_METRICS: dict[str, tuple[str, str]] = {
+    "cpu":        ("cpu",          "cpu_usage"),
+    "memory":     ("memory",       "process_memory_usage"),
+    "fps":        ("fps",          "fps"),
+    "gpu":        ("gpu",          "gpu"),
+    "threads":    ("process_info", "num_threads"),
+    "disk_read":  ("disk_io",      "disk_read_rate"),
+    "disk_write": ("disk_io",      "disk_write_rate"),
+    "net_sent":   ("network_io",   "net_sent_rate"),
+    "net_recv":   ("network_io",   "net_recv_rate"),
+    "launch_total":     ("launch", "total"),
+    "launch_displayed": ("launch", "displayed"),
+}
+
+# 同时缓存到 tasks 表 <metric>_avg 列、供任务列表直接展示的指标
+SUMMARY_METRICS = ("cpu", "memory", "fps", "gpu")
+
+# 流式读取时每块行数（导出按块处理，内存占用与任务时长无关）
+CHUNK_ROWS = 5000
+
+
+# ── 已解码数据缓存 ────────────────────────────────────────────
+
+# 缓存容量（字节）；解码成 dict 后的内存按 CSV 字节数 × _DECODED_FACTOR 估算
+TASK_DATA_CACHE_BYTES = 512 * 1024 * 1024
+_DECODED_FACTOR = 6
+
+
+def _decode_rows(path: str, offset: int, header: Optional[list[str]]) -> tuple[Optional[list[str]], list[dict[str, Any]], int]:
+    """
+    从 offset 起解码完整的行，返回 (表头, 新增记录, 新偏移)；
+    采集进程可能正写到一半，未以换行结尾的最后一行留到下次再读
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read()
+    end = data.rfind(b"\n")
+    if end < 0:
+        return header, [], offset
+    reader = csv.reader(io.StringIO(data[:end + 1].decode("utf-8"), newline=""))
+    if header is None:
+        header = next(reader, None)
+        if header is None:
+            return None, [], offset + end + 1
+    records: list[dict[str, Any]] = []
+    width = len(header)
+    for row in reader:
+        if not row:
+            continue
+        if len(row) < width:
+            row = row + [None] * (width - len(row))
+        records.append({k: parse_value(v) for k, v in zip(header, row)})
+    return header, records, offset + end + 1
+
+
+def _decode_archive(path: str) -> tuple[list[str], list[dict[str, Any]], int]:
+    """解码整个归档文件，返回 (表头, 记录, 原 CSV 字节数)"""
+    footer = read_footer(path)
+    return footer["header"], read_records(path), footer["source_size"]
+
+
+class _CsvEntry:
+    __slots__ = ("records", "header", "offset", "inode", "mtime_ns", "size")
+
+    def __init__(self, records, header, offset, inode, mtime_ns, size) -> None:
+        self.records = records
+        self.header = header
+        self.offset = offset
+        self.inode = inode
+        self.mtime_ns = mtime_ns
+        self.size = size
+
+
+class TaskDataCache:
+    """
+    已解码 CSV 行的进程内缓存，键为 CSV 路径：
+    * 文件未变化（inode / mtime / 大小相同）直接返回
+    * 文件只增长（采集中的任务追加写）时从上次读到的偏移继续，只解码新增的行
+    * 文件变短或 inode 变化（被重写）时整文件重新读取
+    * 归档文件（.tsc）不会追加，变化时整文件重新解码，容量按原 CSV 字节数估算
+    * 按估算字节数 LRU 淘汰；pin 的任务目录（只允许已停止的任务）不参与淘汰
+    返回的列表是共享引用，调用方不得原地修改。
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self._pinned: set[str] = set()
+        self._lru = LruCache(max_bytes, is_pinned=lambda key: os.path.dirname(key) in self._pinned)
+        # 同一文件的并发读取只解析一次：锁只在有调用方持有 / 等待时存在，最后一个调用方退出时删除
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._lock_users: dict[str, int] = {}
+
+    async def records(self, path: Path) -> list[dict[str, Any]]:
+        key = os.path.abspath(path)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        self._lock_users[key] = self._lock_users.get(key, 0) + 1
+        try:
+            async with lock:
+                return await self._load(key)
+        finally:
+            self._lock_users[key] -= 1
+            if not self._lock_users[key]:
+                del self._lock_users[key]
+                del self._locks[key]
+
+    async def _load(self, key: str) -> list[dict[str, Any]]:
+        try:
+            st = os.stat(key)
+        except OSError:
+            self._lru.pop(key)
+            raise
+        entry = self._lru.get(key)
+        if entry is not None and entry.inode == st.st_ino and (entry.mtime_ns, entry.size) == (st.st_mtime_ns, st.st_size):
+            return entry.records
+        if key.endswith(ARCHIVE_SUFFIX):
+            header, records, source_size = await asyncio.to_thread(_decode_archive, key)
+            self._lru.put(key, _CsvEntry(records, header, st.st_size, st.st_ino, st.st_mtime_ns, st.st_size),
+                          source_size * _DECODED_FACTOR)
+            return records
+        if entry is not None and entry.inode == st.st_ino and st.st_size >= entry.offset:
+            header, new, offset = await asyncio.to_thread(_decode_rows, key, entry.offset, entry.header)
+            # 生成新列表，已返回给调用方的旧列表保持不变
+            records = entry.records + new if new else entry.records
+        else:
+            header, records, offset = await asyncio.to_thread(_decode_rows, key, 0, None)
+        self._lru.put(key, _CsvEntry(records, header, offset, st.st_ino, st.st_mtime_ns, st.st_size),
+                      offset * _DECODED_FACTOR)
+        return records
+
+    def pin(self, save_dir: str) -> None:
+        self._pinned.add(os.path.abspath(save_dir))
+
+    def unpin(self, save_dir: str) -> None:
+        self._pinned.discard(os.path.abspath(save_dir))
+
+    def is_pinned(self, save_dir: str) -> bool:
+        return os.path.abspath(save_dir) in self._pinned
+
+    def pinned_bytes(self) -> int:
+        return sum(self._lru.size_of(k) for k in self._lru.keys() if self._lru.is_pinned(k))
+
+    def drop(self, save_dir: str, keep_pin: bool = False) -> None:
+        """删除任务时释放其缓存；keep_pin=True 时只丢弃已解码的数据（如归档后 CSV 路径已失效）"""
+        save_dir = os.path.abspath(save_dir)
+        if not keep_pin:
+            self._pinned.discard(save_dir)
+        for key in self._lru.keys():
+            if os.path.dirname(key) == save_dir:
+                self._lru.pop(key)
+
+    def stats(self) -> dict[str, Any]:
+        return {**self._lru.stats(), "pinned_dirs": len(self._pinned), "pinned_bytes": self.pinned_bytes()}
+
+
+task_data_cache = TaskDataCache(TASK_DATA_CACHE_BYTES)
+
+
+# ── 稀疏时间索引 ──────────────────────────────────────────────
+#
+# <stem>.idx 为 JSON：{"every", "header", "header_end", "size", "since", "times", "offsets"}
+#   size       已索引到的字节数（只含完整行），CSV 变长时从这里继续扫描
+#   since      最后一个索引点之后已扫描的行数
+#   times[i]   第 i 个索引点所在行的时间，offsets[i] 为该行行首的字节偏移
+# 采集按时间顺序追加写，times 单调不减，可二分查找。
+
+TIME_INDEX_EVERY = 256
+TIME_INDEX_SUFFIX = ".idx"
+
+
+def _index_path(csv_path: Path) -> Path:
+    return Path(csv_path).with_suffix(TIME_INDEX_SUFFIX)
+
+
+def _load_index(csv_path: Path) -> Optional[dict[str, Any]]:
+    try:
+        idx = json.loads(_index_path(csv_path).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if not isinstance(idx, dict) or idx.get("every") != TIME_INDEX_EVERY:
+        return None
+    return idx
+
+
+def update_time_index(csv_path: Path) -> dict[str, Any]:
+    """读取 CSV 的稀疏时间索引，CSV 有新增内容时只扫描新增部分并回写（同步）"""
+    csv_path = Path(csv_path)
+    size = csv_path.stat().st_size
+    idx = _load_index(csv_path)
+    if idx is not None and idx["size"] == size:
+        return idx
+    with open(csv_path, "rb") as f:
+        if idx is None or idx["size"] > size:
+            header_line = f.readline()
+            if not header_line.endswith(b"\n"):
+                return {"header": None, "size": 0, "times": [], "offsets": []}
+            idx = {
+                "every": TIME_INDEX_EVERY,
+                "header": next(csv.reader([header_line.decode("utf-8")]), []),
+                "header_end": len(header_line),
+                "size": len(header_line),
+                "since": 0,
+                "times": [],
+                "offsets": [],
+            }
+        header = idx["header"]
+        time_col = header.index("time") if "time" in header else None
+        f.seek(idx["size"])
+        offset = idx["size"]
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            # 每 TIME_INDEX_EVERY 行取一个索引点；该行没有时间时顺延到下一行
+            if time_col is not None and (not idx["times"] or idx["since"] >= TIME_INDEX_EVERY):
+                row = next(csv.reader([line.decode("utf-8")]), [])
+                t = parse_value(row[time_col]) if len(row) > time_col else None
+                if isinstance(t, (int, float)):
+                    idx["times"].append(t)
+                    idx["offsets"].append(offset)
+                    idx["since"] = 0
+            idx["since"] += 1
+            offset += len(line)
+        idx["size"] = offset
+    tmp = _index_path(csv_path).with_suffix(".idx.tmp")
+    try:
+        tmp.write_text(json.dumps(idx), encoding="utf-8")
+        os.replace(tmp, _index_path(csv_path))
+    except OSError as e:
+        logger.warning(f"写入时间索引失败 {csv_path}: {e}")
+    return idx
+
+
+def _read_range(csv_path: Path, start_ts: Optional[float], end_ts: Optional[float]) -> list[dict[str, Any]]:
+    """借助时间索引只读取 [start_ts, end_ts] 附近的字节，返回窗口内的记录（同步）；归档文件只解压相交的块"""
+    if Path(csv_path).suffix == ARCHIVE_SUFFIX:
+        return read_records(csv_path, start_ts, end_ts)
+    idx = update_time_index(csv_path)
+    header = idx.get("header")
+    if not header:
+        return []
+    times, offsets = idx["times"], idx["offsets"]
+    start_off, end_off = idx["header_end"], idx["size"]
+    if times:
+        if start_ts is not None:
+            # 最后一个时间严格小于 start_ts 的索引点之前不会有窗口内的行
+            i = bisect.bisect_left(times, start_ts) - 1
+            if i >= 0:
+                start_off = offsets[i]
+        if end_ts is not None:
+            # 第一个时间大于 end_ts 的索引点及之后都在窗口外
+            j = bisect.bisect_right(times, end_ts)
+            if j < len(times):
+                end_off = offsets[j]
+    if end_off <= start_off:
+        return []
+    with open(csv_path, "rb") as f:
+        f.seek(start_off)
+        data = f.read(end_off - start_off)
+    records = []
+    width = len(header)
+    for row in csv.reader(io.StringIO(data.decode("utf-8"), newline="")):
+        if not row:
+            continue
+        if len(row) < width:
+            row = row + [None] * (width - len(row))
+        rec = {k: parse_value(v) for k, v in zip(header, row)}
+        t = rec.get("time")
+        if isinstance(t, (int, float)) and (start_ts is None or t >= start_ts) and (end_ts is None or t <= end_ts):
+            records.append(rec)
+    return records
+
 
 class DataCollect:
 
@@ -17,34 +301,76 @@ class DataCollect:
         self.csv_files: list[Path] = self._get_csv_files()
 
     def _get_csv_files(self) -> list[Path]:
+        """任务数据文件：CSV 或其归档（.tsc）；两者同时存在时（归档后删除 CSV 前中断）以归档为准"""
         p = Path(self.save_dir)
         if not p.exists():
             return []
-        return [f for f in p.iterdir() if f.is_file() and f.suffix == ".csv"]
+        files: dict[str, Path] = {}
+        for f in p.iterdir():
+            if f.is_file() and f.suffix in (".csv", ARCHIVE_SUFFIX):
+                if f.suffix == ARCHIVE_SUFFIX or f.stem not in files:
+                    files[f.stem] = f
+        return list(files.values())
+
+    @staticmethod
+    def data_file(save_dir: str, stem: str) -> Optional[Path]:
+        """某个 CSV（如 "thread_cpu"）的数据文件路径，优先归档；不存在时返回 None"""
+        for suffix in (ARCHIVE_SUFFIX, ".csv"):
+            path = Path(save_dir) / f"{stem}{suffix}"
+            if path.is_file():
+                return path
+        return None
 
     # ── CSV → list[dict] ─────────────────────────────────────
 
     @staticmethod
     async def _csv_to_records(file_path: Path) -> list[dict[str, Any]]:
-        """异步读取 CSV，返回 list[dict]，数值字段自动转 float"""
-        def _read() -> list[dict[str, Any]]:
-            records: list[dict[str, Any]] = []
-            with open(file_path, encoding="utf-8", newline="") as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    parsed: dict[str, Any] = {}
-                    for k, v in row.items():
-                        if v == "" or v is None:
-                            parsed[k] = None
-                        else:
-                            try:
-                                parsed[k] = float(v) if "." in v else int(v)
-                            except (ValueError, TypeError):
-                                parsed[k] = v
-                    records.append(parsed)
-            return records
+        """异步读取 CSV，返回 list[dict]，数值字段自动转 float（经 task_data_cache，结果不得原地修改）"""
+        return await task_data_cache.records(file_path)
+
+    # ── 流式读取 ──────────────────────────────────────────────
+
+    @staticmethod
+    def csv_header(file_path: Path) -> list[str]:
+        """CSV 表头（含单位），空文件返回 []"""
+        if Path(file_path).suffix == ARCHIVE_SUFFIX:
+            return list(read_footer(file_path)["header"])
+        with open(file_path, encoding="utf-8", newline="") as f:
+            return next(csv.reader(f), [])
 
-        return await asyncio.to_thread(_read)
+    @staticmethod
+    def iter_csv(file_path: Path, chunk_rows: int = CHUNK_ROWS) -> Iterator[list[list[Any]]]:
+        """按块流式读取 CSV（跳过表头），每块为若干行、每行是按表头顺序解析后的值列表"""
+        if Path(file_path).suffix == ARCHIVE_SUFFIX:
+            chunk = []
+            for block in iter_blocks(file_path):
+                chunk.extend(block)
+                while len(chunk) >= chunk_rows:
+                    yield chunk[:chunk_rows]
+                    chunk = chunk[chunk_rows:]
+            if chunk:
+                yield chunk
+            return
+        with open(file_path, encoding="utf-8", newline="") as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            chunk: list[list[Any]] = []
+            for row in reader:
+                chunk.append([parse_value(v) for v in row])
+                if len(chunk) >= chunk_rows:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+
+    @staticmethod
+    def iter_csv_text(file_path: Path) -> Iterator[list[str]]:
+        """逐行读取 CSV 原始文本（首行为表头），归档文件还原为原文本"""
+        if Path(file_path).suffix == ARCHIVE_SUFFIX:
+            yield from iter_text_rows(file_path)
+            return
+        with open(file_path, encoding="utf-8", newline="") as f:
+            yield from csv.reader(f)
 
     # ── 数据整形 ──────────────────────────────────────────────
 
@@ -121,8 +447,131 @@ class DataCollect:
             if isinstance(r, Exception):
                 logger.error(f"读取 {f} 失败: {r}")
                 r = []
-            all_data.append({"name": f.stem, "value": r})
+            # 复制列表：_format 会补时间点，不能改动缓存里的列表
+            all_data.append({"name": f.stem, "value": list(r)})
 
         if is_format:
             return self._format(all_data)
         return all_data
+
+    async def get_range(
+        self,
+        start_ts: Optional[float] = None,
+        end_ts: Optional[float] = None,
+        metrics: Optional[list[str]] = None,
+        is_format: bool = True,
+    ) -> list[dict[str, Any]]:
+        """
+        读取时间窗口 [start_ts, end_ts] 内的数据，格式同 get_all_data；
+        metrics 为 CSV 名（如 ["cpu", "memory"]），为空时读取全部。
+        借助稀疏时间索引定位，只读窗口附近的字节，不读整个文件。
+        """
+        files = [f for f in self.csv_files if not metrics or f.stem in metrics]
+        results = await asyncio.gather(
+            *[asyncio.to_thread(_read_range, f, start_ts, end_ts) for f in files], return_exceptions=True,
+        )
+        all_data = []
+        for f, r in zip(files, results):
+            if isinstance(r, Exception):
+                logger.error(f"读取 {f} 失败: {r}")
+                r = []
+            all_data.append({"name": f.stem, "value": r})
+        if is_format:
+            return self._format(all_data)
+        return all_data
+
+    def build_time_index(self) -> None:
+        """为全部 CSV 建立 / 补全时间索引（同步，任务停止时调用）；归档文件自带块时间范围，无需索引"""
+        for f in self.csv_files:
+            if f.suffix == ARCHIVE_SUFFIX:
+                continue
+            try:
+                update_time_index(f)
+            except OSError as e:
+                logger.warning(f"建立时间索引失败 {f}: {e}")
+
+    def summarize(self) -> dict[str, Any]:
+        """
+        任务摘要（停止时计算并缓存到 tasks 表，任务列表无需再读 CSV）：
+        duration(秒)、sample_count(采样轮数，以 cpu.csv 行数为准)、data_size(目录总字节数)、各关键指标均值，
+        以及 metrics：CATALOG_METRICS 中每个指标的分布统计（写入 metric_catalog 表）
+        """
+        first_ts = last_ts = None
+        row_counts: dict[str, int] = {}
+        values: dict[str, list[float]] = {}
+        metrics_by_stem: dict[str, list[tuple[str, str]]] = {}
+        for metric, (stem, col) in CATALOG_METRICS.items():
+            metrics_by_stem.setdefault(stem, []).append((metric, col))
+        for f in self.csv_files:
+            rows = 0
+            try:
+                reader = self.iter_csv_text(f)
+                names = [h.split("(")[0] for h in next(reader, [])]
+                time_idx = names.index("time") if "time" in names else None
+                cols = [(metric, next((i for i, n in enumerate(names) if n.startswith(col)), None))
+                        for metric, col in metrics_by_stem.get(f.stem, [])]
+                cols = [(metric, idx) for metric, idx in cols if idx is not None]
+                for row in reader:
+                    rows += 1
+                    if time_idx is not None and time_idx < len(row) and row[time_idx]:
+                        try:
+                            ts = float(row[time_idx])
+                        except ValueError:
+                            ts = None
+                        if ts is not None:
+                            first_ts = ts if first_ts is None else min(first_ts, ts)
+                            last_ts = ts if last_ts is None else max(last_ts, ts)
+                    for metric, idx in cols:
+                        if idx < len(row) and row[idx]:
+                            try:
+                                values.setdefault(metric, []).append(float(row[idx]))
+                            except ValueError:
+                                continue
+            except (OSError, ValueError, RuntimeError) as e:
+                logger.error(f"读取 {f} 失败: {e}")
+            row_counts[f.stem] = rows
+
+        data_size = 0
+        root = Path(self.save_dir)
+        if root.exists():
+            for p in root.rglob("*"):
+                try:
+                    if p.is_file():
+                        data_size += p.stat().st_size
+                except OSError:
+                    continue
+
+        metrics = {metric: metric_stats(vals) for metric, vals in values.items() if vals}
+        summary: dict[str, Any] = {
+            "duration": round(last_ts - first_ts, 1) if first_ts is not None else 0.0,
+            "sample_count": row_counts.get("cpu", max(row_counts.values(), default=0)),
+            "data_size": data_size,
+        }
+        for metric in SUMMARY_METRICS:
+            summary[f"{metric}_avg"] = metrics[metric]["mean"] if metric in metrics else None
+        summary["metrics"] = metrics
+        return summary
+
+
+def _percentile(sorted_vals: list[float], q: float) -> float:
+    pos = (len(sorted_vals) - 1) * q
+    low = int(pos)
+    high = min(low + 1, len(sorted_vals) - 1)
+    return sorted_vals[low] + (sorted_vals[high] - sorted_vals[low]) * (pos - low)
+
+
+def metric_stats(vals: list[float]) -> dict[str, Any]:
+    """count / mean / stdev(样本) / p50 / p95 / min / max"""
+    vals = sorted(vals)
+    n = len(vals)
+    mean = sum(vals) / n
+    var = sum((v - mean) ** 2 for v in vals) / (n - 1) if n > 1 else 0.0
+    return {
+        "count": n,
+        "mean": round(mean, 4),
+        "stdev": round(var ** 0.5, 4),
+        "p50": round(_percentile(vals, 0.5), 4),
+        "p95": round(_percentile(vals, 0.95), 4),
+        "min": round(vals[0], 4),
+        "max": round(vals[-1], 4),
+    }
@@ -0,0 +1,55 @@
+# coding: utf-8
+"""launch.csv 经真实表头（total(ms) 等带单位列名）写出、读回后的启动耗时汇总"""
+import asyncio
+
+from client_perf.core import launch
+from client_perf.util import DataCollect
+
+
+class _FakeDriver:
+    """每次启动返回固定耗时的驱动"""
+
+    def __init__(self, results: list[dict]) -> None:
+        self.results = list(results)
+
+    def prepare(self, mode: str) -> None:
+        pass
+
+    def launch(self, settle: int) -> dict:
+        return dict(self.results.pop(0))
+
+
+def _run_and_read(tmp_path, monkeypatch, results: list[dict]) -> list[dict]:
+    monkeypatch.setattr(launch, "LAUNCH_INTERVAL", 0)
+    driver = _FakeDriver(results)
+    options = {"launch_count": len(results), "launch_settle": 0}
+    asyncio.run(launch.run_launch(driver, str(tmp_path), options))
+    data = asyncio.run(DataCollect(str(tmp_path)).get_all_data(is_format=False))
+    return next(item["value"] for item in data if item["name"] == "launch")
+
+
+def test_launch_summary_reads_unit_suffixed_columns(tmp_path, monkeypatch):
+    rows = _run_and_read(tmp_path, monkeypatch, [
+        {"total": 800, "displayed": 600, "launch_state": "COLD"},
+        {"total": 1000, "displayed": 700, "launch_state": "COLD"},
+    ])
+    assert "total(ms)" in rows[0]
+
+    summary = launch.launch_summary(rows)
+    assert summary["iterations"] == 2
+    assert summary["values"] == {"total": [800.0, 1000.0], "displayed": [600.0, 700.0]}
+    assert summary["total"]["avg"] == 900.0
+    assert summary["total"]["min"] == 800.0 and summary["total"]["max"] == 1000.0
+    assert summary["displayed"]["p50"] == 650.0
+
+
+def test_launch_summary_skips_missing_values(tmp_path, monkeypatch):
+    rows = _run_and_read(tmp_path, monkeypatch, [
+        {"total": 500, "displayed": None},
+        {"total": 700, "displayed": 400},
+    ])
+
+    summary = launch.launch_summary(rows)
+    assert summary["values"]["total"] == [500.0, 700.0]
+    assert summary["values"]["displayed"] == [400.0]
+    assert summary["displayed"]["count"] == 1